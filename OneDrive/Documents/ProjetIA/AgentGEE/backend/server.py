@@ -1,40 +1,22 @@
-print("=== IMPORTS STARTING ===")
-
 from flask import Flask, jsonify, request
-print("✓ Flask imported")
-
 from flask_cors import CORS
-print("✓ Flask-CORS imported")
 
 try:
     import ee
-    print("✓ Earth Engine API imported")
 except ImportError as e:
     print(f"❌ Failed to import Earth Engine API: {e}")
 
 import requests
-print("✓ Requests imported")
-
 import json
-print("✓ JSON imported")
-
 from datetime import datetime
-print("✓ Datetime imported")
-
 import os
-print("✓ OS imported")
-
 from dotenv import load_dotenv
-print("✓ Python-dotenv imported")
-
-print("=== ALL IMPORTS COMPLETED ===")
 
 # Load environment variables
 load_dotenv()
 
 print("=== Flask Application Starting ===")
 print(f"Current working directory: {os.getcwd()}")
-print(f"Python path: {os.sys.path}")
 
 app = Flask(__name__, static_folder='dist', static_url_path='')
 CORS(app)  # Enable CORS for all routes
@@ -1,6 +1,7 @@
 import React, { useEffect, useRef } from 'react';
 import { MapContainer, TileLayer, useMap } from 'react-leaflet';
 import L from 'leaflet';
+import { getTileUrl } from '../services/geeService';
 
 // Custom hook to update the map view when location changes
 function ChangeView({ center, zoom }) {
@@ -38,7 +39,7 @@ const MapComponent = ({ beforeImage, afterImage, location, onLocationChange }) =
     // Add before image layer if available
     if (beforeImage && beforeImage.mapId) {
       const beforeLayer = L.tileLayer(
-        `https://earthengine.googleapis.com/v1alpha/projects/earthengine-legacy/maps/${beforeImage.mapId}/tiles/{z}/{x}/{y}`,
+        getTileUrl(beforeImage.mapId),
         {
           attribution: 'Google Earth Engine',
           geeLayer: true,
@@ -51,7 +52,7 @@ const MapComponent = ({ beforeImage, afterImage, location, onLocationChange }) =
     // Add after image layer if available
     if (afterImage && afterImage.mapId) {
       const afterLayer = L.tileLayer(
-        `https://earthengine.googleapis.com/v1alpha/projects/earthengine-legacy/maps/${afterImage.mapId}/tiles/{z}/{x}/{y}`,
+        getTileUrl(afterImage.mapId),
         {
           attribution: 'Google Earth Engine',
           geeLayer: true,
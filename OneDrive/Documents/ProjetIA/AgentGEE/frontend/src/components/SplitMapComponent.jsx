@@ -4,6 +4,7 @@ import L from 'leaflet';
 import 'leaflet-draw';
 import 'leaflet-draw/dist/leaflet.draw.css';
 import 'leaflet-geometryutil';
+import { getTileUrl } from '../services/geeService';
 
 // Custom hook to update the map view when location changes
 function ChangeView({ center, zoom }) {
@@ -508,11 +509,8 @@ const SplitMapComponent = ({ beforeImage, afterImage, location, onLocationChange
 
   // Satellite layer component for react-leaflet
   const SatelliteLayer = ({ mapId, token, label }) => {
-    // Build the tile URL
-    let tileUrl = `https://earthengine.googleapis.com/v1/${mapId}/tiles/{z}/{x}/{y}`;
-    if (token && token !== '') {
-      tileUrl += `?token=${token}`;
-    }
+    // Build the tile URL (served through the backend tile cache)
+    const tileUrl = getTileUrl(mapId, token);
 
     console.log(`${label} tile URL:`, tileUrl);
 
@@ -2,28 +2,31 @@
  * Advanced analysis service for calculating environmental metrics
  */
 
+import { detectChange } from './geeService';
+
 /**
- * Calculate area change between two images
- * @param {Object} beforeImage - Before image data
- * @param {Object} afterImage - After image data
+ * Calculate area change between two date windows
+ * @param {Object} before - Before window ({ start_date, end_date })
+ * @param {Object} after - After window ({ start_date, end_date })
  * @param {Object} location - Location coordinates
+ * @param {string} index - 'ndvi' or 'ndwi'
  * @returns {Promise<Object>} - Area change metrics
  */
-export const calculateAreaChange = async (beforeImage, afterImage, location) => {
-  // In a real implementation, this would call our Python backend
-  // to perform actual GEE analysis
-  
-  // For demonstration, we'll return mock data
-  const changePercentage = (Math.random() * 30 - 15).toFixed(2); // -15% to +15%
-  const areaChange = Math.random() * 100; // km²
+export const calculateAreaChange = async (before, after, location, index = 'ndvi') => {
+  const result = await detectChange({ location, before, after }, index);
+  const { stats } = result;
   
   return {
-    changePercentage,
-    areaChange,
+    changePercentage: stats.change_percentage !== null ? stats.change_percentage.toFixed(2) : null,
+    areaChange: stats.changed_area_km2,
+    gainedArea: stats.gained_area_km2,
+    lostArea: stats.lost_area_km2,
     unit: 'km²',
-    description: 'Area change',
-    beforeValue: 1000, // Mock values
-    afterValue: 1000 + areaChange
+    description: `Area where ${index.toUpperCase()} changed by more than ${result.threshold}`,
+    beforeValue: stats.before_mean,
+    afterValue: stats.after_mean,
+    mapId: result.map_id,
+    token: result.token
   };
 };
 
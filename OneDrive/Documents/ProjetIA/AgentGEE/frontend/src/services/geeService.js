@@ -73,6 +73,117 @@ export const getSatelliteImage = async (params, filter = 'rgb') => {
   }
 };
 
+/**
+ * Get NDVI or NDWI statistics for the area around a location
+ * @param {Object} params - Location, start_date and end_date
+ * @param {string} index - 'ndvi' or 'ndwi'
+ * @returns {Promise<Object>} - Mean, std dev, percentiles, histogram and pixel count
+ */
+export const getRegionStats = async (params, index = 'ndvi') => {
+  try {
+    const response = await fetch(`${API_BASE_URL}/region-stats`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+      },
+      body: JSON.stringify({ ...params, index }),
+    });
+    
+    if (!response.ok) {
+      const error = await response.json();
+      throw new Error(error.error || 'Failed to compute region statistics');
+    }
+    
+    return await response.json();
+  } catch (error) {
+    console.error('Region statistics error:', error);
+    throw error;
+  }
+};
+
+/**
+ * Compare an index between two date windows around a location
+ * @param {Object} params - location, before and after ({ start_date, end_date })
+ * @param {string} index - 'ndvi' or 'ndwi'
+ * @returns {Promise<Object>} - Change statistics and difference layer map ID
+ */
+export const detectChange = async (params, index = 'ndvi') => {
+  try {
+    const response = await fetch(`${API_BASE_URL}/change-detection`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+      },
+      body: JSON.stringify({ ...params, index }),
+    });
+    
+    if (!response.ok) {
+      const error = await response.json();
+      throw new Error(error.error || 'Failed to detect change');
+    }
+    
+    return await response.json();
+  } catch (error) {
+    console.error('Change detection error:', error);
+    throw error;
+  }
+};
+
+/**
+ * Stream a monthly index time series, calling onPoint as each point arrives
+ * @param {Object} params - location, start_date, end_date and optional collection
+ * @param {Function} onPoint - Called with each { date, mean, valid_pixels, image_count } or chunk error
+ * @param {string} index - 'ndvi' or 'ndwi'
+ * @returns {Promise<void>} - Resolves when the series is complete
+ */
+export const getTimeseries = async (params, onPoint, index = 'ndvi') => {
+  try {
+    const response = await fetch(`${API_BASE_URL}/timeseries`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+        'Accept': 'application/x-ndjson',
+      },
+      body: JSON.stringify({ ...params, index }),
+    });
+    
+    if (!response.ok) {
+      const error = await response.json();
+      throw new Error(error.error || 'Failed to retrieve time series');
+    }
+    
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    for (;;) {
+      const { done, value } = await reader.read();
+      buffer += decoder.decode(value || new Uint8Array(), { stream: !done });
+      const lines = buffer.split('\n');
+      buffer = lines.pop();
+      lines.filter((line) => line.trim()).forEach((line) => onPoint(JSON.parse(line)));
+      if (done) break;
+    }
+  } catch (error) {
+    console.error('Time series error:', error);
+    throw error;
+  }
+};
+
+/**
+ * Build the Leaflet tile URL for a map ID. Tiles are served through the
+ * backend tile cache instead of straight from Earth Engine.
+ * @param {string} mapId - Map ID returned by getSatelliteImage
+ * @param {string} token - Optional map token
+ * @returns {string} - Tile URL template
+ */
+export const getTileUrl = (mapId, token) => {
+  let tileUrl = `${API_BASE_URL}/tiles/${mapId}/{z}/{x}/{y}`;
+  if (token && token !== '') {
+    tileUrl += `?token=${token}`;
+  }
+  return tileUrl;
+};
+
 /**
  * Measure area from GeoJSON polygon
  * @param {Object} geometry - GeoJSON geometry object
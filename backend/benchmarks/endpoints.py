@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+"""
+Endpoint benchmark: drives /health, /geocode, /satellite-image, /measure-area
+and /measure-distance at a fixed concurrency against the fake Earth Engine
+backend (fake_ee.py) and a local Nominatim stand-in, so it needs no account
+or network.
+
+Run from the backend directory:
+
+    python benchmarks/endpoints.py [--server inprocess|gunicorn] [--workers 2]
+        [--threads 16] [--concurrency 8] [--requests 200] [--gee-latency 0.2]
+        [--json results.json] [--compare previous.json]
+
+Reports p50/p95/p99 latency, requests/s and Earth Engine and Nominatim
+calls per request for each endpoint. Call counts come from /metrics, so
+they need prometheus_client.
+"""
+import argparse
+import contextlib
+import hashlib
+import itertools
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import requests
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks.startup import free_port
+
+FILTERS = ('rgb', 'ndvi', 'ndwi', 'false_color')
+
+
+def square(i, size=0.05):
+    west = 2.0 + (i % 10) * 0.1
+    south = 45.0 + (i // 10) * 0.1
+    return {'type': 'Polygon', 'coordinates': [[
+        [west, south], [west + size, south], [west + size, south + size], [west, south + size], [west, south]
+    ]]}
+
+
+# name: (method, path, payload for the i-th distinct request)
+ENDPOINTS = {
+    'health': ('GET', '/health', lambda i: None),
+    'geocode': ('POST', '/geocode', lambda i: {'location': f'Benchmark town {i}'}),
+    'satellite-image': ('POST', '/satellite-image', lambda i: {
+        'location': {'lat': 45.0 + (i // 10) * 0.5, 'lon': 2.0 + (i % 10) * 0.5},
+        'start_date': '2023-01-01', 'end_date': '2023-06-30', 'filter': FILTERS[i % len(FILTERS)]
+    }),
+    'measure-area': ('POST', '/measure-area', lambda i: {'geometry': square(i)}),
+    'measure-distance': ('POST', '/measure-distance', lambda i: {
+        'geometry': {'type': 'LineString', 'coordinates': square(i)['coordinates'][0]}
+    })
+}
+
+
+class NominatimStandIn(BaseHTTPRequestHandler):
+    """
+    Answers /search with one deterministic city per query after a fixed delay
+    """
+    latency = 0.0
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query).get('q', [''])[0]
+        digest = hashlib.sha1(query.encode('utf-8')).digest()
+        body = json.dumps([{
+            'lat': str(-60 + digest[0] / 255 * 120),
+            'lon': str(-180 + digest[1] / 255 * 360),
+            'display_name': query,
+            'type': 'city'
+        }]).encode('utf-8')
+        time.sleep(self.latency)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@contextlib.contextmanager
+def nominatim_stand_in(latency):
+    handler = type('Handler', (NominatimStandIn,), {'latency': latency})
+    httpd = ThreadingHTTPServer(('127.0.0.1', free_port()), handler)
+    httpd.daemon_threads = True
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f'http://127.0.0.1:{httpd.server_address[1]}/search'
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+
+def server_env(args, nominatim_url, cache_dir):
+    """
+    Environment of the app under test
+    """
+    return {
+        'GEE_BACKEND': 'fake',
+        'FAKE_EE_LATENCY': str(args.gee_latency),
+        'FAKE_EE_JITTER': str(args.gee_jitter),
+        'FAKE_EE_ERROR_RATE': str(args.gee_error_rate),
+        'NOMINATIM_URL': nominatim_url,
+        # The stand-in has no usage policy to respect
+        'NOMINATIM_RATE_LIMIT': '0',
+        'CACHE_DIR': cache_dir,
+        'GUNICORN_WORKERS': str(args.workers),
+        'GUNICORN_THREADS': str(args.threads)
+    }
+
+
+@contextlib.contextmanager
+def in_process_server(env, verbose=False):
+    """
+    Serve the app from a thread of this process. Returns its base URL.
+    """
+    os.environ.update(env)
+    from werkzeug.serving import make_server
+    import server
+
+    if not verbose:
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    httpd = make_server('127.0.0.1', free_port(), server.app, threaded=True)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    try:
+        with open(os.devnull, 'w') as devnull, \
+                contextlib.nullcontext() if verbose else contextlib.redirect_stdout(devnull):
+            yield f'http://127.0.0.1:{httpd.server_port}'
+    finally:
+        httpd.shutdown()
+
+
+@contextlib.contextmanager
+def gunicorn_server(env, verbose=False):
+    """
+    Run the app under gunicorn with gunicorn.conf.py. Returns its base URL.
+    """
+    port = free_port()
+    output = None if verbose else subprocess.DEVNULL
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--bind', f'127.0.0.1:{port}', 'server:app'],
+        cwd=BACKEND_DIR, env=dict(os.environ, **env), stdout=output, stderr=output
+    )
+    try:
+        yield f'http://127.0.0.1:{port}'
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def wait_until_ready(base_url, timeout=30.0):
+    """
+    Wait for /health to report Earth Engine as initialized
+    """
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            if requests.get(f'{base_url}/health', timeout=1).json().get('gee_initialized'):
+                return
+        except (requests.exceptions.RequestException, ValueError):
+            pass
+        time.sleep(0.05)
+    raise RuntimeError(f'Earth Engine was not initialized within {timeout:.0f}s')
+
+
+def outbound_calls(base_url):
+    """
+    Earth Engine and Nominatim calls counted by /metrics so far (all workers),
+    or None when metrics are unavailable
+    """
+    response = requests.get(f'{base_url}/metrics', timeout=5)
+    if response.status_code != 200:
+        return None
+    gee = nominatim = 0.0
+    for line in response.text.splitlines():
+        if line.startswith('gee_calls_total{'):
+            gee += float(line.rsplit(' ', 1)[1])
+        elif line.startswith('upstream_requests_total{') and 'upstream="nominatim"' in line:
+            nominatim += float(line.rsplit(' ', 1)[1])
+    return gee, nominatim
+
+
+def percentile(values, q):
+    """
+    Linearly interpolated percentile of sorted values
+    """
+    if not values:
+        return None
+    position = (len(values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def run_endpoint(base_url, name, total, concurrency, distinct):
+    """
+    Send total requests to one endpoint from concurrency threads, cycling
+    through distinct payloads so later requests can hit the caches
+    """
+    method, path, payload = ENDPOINTS[name]
+    counter = itertools.count()
+    sessions = threading.local()
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+
+    def worker():
+        session = getattr(sessions, 'session', None)
+        if session is None:
+            session = sessions.session = requests.Session()
+        while True:
+            i = next(counter)
+            if i >= total:
+                return
+            started = time.perf_counter()
+            try:
+                status = session.request(method, base_url + path, json=payload(i % distinct), timeout=120).status_code
+            except requests.exceptions.RequestException:
+                status = 'error'
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                latencies.append(elapsed)
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    before = outbound_calls(base_url)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for _ in range(concurrency):
+            executor.submit(worker)
+    wall = time.perf_counter() - started
+    after = outbound_calls(base_url)
+
+    latencies.sort()
+    result = {
+        'requests': total,
+        'errors': sum(count for status, count in statuses.items() if not status.startswith('2')),
+        'status_codes': statuses,
+        'requests_per_second': total / wall,
+        'latency_ms': {
+            'p50': percentile(latencies, 50),
+            'p95': percentile(latencies, 95),
+            'p99': percentile(latencies, 99),
+            'mean': sum(latencies) / len(latencies),
+            'max': latencies[-1]
+        },
+        'gee_calls_per_request': None,
+        'nominatim_calls_per_request': None
+    }
+    if before is not None and after is not None:
+        result['gee_calls_per_request'] = (after[0] - before[0]) / total
+        result['nominatim_calls_per_request'] = (after[1] - before[1]) / total
+    return result
+
+
+def run(args):
+    """
+    Benchmark every selected endpoint in turn against a fresh server and caches
+    """
+    names = args.endpoints.split(',')
+    unknown = [name for name in names if name not in ENDPOINTS]
+    if unknown:
+        raise SystemExit(f"Unknown endpoints: {', '.join(unknown)}. Choose from {', '.join(ENDPOINTS)}")
+
+    serve = in_process_server if args.server == 'inprocess' else gunicorn_server
+    with tempfile.TemporaryDirectory() as cache_dir, nominatim_stand_in(args.nominatim_latency) as nominatim_url:
+        env = server_env(args, nominatim_url, cache_dir)
+        with serve(env, args.verbose) as base_url:
+            wait_until_ready(base_url)
+            endpoints = {
+                name: run_endpoint(base_url, name, args.requests, args.concurrency, args.distinct)
+                for name in names
+            }
+
+    return {
+        'config': {
+            'server': args.server,
+            'workers': args.workers if args.server == 'gunicorn' else None,
+            'threads': args.threads if args.server == 'gunicorn' else None,
+            'concurrency': args.concurrency,
+            'requests': args.requests,
+            'distinct': args.distinct,
+            'gee_latency': args.gee_latency,
+            'gee_jitter': args.gee_jitter,
+            'gee_error_rate': args.gee_error_rate,
+            'nominatim_latency': args.nominatim_latency,
+            'python': platform.python_version(),
+            'timestamp': datetime.now().isoformat()
+        },
+        'endpoints': endpoints
+    }
+
+
+def print_table(results, previous=None):
+    header = f"{'endpoint':<18}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}{'gee/req':>9}{'osm/req':>9}"
+    print(header)
+    print('-' * len(header))
+
+    def number(value, digits):
+        return '-' if value is None else f'{value:.{digits}f}'
+
+    for name, result in results['endpoints'].items():
+        latency = result['latency_ms']
+        print(f"{name:<18}{result['requests_per_second']:>9.1f}{latency['p50']:>10.1f}{latency['p95']:>10.1f}"
+              f"{latency['p99']:>10.1f}{result['errors']:>8}{number(result['gee_calls_per_request'], 2):>9}"
+              f"{number(result['nominatim_calls_per_request'], 2):>9}")
+        old = (previous or {}).get('endpoints', {}).get(name)
+        if old:
+            def change(new, before):
+                return '-' if not before else f'{(new - before) / before * 100:+.0f}%'
+            print(f"{'  vs previous':<18}{change(result['requests_per_second'], old['requests_per_second']):>9}"
+                  f"{change(latency['p50'], old['latency_ms']['p50']):>10}"
+                  f"{change(latency['p95'], old['latency_ms']['p95']):>10}"
+                  f"{change(latency['p99'], old['latency_ms']['p99']):>10}")
+
+
+def parser():
+    parser = argparse.ArgumentParser(description='Benchmark endpoint latency and throughput offline')
+    parser.add_argument('--server', choices=('inprocess', 'gunicorn'), default='inprocess')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn worker processes')
+    parser.add_argument('--threads', type=int, default=16, help='threads per gunicorn worker')
+    parser.add_argument('--concurrency', type=int, default=8, help='concurrent client connections')
+    parser.add_argument('--requests', type=int, default=200, help='requests per endpoint')
+    parser.add_argument('--distinct', type=int, default=50, help='distinct payloads per endpoint')
+    parser.add_argument('--endpoints', default=','.join(ENDPOINTS))
+    parser.add_argument('--gee-latency', type=float, default=0.2, help='seconds per Earth Engine call')
+    parser.add_argument('--gee-jitter', type=float, default=0.1)
+    parser.add_argument('--gee-error-rate', type=float, default=0.0)
+    parser.add_argument('--nominatim-latency', type=float, default=0.1)
+    parser.add_argument('--json', help='Also write the results to this file')
+    parser.add_argument('--compare', help='Results of a previous run to compare against')
+    parser.add_argument('--verbose', action='store_true', help='Show the server output')
+    return parser
+
+
+def main():
+    args = parser().parse_args()
+    results = run(args)
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+    print_table(results, previous)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
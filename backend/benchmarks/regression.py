@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Performance regression gate. Measures, against the fake Earth Engine backend:
+- Earth Engine round trips per request for each route and fallback case
+- p95 latency of the main routes with a fixed per-call latency
+- import time of server.py
+- peak RSS of a worker after serving the latency runs
+
+and compares them with benchmarks/baseline.json. Round trips must not exceed
+the baseline; the timings and memory may exceed it by the tolerances stored
+with it (relative, plus an absolute allowance for the fastest routes).
+test_performance.py runs the same checks under pytest.
+
+Run from the backend directory:
+
+    python benchmarks/regression.py             # check against the baseline
+    python benchmarks/regression.py --update    # record the current numbers
+"""
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks.startup import measure_import
+
+BASELINE_PATH = os.path.join(BACKEND_DIR, 'benchmarks', 'baseline.json')
+
+# Seconds per fake Earth Engine call during the latency runs
+GATE_GEE_LATENCY = 0.05
+GATE_REQUESTS = 64
+GATE_CONCURRENCY = 8
+LATENCY_ENDPOINTS = ('health', 'satellite-image', 'measure-area', 'measure-distance')
+
+WINDOW = {'start_date': '2023-01-01', 'end_date': '2023-06-30'}
+LANDSAT = 'LANDSAT/LC08/C02/T1_L2'
+SENTINEL = 'COPERNICUS/S2_SR'
+SQUARE = {'type': 'Polygon', 'coordinates': [[[2.3, 48.8], [2.4, 48.8], [2.4, 48.9], [2.3, 48.9], [2.3, 48.8]]]}
+
+# name: (path, payload, collections without scenes). Each case has its own
+# location so no case is answered from another one's cache entries.
+CALL_CASES = {
+    'satellite-image': ('/satellite-image', {'location': {'lat': 40.0, 'lon': 0.0}, **WINDOW}, ()),
+    'satellite-image sentinel fallback': (
+        '/satellite-image', {'location': {'lat': 41.0, 'lon': 0.0}, **WINDOW}, (LANDSAT,)
+    ),
+    'satellite-image no images': (
+        '/satellite-image', {'location': {'lat': 42.0, 'lon': 0.0}, **WINDOW}, (LANDSAT, SENTINEL)
+    ),
+    'region-stats': ('/region-stats', {'location': {'lat': 43.0, 'lon': 0.0}, **WINDOW}, ()),
+    'change-detection': ('/change-detection', {
+        'location': {'lat': 44.0, 'lon': 0.0},
+        'before': {'start_date': '2020-01-01', 'end_date': '2020-06-30'}, 'after': WINDOW
+    }, ()),
+    'timeseries 2 years': ('/timeseries', {
+        'location': {'lat': 45.0, 'lon': 0.0}, 'start_date': '2022-01-01', 'end_date': '2023-12-31'
+    }, ()),
+    'measure-area verify': ('/measure-area', {'geometry': SQUARE, 'verify': 'gee'}, ()),
+    'measure-distance verify': ('/measure-distance', {
+        'geometry': {'type': 'LineString', 'coordinates': SQUARE['coordinates'][0]}, 'verify': 'gee'
+    }, ())
+}
+
+
+def probe():
+    """
+    Runs in a fresh interpreter started by measure_server(): serves the app
+    in-process on the fake backend and prints round trips, p95 latencies and
+    peak RSS as JSON
+    """
+    import requests
+
+    from benchmarks import endpoints
+
+    with endpoints.in_process_server({}) as base_url:
+        endpoints.wait_until_ready(base_url)
+        import fake_ee
+
+        calls = {}
+        fake_ee.configure(latency=0, jitter=0)
+        for name, (path, payload, empty) in CALL_CASES.items():
+            fake_ee.configure(empty_collections=set(empty))
+            fake_ee.reset_counts()
+            response = requests.post(base_url + path, json=payload, timeout=60)
+            if response.status_code not in (200, 404):
+                raise RuntimeError(f'{name} answered {response.status_code}: {response.text[:200]}')
+            calls[name] = sum(fake_ee.call_counts().values())
+
+        fake_ee.configure(latency=GATE_GEE_LATENCY, empty_collections=set())
+        latency = {}
+        for name in LATENCY_ENDPOINTS:
+            # Every payload is distinct, so no request is served from the caches
+            result = endpoints.run_endpoint(base_url, name, GATE_REQUESTS, GATE_CONCURRENCY, GATE_REQUESTS)
+            if result['errors']:
+                raise RuntimeError(f"{name} failed {result['errors']} requests: {result['status_codes']}")
+            latency[name] = result['latency_ms']['p95']
+
+    print(json.dumps({'gee_calls_per_request': calls, 'latency_p95_ms': latency, 'peak_rss_mb': peak_rss_mb()}))
+
+
+def peak_rss_mb():
+    """
+    Peak resident memory of this process. ru_maxrss carries over the peak of
+    the parent across fork and exec, so the kernel's high-water mark of the
+    current address space is preferred where it exists.
+    """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # Kilobytes on Linux, bytes on macOS
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss / 1024 / 1024 if sys.platform == 'darwin' else maxrss / 1024
+
+
+def measure_server():
+    """
+    Round trips, latencies and peak RSS from a fresh process with empty caches
+    """
+    with tempfile.TemporaryDirectory() as cache_dir:
+        env = dict(os.environ, GEE_BACKEND='fake', CACHE_DIR=cache_dir, FAKE_EE_ERROR_RATE='0')
+        # Metrics of a gunicorn run must not be picked up
+        env.pop('PROMETHEUS_MULTIPROC_DIR', None)
+        result = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--probe'],
+            cwd=BACKEND_DIR, env=env, capture_output=True, text=True
+        )
+    if result.returncode != 0:
+        raise RuntimeError(f'Benchmark probe failed:\n{result.stderr[-2000:]}')
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def measure(import_runs=3):
+    results = measure_server()
+    results['import_ms'] = statistics.median(measure_import()[0] / 1000 for _ in range(import_runs))
+    return results
+
+
+def load_baseline(path=BASELINE_PATH):
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(results, baseline):
+    """
+    Human-readable descriptions of every threshold the results exceed
+    """
+    failures = []
+    for name, limit in baseline['gee_calls_per_request'].items():
+        calls = results['gee_calls_per_request'].get(name)
+        if calls is None:
+            failures.append(f'{name}: no Earth Engine call count measured')
+        elif calls > limit:
+            failures.append(f'{name}: {calls} Earth Engine round trips per request, baseline allows {limit}')
+
+    tolerance = baseline['tolerance']
+    for name, limit in baseline['latency_p95_ms'].items():
+        value = results['latency_p95_ms'].get(name)
+        # Fast routes also get an absolute allowance, as a few ms of noise is a large fraction of them
+        allowed = max(limit * (1 + tolerance['latency_p95_ms']), limit + tolerance['latency_slack_ms'])
+        if value is None:
+            failures.append(f'{name}: no p95 latency measured')
+        elif value > allowed:
+            failures.append(f'{name}: p95 latency {value:.0f}ms exceeds {allowed:.0f}ms (baseline {limit:.0f}ms)')
+
+    for key, unit in (('import_ms', 'ms'), ('peak_rss_mb', 'MB')):
+        allowed = baseline[key] * (1 + tolerance[key])
+        if results[key] > allowed:
+            failures.append(f'{key}: {results[key]:.0f}{unit} exceeds {allowed:.0f}{unit} '
+                            f'(baseline {baseline[key]:.0f}{unit})')
+    return failures
+
+
+def update_baseline(results, path=BASELINE_PATH):
+    """
+    Record results as the new baseline, keeping the reviewed tolerances
+    """
+    tolerance = load_baseline(path)['tolerance'] if os.path.exists(path) else {
+        'latency_p95_ms': 0.5, 'latency_slack_ms': 25, 'import_ms': 0.5, 'peak_rss_mb': 0.25
+    }
+    baseline = {
+        'gee_calls_per_request': results['gee_calls_per_request'],
+        'latency_p95_ms': {name: round(value, 1) for name, value in results['latency_p95_ms'].items()},
+        'import_ms': round(results['import_ms'], 1),
+        'peak_rss_mb': round(results['peak_rss_mb'], 1),
+        'tolerance': tolerance
+    }
+    with open(path, 'w') as f:
+        json.dump(baseline, f, indent=2)
+        f.write('\n')
+    return baseline
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare performance with the committed baseline')
+    parser.add_argument('--update', action='store_true', help='Record the current numbers as the baseline')
+    parser.add_argument('--probe', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.probe:
+        probe()
+        return 0
+
+    results = measure()
+    print(json.dumps(results, indent=2))
+    if args.update:
+        update_baseline(results)
+        print(f'Baseline written to {BASELINE_PATH}')
+        return 0
+
+    failures = compare(results, load_baseline())
+    for failure in failures:
+        print(failure)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark: import cost of server.py (as reported by python -X importtime)
+and time until a freshly started gunicorn worker answers /health with a 200.
+
+Run from the backend directory:
+
+    python benchmarks/startup.py [--runs 5] [--json results.json]
+
+Exits with status 1 when the median of either measurement exceeds its budget
+(STARTUP_IMPORT_BUDGET_MS, STARTUP_HEALTH_BUDGET_MS).
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+STARTUP_IMPORT_BUDGET_MS = float(os.environ.get('STARTUP_IMPORT_BUDGET_MS', 400))
+STARTUP_HEALTH_BUDGET_MS = float(os.environ.get('STARTUP_HEALTH_BUDGET_MS', 1000))
+
+
+def measure_import():
+    """
+    Cumulative import time of server.py in microseconds, and the slowest
+    modules it pulls in, from a fresh interpreter
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import server'],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+    )
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, self_us, cumulative_us, name = [part.strip() for part in line.replace('import time:', '|').split('|')]
+        modules.append((name, int(self_us), int(cumulative_us)))
+    total = next(cumulative for name, _, cumulative in modules if name == 'server')
+    top_level = sorted(
+        ((name, cumulative) for name, _, cumulative in modules if not name.startswith(' ')),
+        key=lambda module: module[1], reverse=True
+    )
+    return total, top_level[:10]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def measure_first_health(timeout=30.0):
+    """
+    Milliseconds from spawning a single gunicorn worker to the first 200 on /health
+    """
+    port = free_port()
+    env = dict(os.environ, PORT=str(port), GUNICORN_WORKERS='1')
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--bind', f'127.0.0.1:{port}', 'server:app'],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f'gunicorn exited with status {process.returncode}')
+            try:
+                with urllib.request.urlopen(f'http://127.0.0.1:{port}/health', timeout=1) as response:
+                    if response.status == 200:
+                        return (time.perf_counter() - started) * 1000
+            except (urllib.error.URLError, ConnectionError, socket.timeout):
+                time.sleep(0.01)
+        raise RuntimeError(f'/health did not answer within {timeout:.0f}s')
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure server startup cost')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--json', help='Also write the results to this file')
+    args = parser.parse_args()
+
+    import_runs = []
+    health_runs = []
+    slowest = None
+    for _ in range(args.runs):
+        total_us, slowest = measure_import()
+        import_runs.append(total_us / 1000)
+        health_runs.append(measure_first_health())
+
+    results = {
+        'import_ms': {'median': statistics.median(import_runs), 'runs': import_runs,
+                      'budget': STARTUP_IMPORT_BUDGET_MS},
+        'first_health_ms': {'median': statistics.median(health_runs), 'runs': health_runs,
+                            'budget': STARTUP_HEALTH_BUDGET_MS},
+        'slowest_imports_ms': {name: cumulative / 1000 for name, cumulative in slowest}
+    }
+    print(json.dumps(results, indent=2))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    over_budget = [
+        name for name in ('import_ms', 'first_health_ms')
+        if results[name]['median'] > results[name]['budget']
+    ]
+    for name in over_budget:
+        print(f"{name} median {results[name]['median']:.0f}ms exceeds the {results[name]['budget']:.0f}ms budget")
+    return 1 if over_budget else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
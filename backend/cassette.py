@@ -0,0 +1,333 @@
+"""
+Record/replay of outbound traffic for offline profiling. With
+CASSETTE_MODE=record, every Earth Engine API call (getInfo, getMapId, and the
+discovery and algorithm lookups of ee.Initialize) and every request made
+through http_client (Nominatim, tiles) is appended to CASSETTE_PATH with its
+fingerprint, response and measured latency. With CASSETTE_MODE=replay the
+same calls are answered from the file, without network or credentials,
+after their recorded latency (CASSETTE_LATENCY=recorded) or at once
+(CASSETTE_LATENCY=zero).
+
+Earth Engine traffic is captured at the HTTP transport handed to
+ee.Initialize, so the real client library runs unchanged in both modes.
+Fingerprints ignore the Cloud project, so a cassette recorded under one
+project replays under any other.
+
+Recording appends JSON lines and is safe from several workers. The CLI
+merges duplicate responses into a gzipped file and summarizes cassettes:
+
+    python cassette.py compact recorded.jsonl cassette.jsonl.gz
+    python cassette.py stats cassette.jsonl.gz
+"""
+import argparse
+import base64
+import gzip
+import hashlib
+import json
+import os
+import re
+import statistics
+import sys
+import threading
+import time
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from sqlite_store import state_path
+
+CASSETTE_MODE = os.environ.get('CASSETTE_MODE', '').lower() or None
+CASSETTE_PATH = os.environ.get('CASSETTE_PATH', state_path('cassette.jsonl'))
+CASSETTE_LATENCY = os.environ.get('CASSETTE_LATENCY', 'recorded')
+# Project passed to ee.Initialize when replaying; fingerprints do not depend on it
+REPLAY_PROJECT = 'cassette-replay'
+
+# Response headers worth keeping; the rest only make the file bigger
+KEPT_HEADERS = ('Content-Type', 'Retry-After', 'ETag', 'Cache-Control', 'Expires', 'Last-Modified')
+
+_PROJECT_PATTERN = re.compile(r'/projects/[^/]+/')
+
+
+class CassetteMiss(requests.exceptions.RequestException):
+    """
+    Raised in replay mode for a request the cassette has no response for
+    """
+
+
+def fingerprint(method, url, body=None):
+    """
+    Stable key of a request: method, URL without the Cloud project, and body
+    """
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    digest = hashlib.sha1()
+    digest.update(method.upper().encode('utf-8') + b'\n')
+    digest.update(_PROJECT_PATTERN.sub('/projects/-/', url).encode('utf-8') + b'\n')
+    digest.update(body or b'')
+    return digest.hexdigest()
+
+
+def _encode_content(content):
+    try:
+        return {'text': content.decode('utf-8')}
+    except UnicodeDecodeError:
+        return {'base64': base64.b64encode(content).decode('ascii')}
+
+
+def _decode_content(record):
+    if 'base64' in record:
+        return base64.b64decode(record['base64'])
+    return record.get('text', '').encode('utf-8')
+
+
+def read_records(path):
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+class Cassette:
+    """
+    Recorded responses keyed by request fingerprint. Repeated requests are
+    answered with their recorded responses and latencies in turn.
+    """
+
+    def __init__(self, path, mode, latency='recorded'):
+        if mode not in ('record', 'replay'):
+            raise ValueError(f'Unknown cassette mode {mode}')
+        self.path = path
+        self.mode = mode
+        self.latency = latency
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._next = {}
+        if mode == 'replay':
+            for record in read_records(path):
+                for latency_seconds in record['latencies']:
+                    self._entries.setdefault(record['key'], []).append((record, latency_seconds))
+        else:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+    def __len__(self):
+        return sum(len(entries) for entries in self._entries.values())
+
+    def record(self, kind, method, url, body, status, headers, content, latency):
+        record = {
+            'key': fingerprint(method, url, body),
+            'kind': kind,
+            'method': method.upper(),
+            'url': url,
+            'status': status,
+            'headers': {name: headers[name] for name in KEPT_HEADERS if name in headers},
+            **_encode_content(content),
+            'latencies': [round(latency, 6)]
+        }
+        line = (json.dumps(record, separators=(',', ':')) + '\n').encode('utf-8')
+        # One write on an O_APPEND descriptor keeps lines from several workers whole
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+
+    def play(self, method, url, body=None):
+        """
+        (status, headers, content) recorded for a request, after its recorded
+        latency unless replaying at zero latency. Raises CassetteMiss.
+        """
+        key = fingerprint(method, url, body)
+        with self._lock:
+            entries = self._entries.get(key)
+            if not entries:
+                raise CassetteMiss(f'No recorded response for {method.upper()} {url}')
+            index = self._next.get(key, 0)
+            self._next[key] = (index + 1) % len(entries)
+        record, latency = entries[index]
+        if self.latency != 'zero' and latency > 0:
+            time.sleep(latency)
+        return record['status'], dict(record['headers']), _decode_content(record)
+
+
+_cassette = None
+_cassette_lock = threading.Lock()
+
+
+def current():
+    """
+    The cassette selected by CASSETTE_MODE, or None
+    """
+    global _cassette
+    if CASSETTE_MODE is None:
+        return None
+    with _cassette_lock:
+        if _cassette is None:
+            _cassette = Cassette(CASSETTE_PATH, CASSETTE_MODE, CASSETTE_LATENCY)
+            print(f"Cassette {CASSETTE_MODE} mode: {CASSETTE_PATH}")
+        return _cassette
+
+
+class _RequestsTransport:
+    """
+    Minimal httplib2-style transport over requests, as used by the ee library
+    """
+
+    def __init__(self, timeout=None):
+        self.session = requests.Session()
+        self.timeout = timeout
+
+    def request(self, uri, method='GET', body=None, headers=None, redirections=None, connection_type=None):
+        import httplib2
+
+        response = self.session.request(method, uri, data=body, headers=headers, timeout=self.timeout)
+        response_headers = dict(response.headers)
+        response_headers['status'] = response.status_code
+        return httplib2.Response(response_headers), response.content
+
+
+class GEETransport:
+    """
+    httplib2-style transport for ee.Initialize(http_transport=...) that
+    records or replays every Earth Engine API call
+    """
+
+    def __init__(self, cassette, inner=None):
+        self.cassette = cassette
+        self.inner = inner or _RequestsTransport()
+
+    def request(self, uri, method='GET', body=None, headers=None, redirections=None, connection_type=None):
+        import httplib2
+
+        if self.cassette.mode == 'replay':
+            try:
+                status, response_headers, content = self.cassette.play(method, uri, body)
+            except CassetteMiss as e:
+                # The ee library turns this into an EEException with the message
+                status, response_headers = 404, {'Content-Type': 'application/json'}
+                content = json.dumps({'error': {'code': 404, 'message': str(e), 'status': 'NOT_FOUND'}}).encode()
+            response_headers['status'] = status
+            return httplib2.Response(response_headers), content
+
+        started = time.perf_counter()
+        response, content = self.inner.request(uri, method, body=body, headers=headers)
+        self.cassette.record('gee', method, uri, body, response.status, _title_case(response), content,
+                             time.perf_counter() - started)
+        return response, content
+
+
+def _title_case(headers):
+    # httplib2 lower-cases header names
+    return {name.title(): value for name, value in headers.items()}
+
+
+def gee_transport():
+    """
+    Transport to pass to ee.Initialize, or None to use the library's own
+    """
+    cassette = current()
+    return GEETransport(cassette) if cassette is not None else None
+
+
+class CassetteSession(requests.Session):
+    """
+    requests session that records or replays every request
+    """
+
+    def __init__(self, cassette):
+        super().__init__()
+        self.cassette = cassette
+
+    def request(self, method, url, params=None, data=None, headers=None, **kwargs):
+        full_url = requests.Request(method, url, params=params).prepare().url
+        body = data if isinstance(data, (str, bytes)) else None
+
+        if self.cassette.mode == 'replay':
+            status, response_headers, content = self.cassette.play(method, full_url, body)
+            response = requests.Response()
+            response.status_code = status
+            response.headers = CaseInsensitiveDict(response_headers)
+            response._content = content
+            response.url = full_url
+            response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+            return response
+
+        started = time.perf_counter()
+        response = super().request(method, url, params=params, data=data, headers=headers, **kwargs)
+        self.cassette.record('http', method, full_url, body, response.status_code, response.headers,
+                             response.content, time.perf_counter() - started)
+        return response
+
+
+def session():
+    """
+    Session for outbound HTTP: a recording or replaying one when a cassette is active
+    """
+    cassette = current()
+    return CassetteSession(cassette) if cassette is not None else requests.Session()
+
+
+def compact(source, destination):
+    """
+    Merge records with the same fingerprint and response into one line
+    carrying all their latencies, and gzip the result if destination ends in .gz
+    """
+    merged = {}
+    for record in read_records(source):
+        identity = (record['key'], record['status'], record.get('text'), record.get('base64'))
+        if identity in merged:
+            merged[identity]['latencies'].extend(record['latencies'])
+        else:
+            merged[identity] = dict(record, latencies=list(record['latencies']))
+    opener = gzip.open if destination.endswith('.gz') else open
+    with opener(destination, 'wt', encoding='utf-8') as f:
+        for record in merged.values():
+            f.write(json.dumps(record, separators=(',', ':')) + '\n')
+    return len(merged)
+
+
+def stats(path):
+    """
+    Call counts and latency percentiles per kind and host
+    """
+    groups = {}
+    for record in read_records(path):
+        host = requests.utils.urlparse(record['url']).netloc
+        group = groups.setdefault(f"{record['kind']} {host}", {'responses': 0, 'latencies': []})
+        group['responses'] += 1
+        group['latencies'].extend(record['latencies'])
+
+    summary = {}
+    for name, group in sorted(groups.items()):
+        latencies = sorted(group['latencies'])
+        quantiles = statistics.quantiles(latencies, n=20) if len(latencies) > 1 else latencies * 19
+        summary[name] = {
+            'distinct_responses': group['responses'],
+            'calls': len(latencies),
+            'latency_p50_ms': round(statistics.median(latencies) * 1000, 1),
+            'latency_p95_ms': round(quantiles[18] * 1000, 1)
+        }
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Manage recorded outbound traffic')
+    subcommands = parser.add_subparsers(dest='command', required=True)
+    compact_parser = subcommands.add_parser('compact', help='Merge duplicates and optionally gzip')
+    compact_parser.add_argument('source')
+    compact_parser.add_argument('destination')
+    stats_parser = subcommands.add_parser('stats', help='Summarize a cassette')
+    stats_parser.add_argument('path')
+    args = parser.parse_args()
+
+    if args.command == 'compact':
+        print(f'Wrote {compact(args.source, args.destination)} records to {args.destination}')
+    else:
+        print(json.dumps(stats(args.path), indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,588 @@
+"""
+Offline stand-in for the subset of the Earth Engine API used by server.py,
+selected with GEE_BACKEND=fake. Objects build a lazy expression graph like
+the real client library and are only evaluated by getInfo/getMapId, which
+is where latency and errors are injected and calls are counted.
+
+Data is synthetic but deterministic:
+- each collection has a scene every revisit interval (16 days for Landsat,
+  5 for Sentinel-2) within its mission dates,
+  shifted by longitude, and none near the poles;
+- each scene has a pseudo-random cloud cover (CLOUD_COVER and
+  CLOUDY_PIXEL_PERCENTAGE) that ee.Filter.lt/lte can filter on;
+- composites are smooth reflectance fields of location, season and year,
+  with water where the field dips, sampled on a grid of at most FAKE_EE_GRID²
+  points per reduction.
+
+Settings (environment or configure()):
+    FAKE_EE_LATENCY         seconds added to every call (default 0)
+    FAKE_EE_JITTER          extra uniform random latency (default 0)
+    FAKE_EE_ERROR_RATE      fraction of calls that raise EEException (default 0)
+    FAKE_EE_SEED            seed of the latency/error random generator
+    FAKE_EE_EMPTY_COLLECTIONS   comma-separated collections with no scenes
+    FAKE_EE_INIT_FAILURES   number of Initialize calls that fail first
+    FAKE_EE_GRID            samples per side of the reduction grid (default 32)
+"""
+import hashlib
+import math
+import os
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+import geodesy
+
+settings = {
+    'latency': float(os.environ.get('FAKE_EE_LATENCY', 0)),
+    'jitter': float(os.environ.get('FAKE_EE_JITTER', 0)),
+    'error_rate': float(os.environ.get('FAKE_EE_ERROR_RATE', 0)),
+    'error_message': os.environ.get('FAKE_EE_ERROR_MESSAGE', 'Too many concurrent aggregations.'),
+    'empty_collections': {name for name in os.environ.get('FAKE_EE_EMPTY_COLLECTIONS', '').split(',') if name},
+    'init_failures': int(os.environ.get('FAKE_EE_INIT_FAILURES', 0)),
+    'grid': int(os.environ.get('FAKE_EE_GRID', 32))
+}
+
+_rng = random.Random(int(os.environ.get('FAKE_EE_SEED', 0)))
+_lock = threading.Lock()
+_counts = {'getInfo': 0, 'getMapId': 0}
+_initialized = False
+
+# (first acquisition, revisit in days, bands, raw value = (reflectance - offset) / scale)
+COLLECTIONS = {
+    'LANDSAT/LC08/C02/T1_L2': ('2013-04-11', 16, [f'SR_B{i}' for i in range(1, 8)], 0.0000275, -0.2),
+    'LANDSAT/LE07/C02/T1_L2': ('1999-05-28', 16, [f'SR_B{i}' for i in (1, 2, 3, 4, 5, 7)], 0.0000275, -0.2),
+    'LANDSAT/LT05/C02/T1_L2': ('1984-03-16', 16, [f'SR_B{i}' for i in (1, 2, 3, 4, 5, 7)], 0.0000275, -0.2),
+    'COPERNICUS/S2_SR': ('2017-03-28', 5, ['B1', 'B2', 'B3', 'B4', 'B5', 'B6', 'B7', 'B8', 'B8A', 'B9', 'B11', 'B12'],
+                         0.0001, 0.0)
+}
+# Scenes are only acquired between these latitudes
+MAX_LATITUDE = 82.0
+
+
+class EEException(Exception):
+    pass
+
+
+def configure(**kwargs):
+    """
+    Change latency, error injection or data settings at runtime
+    """
+    seed = kwargs.pop('seed', None)
+    with _lock:
+        if seed is not None:
+            _rng.seed(seed)
+        for key, value in kwargs.items():
+            if key not in settings:
+                raise KeyError(f'Unknown fake Earth Engine setting {key}')
+            settings[key] = set(value) if key == 'empty_collections' else value
+
+
+def call_counts():
+    with _lock:
+        return dict(_counts)
+
+
+def reset_counts():
+    with _lock:
+        for key in _counts:
+            _counts[key] = 0
+
+
+def _call(kind):
+    with _lock:
+        _counts[kind] += 1
+        delay = settings['latency'] + (_rng.uniform(0, settings['jitter']) if settings['jitter'] else 0)
+        fail = settings['error_rate'] > 0 and _rng.random() < settings['error_rate']
+    if delay > 0:
+        time.sleep(delay)
+    if fail:
+        raise EEException(settings['error_message'])
+
+
+def Initialize(credentials=None, project=None, **kwargs):
+    global _initialized
+    with _lock:
+        if settings['init_failures'] > 0:
+            settings['init_failures'] -= 1
+            raise EEException('Fake Earth Engine initialization failure')
+        _initialized = True
+
+
+def Authenticate(*args, **kwargs):
+    pass
+
+
+def _evaluate(value):
+    if isinstance(value, ComputedObject):
+        return value._evaluate()
+    if isinstance(value, (list, tuple)):
+        return [_evaluate(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _evaluate(item) for key, item in value.items()}
+    return value
+
+
+class ComputedObject:
+    """
+    Lazy value; evaluate() computes it, getInfo() is the counted round trip
+    """
+
+    def __init__(self, evaluate, key):
+        self._evaluate_func = evaluate
+        self._key = key
+
+    def _evaluate(self):
+        return self._evaluate_func()
+
+    def getInfo(self):
+        _call('getInfo')
+        return self._evaluate()
+
+
+class Number(ComputedObject):
+    def __init__(self, value, key=None):
+        if isinstance(value, ComputedObject):
+            super().__init__(value._evaluate, value._key)
+        else:
+            super().__init__(lambda: value, key or ('Number', value))
+
+    def _binary(self, name, other, op):
+        return Number(ComputedObject(lambda: op(self._evaluate(), _evaluate(other)), (name, self._key, _key_of(other))))
+
+    def add(self, other):
+        return self._binary('add', other, lambda a, b: a + b)
+
+    def subtract(self, other):
+        return self._binary('subtract', other, lambda a, b: a - b)
+
+    def multiply(self, other):
+        return self._binary('multiply', other, lambda a, b: a * b)
+
+    def divide(self, other):
+        return self._binary('divide', other, lambda a, b: a / b)
+
+    def gt(self, other):
+        return self._binary('gt', other, lambda a, b: int(a > b))
+
+    def lt(self, other):
+        return self._binary('lt', other, lambda a, b: int(a < b))
+
+
+class List(ComputedObject):
+    def __init__(self, items):
+        super().__init__(lambda: _evaluate(list(items)), ('List', tuple(_key_of(item) for item in items)))
+
+
+class Dictionary(ComputedObject):
+    def __init__(self, values=None):
+        if isinstance(values, ComputedObject):
+            super().__init__(values._evaluate, values._key)
+        else:
+            values = dict(values or {})
+            super().__init__(lambda: _evaluate(values),
+                             ('Dictionary', tuple((key, _key_of(value)) for key, value in sorted(values.items()))))
+
+    def combine(self, second, overwrite=True):
+        def evaluate():
+            first, other = self._evaluate(), _evaluate(second)
+            return {**first, **other} if overwrite else {**other, **first}
+        return Dictionary(ComputedObject(evaluate, ('combine', self._key, _key_of(second))))
+
+
+class Algorithms:
+    @staticmethod
+    def If(condition, true_case, false_case):
+        # Only the selected branch is evaluated, as on the server
+        return ComputedObject(
+            lambda: _evaluate(true_case) if _evaluate(condition) else _evaluate(false_case),
+            ('If', _key_of(condition), _key_of(true_case), _key_of(false_case))
+        )
+
+
+def _key_of(value):
+    if isinstance(value, ComputedObject):
+        return value._key
+    if isinstance(value, (list, tuple)):
+        return tuple(_key_of(item) for item in value)
+    if isinstance(value, dict):
+        return tuple((key, _key_of(item)) for key, item in sorted(value.items()))
+    return value
+
+
+class Geometry(ComputedObject):
+    def __init__(self, geojson):
+        self.geojson = geojson
+        super().__init__(lambda: geojson, ('Geometry', _key_of(geojson)))
+
+    @staticmethod
+    def Polygon(coords, *args, **kwargs):
+        # A single ring may be given without the enclosing list of rings
+        if coords and isinstance(coords[0][0], (int, float)):
+            coords = [coords]
+        return Geometry({'type': 'Polygon', 'coordinates': coords})
+
+    @staticmethod
+    def LineString(coords, *args, **kwargs):
+        return Geometry({'type': 'LineString', 'coordinates': coords})
+
+    @staticmethod
+    def Rectangle(coords, *args, **kwargs):
+        west, south, east, north = coords
+        return Geometry.Polygon([[[west, south], [east, south], [east, north], [west, north], [west, south]]])
+
+    def bounds(self, *args, **kwargs):
+        west, south, east, north = self.bbox()
+        return Geometry.Rectangle([west, south, east, north])
+
+    def bbox(self):
+        points = []
+
+        def collect(value):
+            if value and isinstance(value[0], (int, float)):
+                points.append(value)
+            else:
+                for item in value:
+                    collect(item)
+
+        collect(self.geojson['coordinates'])
+        lons = [p[0] for p in points]
+        lats = [p[1] for p in points]
+        return min(lons), min(lats), max(lons), max(lats)
+
+    def area(self, *args, **kwargs):
+        return Number(ComputedObject(lambda: float(sum(geodesy.geometry_area(self.geojson))), ('area', self._key)))
+
+    def length(self, *args, **kwargs):
+        return Number(ComputedObject(lambda: float(sum(geodesy.geometry_length(self.geojson))), ('length', self._key)))
+
+
+def _cloud_cover(collection, date, phase):
+    digest = hashlib.sha1(f'{collection}/{date:%Y%m%d}/{phase}'.encode('utf-8')).hexdigest()
+    return int(digest[:8], 16) % 10000 / 100
+
+
+def _scene_dates(collection, start, end, bbox, filters=()):
+    """
+    Acquisition dates of a collection in [start, end) over a bounding box,
+    of the scenes that pass every metadata filter
+    """
+    if collection in settings['empty_collections'] or collection not in COLLECTIONS:
+        return []
+    first, revisit = COLLECTIONS[collection][:2]
+    start_dt = max(datetime.strptime(str(start)[:10], '%Y-%m-%d'), datetime.strptime(first, '%Y-%m-%d'))
+    end_dt = datetime.strptime(str(end)[:10], '%Y-%m-%d')
+    if bbox is not None:
+        west, south, east, north = bbox
+        if min(abs(south), abs(north)) > MAX_LATITUDE:
+            return []
+        phase = int((west + 180) * 10) % revisit
+    else:
+        phase = 0
+    dates = []
+    day = start_dt
+    while day < end_dt:
+        if (day.toordinal() + phase) % revisit == 0:
+            cloud_cover = _cloud_cover(collection, day, phase)
+            properties = {'CLOUD_COVER': cloud_cover, 'CLOUDY_PIXEL_PERCENTAGE': cloud_cover}
+            if all(test(properties) for test in filters):
+                dates.append(day)
+        day += timedelta(days=1)
+    return dates
+
+
+class Filter:
+    """
+    Metadata filters on image properties; images without the property never match
+    """
+
+    def __init__(self, test, key):
+        self.test = test
+        self._key = key
+
+    @staticmethod
+    def lt(name, value):
+        return Filter(lambda properties: name in properties and properties[name] < value, ('lt', name, value))
+
+    @staticmethod
+    def lte(name, value):
+        return Filter(lambda properties: name in properties and properties[name] <= value, ('lte', name, value))
+
+
+class ImageCollection(ComputedObject):
+    def __init__(self, name, start=None, end=None, geometry=None, filters=()):
+        self.name = name
+        self.start = start
+        self.end = end
+        self.geometry = geometry
+        self.filters = tuple(filters)
+        super().__init__(self._info, ('ImageCollection', name, start, end, _key_of(geometry),
+                                      tuple(f._key for f in self.filters)))
+
+    def filterDate(self, start, end=None):
+        end = end or (datetime.strptime(str(start)[:10], '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')
+        return ImageCollection(self.name, start, end, self.geometry, self.filters)
+
+    def filterBounds(self, geometry):
+        return ImageCollection(self.name, self.start, self.end, geometry, self.filters)
+
+    def filter(self, metadata_filter):
+        return ImageCollection(self.name, self.start, self.end, self.geometry, self.filters + (metadata_filter,))
+
+    def _dates(self):
+        start = self.start or COLLECTIONS.get(self.name, ('1970-01-01',))[0]
+        end = self.end or datetime.now().strftime('%Y-%m-%d')
+        return _scene_dates(self.name, start, end, self.geometry.bbox() if self.geometry is not None else None,
+                            [f.test for f in self.filters])
+
+    def _info(self):
+        return {'type': 'ImageCollection', 'id': self.name,
+                'features': [{'type': 'Image', 'id': f"{self.name}/{d:%Y%m%d}"} for d in self._dates()]}
+
+    def size(self):
+        return Number(ComputedObject(lambda: len(self._dates()), ('size', self._key)))
+
+    def median(self):
+        def bands(region):
+            dates = self._dates()
+            if not dates:
+                return {}
+            mid = dates[len(dates) // 2]
+            return _synthetic_bands(self.name, mid, region)
+        return Image(bands, ('median', self._key))
+
+
+def _synthetic_bands(collection, date, region):
+    """
+    Raw (unscaled) band values of a composite sampled on the region grid
+    """
+    _, _, names, scale, offset = COLLECTIONS[collection]
+    lon, lat = region.coordinates()
+    # Land cover varies over a few kilometres and drifts slowly from year to year
+    drift = (date.year - 2000) * 0.3
+    land = 0.5 + 0.25 * np.sin(lon * 2 * math.pi / 0.05 + drift) + 0.25 * np.cos(lat * 2 * math.pi / 0.05)
+    water = land < 0.2
+    season = 0.5 + 0.5 * math.sin(2 * math.pi * (date.timetuple().tm_yday - 100) / 365.0)
+
+    blue = np.full_like(land, 0.04)
+    green = np.where(water, 0.08, 0.06 + 0.04 * land)
+    red = np.where(water, 0.03, 0.05 + 0.1 * (1 - land))
+    nir = np.where(water, 0.02, 0.05 + 0.35 * land * (0.5 + 0.5 * season))
+    swir = np.where(water, 0.01, 0.1 + 0.1 * (1 - land))
+    if collection.startswith('LANDSAT'):
+        reflectance = {'SR_B1': blue, 'SR_B2': blue, 'SR_B3': green, 'SR_B4': red, 'SR_B5': nir,
+                       'SR_B6': swir, 'SR_B7': swir}
+    else:
+        reflectance = {'B1': blue, 'B2': blue, 'B3': green, 'B4': red, 'B5': nir * 0.8, 'B6': nir * 0.9,
+                       'B7': nir, 'B8': nir, 'B8A': nir, 'B9': nir * 0.5, 'B11': swir, 'B12': swir}
+    return {
+        name: np.ma.masked_array((reflectance[name] - offset) / scale, mask=np.zeros(land.shape, dtype=bool))
+        for name in names
+    }
+
+
+class _Region:
+    """
+    Sampling grid over the bounding box of the region being reduced
+    """
+
+    def __init__(self, geometry, scale, grid):
+        self.west, self.south, self.east, self.north = geometry.bbox()
+        self.scale = scale
+        mid_lat = math.radians((self.south + self.north) / 2)
+        width_m = (self.east - self.west) * 111320 * math.cos(mid_lat)
+        height_m = (self.north - self.south) * 110540
+        self.size = max(1, min(grid, int(math.ceil(max(width_m, height_m) / scale))))
+        self.area = float(sum(geodesy.geometry_area(geometry.geojson)))
+        # Number of real pixels each grid sample stands for
+        self.weight = self.area / scale ** 2 / self.size ** 2
+
+    def coordinates(self):
+        lons = np.linspace(self.west, self.east, self.size)
+        lats = np.linspace(self.south, self.north, self.size)
+        return np.meshgrid(lons, lats)
+
+
+class Image(ComputedObject):
+    """
+    Lazy image: a function from a sampling region to {band: masked array}
+    """
+
+    def __init__(self, bands=None, key=None):
+        if bands is None:
+            bands = {}
+        self._bands = bands if callable(bands) else (lambda region, values=bands: dict(values))
+        super().__init__(lambda: {'type': 'Image'}, key or ('Image',))
+
+    def _compute(self, region):
+        return self._bands(region)
+
+    def getInfo(self):
+        _call('getInfo')
+        return {'type': 'Image', 'bands': []}
+
+    @staticmethod
+    def pixelArea():
+        def bands(region):
+            shape = (region.size, region.size)
+            return {'area': np.ma.masked_array(np.full(shape, float(region.scale ** 2)), mask=np.zeros(shape, bool))}
+        return Image(bands, ('pixelArea',))
+
+    @staticmethod
+    def cat(images):
+        def bands(region):
+            merged = {}
+            for image in images:
+                merged.update(image._compute(region))
+            return merged
+        return Image(bands, ('cat', tuple(image._key for image in images)))
+
+    def select(self, selectors, *args):
+        names = [selectors] if isinstance(selectors, str) else list(selectors)
+
+        def bands(region):
+            source = self._compute(region)
+            missing = [name for name in names if name not in source]
+            if missing:
+                raise EEException(f"Image.select: Band pattern '{missing[0]}' did not match any bands.")
+            return {name: source[name] for name in names}
+        return Image(bands, ('select', self._key, tuple(names)))
+
+    def rename(self, *names):
+        if len(names) == 1 and isinstance(names[0], (list, tuple)):
+            names = names[0]
+
+        def bands(region):
+            source = self._compute(region)
+            if len(source) != len(names):
+                raise EEException('Image.rename: The number of names must match the number of bands.')
+            return dict(zip(names, source.values()))
+        return Image(bands, ('rename', self._key, tuple(names)))
+
+    def _binary(self, name, other, op):
+        def bands(region):
+            left = self._compute(region)
+            if isinstance(other, Image):
+                right = list(other._compute(region).values())
+                if len(right) == 1:
+                    right = right * len(left)
+                if len(right) != len(left):
+                    raise EEException(f'Image.{name}: Images must have the same number of bands.')
+            else:
+                right = [other] * len(left)
+            return {band: op(values, operand) for (band, values), operand in zip(left.items(), right)}
+        return Image(bands, (name, self._key, _key_of(other)))
+
+    def add(self, other):
+        return self._binary('add', other, lambda a, b: a + b)
+
+    def subtract(self, other):
+        return self._binary('subtract', other, lambda a, b: a - b)
+
+    def multiply(self, other):
+        return self._binary('multiply', other, lambda a, b: a * b)
+
+    def divide(self, other):
+        return self._binary('divide', other, lambda a, b: a / b)
+
+    def gt(self, other):
+        return self._binary('gt', other, lambda a, b: (a > b).astype(float))
+
+    def lt(self, other):
+        return self._binary('lt', other, lambda a, b: (a < b).astype(float))
+
+    def mask(self):
+        def bands(region):
+            return {
+                band: np.ma.masked_array((~np.ma.getmaskarray(values)).astype(float), mask=np.zeros(values.shape, bool))
+                for band, values in self._compute(region).items()
+            }
+        return Image(bands, ('mask', self._key))
+
+    def updateMask(self, mask):
+        def bands(region):
+            mask_values = list(mask._compute(region).values())[0]
+            keep = np.ma.filled(mask_values, 0) != 0
+            return {
+                band: np.ma.masked_array(values.data, mask=np.ma.getmaskarray(values) | ~keep)
+                for band, values in self._compute(region).items()
+            }
+        return Image(bands, ('updateMask', self._key, mask._key))
+
+    def reduceRegion(self, reducer, geometry=None, scale=None, maxPixels=None, **kwargs):
+        def evaluate():
+            if geometry is None:
+                raise EEException('Image.reduceRegion: No geometry specified.')
+            region = _Region(geometry, scale or 1000, settings['grid'])
+            bands = self._compute(region)
+            result = {}
+            for band, values in bands.items():
+                for output, value in reducer.apply(values, region.weight):
+                    if len(reducer.outputs) == 1:
+                        result[band] = value
+                    else:
+                        result[f'{band}_{output}'] = value
+            return result
+        return Dictionary(ComputedObject(evaluate, ('reduceRegion', self._key, reducer._key, _key_of(geometry), scale)))
+
+    def getMapId(self, vis_params=None):
+        _call('getMapId')
+        # Like Earth Engine, fail when the bands to display do not exist,
+        # e.g. in the composite of a collection without images
+        bands = self._compute(_Region(Geometry.Rectangle([0, 0, 0.01, 0.01]), 1000, 1))
+        for name in (vis_params or {}).get('bands', []):
+            if name not in bands:
+                raise EEException(f"Image.visualize: No band named '{name}'. Available band names: {list(bands)}.")
+        digest = hashlib.sha1(repr((self._key, _key_of(vis_params or {}))).encode('utf-8')).hexdigest()[:32]
+        return {'mapid': f'projects/fake-project/maps/{digest}', 'token': '', 'image': self}
+
+
+class Reducer:
+    """
+    Reducer outputs as (name, function of (valid values, pixel weight)) pairs
+    """
+
+    def __init__(self, outputs, key):
+        self.outputs = outputs
+        self._key = key
+
+    def apply(self, values, weight):
+        valid = values.compressed()
+        return [(name, func(valid, weight)) for name, func in self.outputs]
+
+    def combine(self, reducer2, outputPrefix='', sharedInputs=False):
+        return Reducer(self.outputs + [(outputPrefix + name, func) for name, func in reducer2.outputs],
+                       ('combine', self._key, reducer2._key))
+
+    @staticmethod
+    def mean():
+        return Reducer([('mean', lambda v, w: float(v.mean()) if v.size else None)], ('mean',))
+
+    @staticmethod
+    def stdDev():
+        return Reducer([('stdDev', lambda v, w: float(v.std()) if v.size else None)], ('stdDev',))
+
+    @staticmethod
+    def sum():
+        return Reducer([('sum', lambda v, w: float(v.sum() * w))], ('sum',))
+
+    @staticmethod
+    def count():
+        return Reducer([('count', lambda v, w: int(round(v.size * w)))], ('count',))
+
+    @staticmethod
+    def percentile(percentiles, outputNames=None):
+        names = outputNames or [f'p{p}' for p in percentiles]
+        return Reducer([
+            (name, lambda v, w, p=p: float(np.percentile(v, p)) if v.size else None)
+            for name, p in zip(names, percentiles)
+        ], ('percentile', tuple(percentiles)))
+
+    @staticmethod
+    def fixedHistogram(min, max, steps, cumulative=False):
+        def histogram(v, w):
+            counts, edges = np.histogram(v[(v >= min) & (v < max)], bins=steps, range=(min, max))
+            return [[float(lower), float(count * w)] for lower, count in zip(edges[:-1], counts)]
+        return Reducer([('histogram', histogram)], ('fixedHistogram', min, max, steps))
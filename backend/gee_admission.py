@@ -0,0 +1,281 @@
+"""
+Host-wide admission control for Earth Engine calls. Earth Engine limits
+concurrent requests per project, so all gunicorn workers draw from one pool
+of GEE_GLOBAL_CONCURRENCY slots kept in a SQLite file.
+
+Calls have a priority class: interactive (map layers), stats (analyses)
+or batch (batch renders). Waiting calls are admitted strictly by class, then
+in arrival order, and each class may only fill its share of the slots
+(GEE_ADMISSION_SHARES), so batch work soaks up spare quota while leaving
+room for interactive calls to start at once. Each class has a bounded wait
+queue (GEE_ADMISSION_MAX_QUEUE) and calls wait at most GEE_ADMISSION_MAX_WAIT
+seconds; beyond either limit they are rejected.
+
+Slots and queue entries expire, so a worker that dies while holding or
+waiting for a slot does not leak it; live workers renew the slots they hold
+until the call finishes, however long it runs. Waiting calls poll with reads
+and only take the write lock once a slot looks free.
+"""
+import contextvars
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+
+import metrics
+from sqlite_store import ThreadLocalConnection, state_path
+
+# 0 disables host-wide admission control
+GEE_GLOBAL_CONCURRENCY = int(os.environ.get('GEE_GLOBAL_CONCURRENCY', 16))
+GEE_ADMISSION_PATH = os.environ.get('GEE_ADMISSION_PATH', state_path('gee_admission.sqlite3'))
+GEE_ADMISSION_MAX_QUEUE = int(os.environ.get('GEE_ADMISSION_MAX_QUEUE', 64))
+GEE_ADMISSION_MAX_WAIT = float(os.environ.get('GEE_ADMISSION_MAX_WAIT', 30))
+# Share of the slots each class may fill, e.g. "interactive=1,stats=0.75,batch=0.5"
+GEE_ADMISSION_SHARES = os.environ.get('GEE_ADMISSION_SHARES', 'interactive=1,stats=0.75,batch=0.5')
+# Slots are renewed every third of this while their call runs, so this only
+# bounds how long the slots of a dead worker stay taken
+GEE_ADMISSION_LEASE_TTL = float(os.environ.get('GEE_ADMISSION_LEASE_TTL', 30))
+
+# Lower values are admitted first
+PRIORITIES = {'interactive': 0, 'stats': 1, 'batch': 2}
+# Queue entries not refreshed for this long belong to a dead worker
+WAITER_TTL = 5.0
+POLL_MIN = 0.005
+POLL_MAX = 0.05
+
+ADMISSION_SCHEMA = """
+CREATE TABLE IF NOT EXISTS leases (
+    id TEXT PRIMARY KEY,
+    priority INTEGER NOT NULL,
+    expires REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS waiters (
+    id TEXT PRIMARY KEY,
+    priority INTEGER NOT NULL,
+    enqueued REAL NOT NULL,
+    expires REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS waiters_order ON waiters (priority, enqueued);
+"""
+
+_priority = contextvars.ContextVar('gee_priority', default='interactive')
+
+
+class AdmissionRejected(Exception):
+    """
+    Raised when a call's wait queue is full or it waited too long for a slot
+    """
+
+
+def set_priority(priority):
+    """
+    Priority class of the Earth Engine calls made by the current request,
+    including work it hands to other threads through tracing.propagate
+    """
+    if priority not in PRIORITIES:
+        raise ValueError(f'Unknown Earth Engine priority class {priority}')
+    _priority.set(priority)
+
+
+def current_priority():
+    return _priority.get()
+
+
+def parse_shares(value):
+    shares = {name: 1.0 for name in PRIORITIES}
+    for item in value.split(','):
+        if item.strip():
+            name, share = item.split('=')
+            if name.strip() not in PRIORITIES:
+                raise ValueError(f'Unknown Earth Engine priority class {name.strip()}')
+            shares[name.strip()] = float(share)
+    return shares
+
+
+class AdmissionController:
+    """
+    Counting semaphore with priority classes, shared by every process that
+    opens the same SQLite file
+    """
+
+    def __init__(self, path, limit, shares=None, max_queue=GEE_ADMISSION_MAX_QUEUE,
+                 max_wait=GEE_ADMISSION_MAX_WAIT, lease_ttl=GEE_ADMISSION_LEASE_TTL):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.lease_ttl = lease_ttl
+        shares = shares or {}
+        # Every class gets at least one slot, and never more than a class above it
+        self.caps = {}
+        cap = limit
+        for name, level in sorted(PRIORITIES.items(), key=lambda item: item[1]):
+            cap = min(cap, max(1, int(limit * shares.get(name, 1.0))))
+            self.caps[name] = cap
+        self._db = ThreadLocalConnection(path, ADMISSION_SCHEMA)
+        # Leases held by this process, renewed by a background thread
+        self._held = set()
+        self._held_lock = threading.Lock()
+        self._renewer = None
+
+    def _transaction(self, work):
+        conn = self._db.get()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            now = time.time()
+            conn.execute('DELETE FROM leases WHERE expires < ?', (now,))
+            conn.execute('DELETE FROM waiters WHERE expires < ?', (now,))
+            result = work(conn, now)
+            conn.execute('COMMIT')
+            return result
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+    def _admission_state(self, conn, now, level, enqueued, lease_id):
+        """
+        (slots in use, live waiters ahead of a call) for a queue position
+        """
+        return conn.execute(
+            'SELECT (SELECT COUNT(*) FROM leases WHERE expires >= ?), '
+            '(SELECT COUNT(*) FROM waiters WHERE expires >= ? AND id != ? AND (priority < ? OR '
+            '(priority = ? AND (enqueued < ? OR (enqueued = ? AND id < ?)))))',
+            (now, now, lease_id, level, level, enqueued, enqueued, lease_id)
+        ).fetchone()
+
+    def acquire(self, priority, max_wait=None):
+        """
+        Wait for a slot and return its lease ID, to be passed to release().
+        Raises AdmissionRejected.
+        """
+        level = PRIORITIES[priority]
+        max_wait = self.max_wait if max_wait is None else max_wait
+        lease_id = uuid.uuid4().hex
+        started = time.monotonic()
+
+        def admit(conn, now, enqueued):
+            active, ahead = self._admission_state(conn, now, level, enqueued, lease_id)
+            if ahead == 0 and active < self.caps[priority]:
+                conn.execute('DELETE FROM waiters WHERE id = ?', (lease_id,))
+                conn.execute('INSERT INTO leases (id, priority, expires) VALUES (?, ?, ?)',
+                             (lease_id, level, now + self.lease_ttl))
+                return True
+            return False
+
+        def enqueue(conn, now):
+            # A call that finds a free slot and nobody ahead is admitted in the same transaction
+            if admit(conn, now, now):
+                return True
+            depth = conn.execute('SELECT COUNT(*) FROM waiters WHERE priority = ?', (level,)).fetchone()[0]
+            if depth >= self.max_queue:
+                return None
+            conn.execute('INSERT INTO waiters (id, priority, enqueued, expires) VALUES (?, ?, ?, ?)',
+                         (lease_id, level, now, now + WAITER_TTL))
+            return now
+
+        enqueued = self._transaction(enqueue)
+        if enqueued is None:
+            metrics.observe_gee_admission(priority, 'rejected')
+            raise AdmissionRejected(f'The {priority} Earth Engine queue is full')
+
+        def try_admit(conn, now):
+            if admit(conn, now, enqueued):
+                return True
+            # Still waiting: keep the queue entry alive
+            conn.execute('UPDATE waiters SET expires = ? WHERE id = ?', (now + WAITER_TTL, lease_id))
+            return False
+
+        delay = POLL_MIN
+        refreshed = time.time()
+        try:
+            while enqueued is not True:
+                # Poll with reads; the write lock is only taken when a slot looks
+                # free, or to keep the queue entry from expiring
+                now = time.time()
+                active, ahead = self._admission_state(self._db.get(), now, level, enqueued, lease_id)
+                if (ahead == 0 and active < self.caps[priority]) or now - refreshed > WAITER_TTL / 2:
+                    if self._transaction(try_admit):
+                        break
+                    refreshed = now
+                remaining = max_wait - (time.monotonic() - started)
+                if remaining <= 0:
+                    metrics.observe_gee_admission(priority, 'timeout', time.monotonic() - started)
+                    raise AdmissionRejected(
+                        f'No Earth Engine slot for a {priority} call within {max_wait:g}s'
+                    )
+                time.sleep(min(remaining, random.uniform(delay / 2, delay)))
+                delay = min(delay * 2, POLL_MAX)
+        except BaseException:
+            self._transaction(lambda conn, now: conn.execute('DELETE FROM waiters WHERE id = ?', (lease_id,)))
+            raise
+
+        metrics.observe_gee_admission(priority, 'admitted', time.monotonic() - started)
+        self._hold(lease_id)
+        return lease_id
+
+    def release(self, lease_id):
+        with self._held_lock:
+            self._held.discard(lease_id)
+        self._transaction(lambda conn, now: conn.execute('DELETE FROM leases WHERE id = ?', (lease_id,)))
+
+    def _hold(self, lease_id):
+        with self._held_lock:
+            self._held.add(lease_id)
+            if self._renewer is None:
+                self._renewer = threading.Thread(target=self._renew, name='gee-admission-renew', daemon=True)
+                self._renewer.start()
+
+    def _renew(self):
+        """
+        Extend the leases of this process until none is held, in one
+        transaction per round
+        """
+        while True:
+            time.sleep(self.lease_ttl / 3)
+            with self._held_lock:
+                held = list(self._held)
+                if not held:
+                    self._renewer = None
+                    return
+            try:
+                self._transaction(lambda conn, now: conn.executemany(
+                    'UPDATE leases SET expires = ? WHERE id = ?', [(now + self.lease_ttl, lease) for lease in held]
+                ))
+            except sqlite3.Error as e:
+                print(f"Failed to renew Earth Engine slots: {e}")
+
+    def snapshot(self):
+        """
+        Slots in use and calls waiting per priority class, host-wide
+        """
+        conn = self._db.get()
+        now = time.time()
+        counts = {}
+        for table in ('leases', 'waiters'):
+            rows = conn.execute(f'SELECT priority, COUNT(*) FROM {table} WHERE expires >= ? GROUP BY priority',
+                                (now,)).fetchall()
+            counts[table] = dict(rows)
+        return {
+            'limit': self.limit,
+            'caps': dict(self.caps),
+            'active': {name: counts['leases'].get(level, 0) for name, level in PRIORITIES.items()},
+            'waiting': {name: counts['waiters'].get(level, 0) for name, level in PRIORITIES.items()}
+        }
+
+    def publish(self):
+        """
+        Export the host-wide queue depth and slots in use as metrics. Called
+        when metrics are scraped rather than on every call, since it reads
+        the shared store.
+        """
+        if not metrics.enabled():
+            return
+        snapshot = self.snapshot()
+        for name in PRIORITIES:
+            metrics.set_gee_admission_state(name, snapshot['active'][name], snapshot['waiting'][name])
+
+
+controller = AdmissionController(
+    GEE_ADMISSION_PATH, GEE_GLOBAL_CONCURRENCY, parse_shares(GEE_ADMISSION_SHARES)
+) if GEE_GLOBAL_CONCURRENCY > 0 else None
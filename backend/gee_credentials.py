@@ -0,0 +1,86 @@
+"""
+Service account credentials for Earth Engine, built from the key held in
+memory and kept fresh by a background thread so requests never pay for a
+token refresh.
+"""
+import json
+import os
+import threading
+from datetime import datetime, timezone
+
+import requests
+
+# Refresh the access token this many seconds before it expires
+GEE_TOKEN_REFRESH_MARGIN = float(os.environ.get('GEE_TOKEN_REFRESH_MARGIN', 300))
+GEE_TOKEN_RETRY_DELAY = float(os.environ.get('GEE_TOKEN_RETRY_DELAY', 30))
+
+GEE_SCOPES = [
+    'https://www.googleapis.com/auth/earthengine',
+    'https://www.googleapis.com/auth/cloud-platform'
+]
+
+
+def service_account_credentials(key_json):
+    """
+    Credentials from a service account key given as a JSON string
+    """
+    from google.oauth2 import service_account
+
+    return service_account.Credentials.from_service_account_info(json.loads(key_json), scopes=GEE_SCOPES)
+
+
+class TokenRefresher:
+    """
+    Refreshes credentials ahead of expiry on a daemon thread. Earth Engine's
+    authorized transport shares the credentials object, so it always finds a
+    valid token. Token requests reuse one keep-alive session.
+    """
+
+    def __init__(self, credentials, margin=GEE_TOKEN_REFRESH_MARGIN, retry_delay=GEE_TOKEN_RETRY_DELAY):
+        self.credentials = credentials
+        self.margin = margin
+        self.retry_delay = retry_delay
+        self.refreshes = 0
+        self.failures = 0
+        self._session = requests.Session()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def refresh(self):
+        from google.auth.transport.requests import Request
+
+        self.credentials.refresh(Request(self._session))
+        self.refreshes += 1
+
+    def seconds_until_refresh(self):
+        """
+        Seconds until the token enters the refresh margin, 0 if it already has
+        """
+        expiry = self.credentials.expiry
+        if not self.credentials.token or expiry is None:
+            return 0
+        # google-auth stores expiry as a naive UTC datetime
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        return max(0, (expiry - now).total_seconds() - self.margin)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='gee-token', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            wait = self.seconds_until_refresh()
+            if wait > 0:
+                self._stop.wait(wait)
+                continue
+            try:
+                self.refresh()
+            except Exception as e:
+                # The transport still refreshes on demand if this keeps failing
+                self.failures += 1
+                print(f"Earth Engine token refresh failed: {e}")
+                self._stop.wait(self.retry_delay)
@@ -0,0 +1,185 @@
+"""
+Bounded execution of blocking Earth Engine calls (getInfo, getMapId).
+
+Every outbound GEE call runs on a shared thread pool so the number of
+concurrent calls per worker is capped, excess load is rejected quickly
+instead of queueing without limit, and a request never waits longer than
+GEE_CALL_TIMEOUT for a single call. Calls also take a host-wide slot from
+gee_admission, shared by all workers and granted by priority class. Initialization itself runs in the
+background and is retried until it succeeds.
+"""
+import os
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+import gee_admission
+import metrics
+import tracing
+
+GEE_MAX_CONCURRENCY = int(os.environ.get('GEE_MAX_CONCURRENCY', 8))
+GEE_MAX_PENDING = int(os.environ.get('GEE_MAX_PENDING', 32))
+GEE_CALL_TIMEOUT = float(os.environ.get('GEE_CALL_TIMEOUT', 60))
+# Initialization retries back off from GEE_INIT_RETRY_DELAY up to GEE_INIT_MAX_DELAY
+GEE_INIT_RETRY_DELAY = float(os.environ.get('GEE_INIT_RETRY_DELAY', 2))
+GEE_INIT_MAX_DELAY = float(os.environ.get('GEE_INIT_MAX_DELAY', 300))
+# How long a request waits for initialization before giving up
+GEE_READY_TIMEOUT = float(os.environ.get('GEE_READY_TIMEOUT', 10))
+
+
+class GEEBusyError(Exception):
+    """
+    Raised when too many Earth Engine calls are already running or queued
+    """
+
+
+class GEETimeoutError(Exception):
+    """
+    Raised when an Earth Engine call does not complete in time
+    """
+
+
+_executor = ThreadPoolExecutor(max_workers=GEE_MAX_CONCURRENCY, thread_name_prefix='gee')
+_slots = threading.BoundedSemaphore(GEE_MAX_CONCURRENCY + GEE_MAX_PENDING)
+
+
+def run_gee(operation, func, *args, timeout=None, priority=None, **kwargs):
+    """
+    Run a blocking Earth Engine call on the bounded executor and wait for its result.
+    operation names the call (e.g. 'satellite.plan') in errors and logs; priority
+    defaults to the class set for the current request.
+    """
+    priority = priority or gee_admission.current_priority()
+    with tracing.span(f'gee {operation}', operation=operation, priority=priority):
+        return _run_gee(operation, func, args, kwargs, timeout, priority)
+
+
+def _admit(priority):
+    """
+    Take a host-wide slot. Returns its lease, or None when admission control
+    is disabled or its store is unavailable (calls are then only limited per worker).
+    """
+    if gee_admission.controller is None:
+        return None
+    try:
+        with tracing.span('gee admission', priority=priority):
+            return gee_admission.controller.acquire(priority)
+    except sqlite3.Error as e:
+        print(f"Earth Engine admission control unavailable: {e}")
+        return None
+
+
+def _release(lease):
+    _slots.release()
+    if lease is not None:
+        try:
+            gee_admission.controller.release(lease)
+        except sqlite3.Error as e:
+            # The lease expires by itself
+            print(f"Failed to release Earth Engine slot: {e}")
+
+
+def _run_gee(operation, func, args, kwargs, timeout, priority):
+    if not _slots.acquire(blocking=False):
+        metrics.observe_gee_call(operation, 'busy')
+        raise GEEBusyError(f'Too many pending Earth Engine calls, rejected {operation}')
+    try:
+        lease = _admit(priority)
+    except gee_admission.AdmissionRejected as e:
+        _slots.release()
+        metrics.observe_gee_call(operation, 'busy')
+        raise GEEBusyError(f'{e}, rejected {operation}')
+    started = time.perf_counter()
+    try:
+        future = _executor.submit(func, *args, **kwargs)
+    except Exception:
+        _release(lease)
+        raise
+    future.add_done_callback(lambda _: _release(lease))
+
+    timeout = GEE_CALL_TIMEOUT if timeout is None else timeout
+    try:
+        result = future.result(timeout=timeout)
+    except FutureTimeoutError:
+        metrics.observe_gee_call(operation, 'timeout', time.perf_counter() - started)
+        raise GEETimeoutError(f'Earth Engine call {operation} did not complete within {timeout:.0f}s')
+    except Exception:
+        metrics.observe_gee_call(operation, 'error', time.perf_counter() - started)
+        raise
+    metrics.observe_gee_call(operation, 'ok', time.perf_counter() - started)
+    return result
+
+
+class GEEConfigurationError(Exception):
+    """
+    Raised by an initialization function for failures that retrying cannot
+    fix, like a missing project ID or invalid credentials
+    """
+
+
+class BackgroundInitializer:
+    """
+    Runs an initialization function on a background thread, retrying with
+    exponential backoff and jitter until it returns True, or until it raises
+    GEEConfigurationError. Requests wait on the readiness event instead of
+    blocking the worker while it boots.
+    """
+
+    def __init__(self, init, retry_delay=GEE_INIT_RETRY_DELAY, max_delay=GEE_INIT_MAX_DELAY):
+        self.init = init
+        self.retry_delay = retry_delay
+        self.max_delay = max_delay
+        self.ready = threading.Event()
+        # Set once the first attempt has finished, whether or not it succeeded
+        self.attempted = threading.Event()
+        self.attempts = 0
+        # Reason initialization stopped retrying, after a GEEConfigurationError
+        self.failure = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """
+        Start the initialization thread if it is not already running
+        """
+        with self._lock:
+            if self._thread is None and not self.ready.is_set():
+                self._thread = threading.Thread(target=self._run, name='gee-init', daemon=True)
+                self._thread.start()
+
+    def wait(self, timeout=GEE_READY_TIMEOUT):
+        """
+        Wait up to timeout seconds for the first initialization attempt.
+        Returns True when ready. Once an attempt has failed this returns
+        at once, while the retries go on in the background.
+        """
+        self.start()
+        self.attempted.wait(timeout)
+        return self.ready.is_set()
+
+    def _run(self):
+        delay = self.retry_delay
+        while True:
+            self.attempts += 1
+            try:
+                succeeded = self.init()
+            except GEEConfigurationError as e:
+                print(f"Earth Engine initialization attempt {self.attempts} failed permanently, not retrying: {e}")
+                self.failure = str(e)
+                self.attempted.set()
+                return
+            except Exception as e:
+                print(f"Earth Engine initialization attempt {self.attempts} raised: {e}")
+                succeeded = False
+            if succeeded:
+                self.ready.set()
+                self.attempted.set()
+                return
+            self.attempted.set()
+            # Full jitter keeps workers that failed together from retrying together
+            sleep = random.uniform(0, delay)
+            print(f"Earth Engine initialization attempt {self.attempts} failed, retrying in {sleep:.1f}s")
+            time.sleep(sleep)
+            delay = min(delay * 2, self.max_delay)
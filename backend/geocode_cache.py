@@ -0,0 +1,124 @@
+"""
+Persistent geocoding cache shared by all workers through a SQLite file,
+so a warm cache survives restarts and keeps us within Nominatim's usage policy.
+"""
+import json
+import os
+import threading
+import time
+import unicodedata
+
+import metrics
+from sqlite_store import ThreadLocalConnection, state_path
+
+GEOCODE_CACHE_PATH = os.environ.get('GEOCODE_CACHE_PATH', state_path('geocode.sqlite3'))
+GEOCODE_CACHE_TTL = int(os.environ.get('GEOCODE_CACHE_TTL', 30 * 24 * 3600))
+# "Not found" answers are kept for a shorter time in case OSM data gets fixed
+GEOCODE_NEGATIVE_TTL = int(os.environ.get('GEOCODE_NEGATIVE_TTL', 24 * 3600))
+GEOCODE_CACHE_MAX_ENTRIES = int(os.environ.get('GEOCODE_CACHE_MAX_ENTRIES', 10000))
+# Hits only refresh an entry's LRU position once it is this many seconds old, so
+# reads rarely take the write lock shared by all workers
+GEOCODE_ACCESS_INTERVAL = float(os.environ.get('GEOCODE_ACCESS_INTERVAL', 60))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS geocode (
+    query TEXT PRIMARY KEY,
+    result TEXT,
+    expires_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS geocode_last_access ON geocode (last_access);
+"""
+
+
+def normalize_query(query):
+    """
+    Case- and whitespace-insensitive cache key for a free-text location
+    """
+    return ' '.join(unicodedata.normalize('NFKC', query).casefold().split())
+
+
+class GeocodeCache:
+    """
+    SQLite-backed cache of geocoding results with TTL expiry, LRU eviction
+    and negative caching. A cached result of None means "location not found".
+    """
+
+    def __init__(self, path=GEOCODE_CACHE_PATH, ttl=GEOCODE_CACHE_TTL,
+                 negative_ttl=GEOCODE_NEGATIVE_TTL, max_entries=GEOCODE_CACHE_MAX_ENTRIES,
+                 access_interval=GEOCODE_ACCESS_INTERVAL):
+        self.name = 'geocode'
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.access_interval = access_interval
+        self._db = ThreadLocalConnection(path, SCHEMA)
+        # Per-worker counters; the metrics export aggregates lookups over all workers
+        self._hits = 0
+        self._misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, query):
+        """
+        Return (found, result). found is False on a miss; result may be None
+        for a cached "not found" answer.
+        """
+        key = normalize_query(query)
+        now = time.time()
+        conn = self._db.get()
+        row = conn.execute('SELECT result, expires_at, last_access FROM geocode WHERE query = ?', (key,)).fetchone()
+        if row is None or row[1] <= now:
+            with self._lock:
+                self._misses += 1
+            metrics.count_cache_lookup(self.name, False)
+            return False, None
+
+        if now - row[2] >= self.access_interval:
+            conn.execute('UPDATE geocode SET last_access = ? WHERE query = ?', (now, key))
+        with self._lock:
+            self._hits += 1
+        metrics.count_cache_lookup(self.name, True)
+        return True, (json.loads(row[0]) if row[0] is not None else None)
+
+    def set(self, query, result):
+        """
+        Store a geocoding result, or None for a location that was not found
+        """
+        key = normalize_query(query)
+        now = time.time()
+        ttl = self.ttl if result is not None else self.negative_ttl
+        payload = json.dumps(result) if result is not None else None
+        conn = self._db.get()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute(
+                'INSERT OR REPLACE INTO geocode (query, result, expires_at, last_access) VALUES (?, ?, ?, ?)',
+                (key, payload, now + ttl, now)
+            )
+            conn.execute('DELETE FROM geocode WHERE expires_at <= ?', (now,))
+            (count,) = conn.execute('SELECT COUNT(*) FROM geocode').fetchone()
+            if count > self.max_entries:
+                conn.execute(
+                    'DELETE FROM geocode WHERE query IN '
+                    '(SELECT query FROM geocode ORDER BY last_access LIMIT ?)',
+                    (count - self.max_entries,)
+                )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def stats(self):
+        """
+        Entries shared by all workers, and this worker's hit/miss counters
+        """
+        (entries,) = self._db.get().execute('SELECT COUNT(*) FROM geocode').fetchone()
+        with self._lock:
+            hits, misses = self._hits, self._misses
+        lookups = hits + misses
+        return {
+            'entries': entries,
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': (hits / lookups) if lookups else 0.0
+        }
@@ -0,0 +1,218 @@
+"""
+Local geodesic measurements on the WGS84 ellipsoid, vectorized with NumPy.
+No Earth Engine round trip is needed to measure a GeoJSON geometry.
+"""
+import numpy as np
+
+# WGS84 ellipsoid
+WGS84_A = 6378137.0
+WGS84_F = 1 / 298.257223563
+WGS84_B = WGS84_A * (1 - WGS84_F)
+WGS84_E2 = WGS84_F * (2 - WGS84_F)
+WGS84_E = np.sqrt(WGS84_E2)
+
+
+def _authalic_q(sin_phi):
+    return (1 - WGS84_E2) * (
+        sin_phi / (1 - WGS84_E2 * sin_phi ** 2)
+        - np.log((1 - WGS84_E * sin_phi) / (1 + WGS84_E * sin_phi)) / (2 * WGS84_E)
+    )
+
+
+_Q_POLE = _authalic_q(1.0)
+# Radius of the sphere with the same surface area as the ellipsoid
+AUTHALIC_RADIUS = WGS84_A * np.sqrt(_Q_POLE / 2)
+
+
+def _authalic_latitude(lat_rad):
+    """
+    Map geodetic latitudes to the authalic sphere, which preserves areas
+    """
+    return np.arcsin(np.clip(_authalic_q(np.sin(lat_rad)) / _Q_POLE, -1.0, 1.0))
+
+
+def _positions(coordinates):
+    """
+    Return GeoJSON positions as an (n, 2) array of [lon, lat], dropping any
+    altitude. Raises ValueError for anything that is not a list of positions.
+    """
+    positions = np.asarray(coordinates, dtype=float)
+    if positions.size == 0:
+        return positions.reshape(0, 2)
+    if positions.ndim != 2 or positions.shape[1] < 2:
+        raise ValueError('Coordinates must be lists of [lon, lat] or [lon, lat, altitude] positions.')
+    return positions[:, :2]
+
+
+def _open_ring(ring):
+    """
+    Return ring vertices as an (n, 2) array of [lon, lat] without the closing vertex
+    """
+    coords = _positions(ring)
+    if len(coords) > 1 and np.array_equal(coords[0], coords[-1]):
+        coords = coords[:-1]
+    return coords
+
+
+def ring_areas(rings):
+    """
+    Unsigned ellipsoidal areas in m² of a list of rings, computed in one
+    vectorized pass over all vertices of all rings
+    """
+    rings = [_open_ring(ring) for ring in rings]
+    sizes = np.array([len(ring) for ring in rings])
+    areas = np.zeros(len(rings))
+    valid = sizes >= 3
+    if not valid.any():
+        return areas
+
+    sizes = sizes[valid]
+    coords = np.concatenate([ring for ring, ok in zip(rings, valid) if ok])
+    lon = np.radians(coords[:, 0])
+    beta = _authalic_latitude(np.radians(coords[:, 1]))
+
+    # Index of the next vertex, wrapping around within each ring
+    starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+    nxt = np.arange(len(coords)) + 1
+    nxt[starts + sizes - 1] = starts
+
+    # Spherical excess of the trapezoid between each edge and the equator
+    dlon = np.mod(lon[nxt] - lon + np.pi, 2 * np.pi) - np.pi
+    t1 = np.tan(beta / 2)
+    t2 = np.tan(beta[nxt] / 2)
+    excess = 2 * np.arctan2(np.tan(dlon / 2) * (t1 + t2), 1 + t1 * t2)
+
+    total = np.add.reduceat(excess, starts)
+    # A ring winding around a pole (net longitude change of ±2π) sums to the
+    # band between itself and the equator; the region north of it is then
+    # the northern hemisphere less that band, taken in the winding direction
+    winding = np.round(np.add.reduceat(dlon, starts) / (2 * np.pi))
+    total = np.where(winding != 0, 2 * np.pi - winding * total, np.abs(total))
+    # Either side of a ring is a valid interior; the smaller one is reported
+    total = np.where(total > 2 * np.pi, 4 * np.pi - total, total)
+    areas[valid] = total * AUTHALIC_RADIUS ** 2
+    return areas
+
+
+def polygon_areas(polygons):
+    """
+    Areas in m² of GeoJSON polygon coordinate arrays (exterior ring followed by
+    holes). Holes are subtracted from their exterior ring.
+    """
+    rings = []
+    owners = []
+    holes = []
+    for index, polygon in enumerate(polygons):
+        for ring_index, ring in enumerate(polygon):
+            rings.append(ring)
+            owners.append(index)
+            holes.append(ring_index > 0)
+
+    areas = ring_areas(rings)
+    signed = np.where(holes, -areas, areas)
+    result = np.zeros(len(polygons))
+    np.add.at(result, np.asarray(owners, dtype=int), signed)
+    return np.maximum(result, 0.0)
+
+
+def geometry_area(geometry):
+    """
+    Per-part areas in m² of a GeoJSON Polygon or MultiPolygon
+    """
+    if geometry['type'] == 'Polygon':
+        return polygon_areas([geometry['coordinates']])
+    if geometry['type'] == 'MultiPolygon':
+        return polygon_areas(geometry['coordinates'])
+    raise ValueError('Invalid geometry type for area calculation. Expected Polygon or MultiPolygon.')
+
+
+def _vincenty_inverse(lon1, lat1, lon2, lat2, max_iterations=200, tolerance=1e-12):
+    """
+    Vectorized Vincenty inverse solution. Inputs are in radians, the result
+    is the geodesic distance in meters. Nearly antipodal pairs, for which the
+    iteration does not converge, are solved with Karney's method instead.
+    """
+    dlon = np.mod(lon2 - lon1 + np.pi, 2 * np.pi) - np.pi
+    u1 = np.arctan((1 - WGS84_F) * np.tan(lat1))
+    u2 = np.arctan((1 - WGS84_F) * np.tan(lat2))
+    sin_u1, cos_u1 = np.sin(u1), np.cos(u1)
+    sin_u2, cos_u2 = np.sin(u2), np.cos(u2)
+
+    lam = dlon
+    converged = np.zeros(dlon.shape, dtype=bool)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for _ in range(max_iterations):
+            sin_lam, cos_lam = np.sin(lam), np.cos(lam)
+            sin_sigma = np.hypot(cos_u2 * sin_lam, cos_u1 * sin_u2 - sin_u1 * cos_u2 * cos_lam)
+            cos_sigma = sin_u1 * sin_u2 + cos_u1 * cos_u2 * cos_lam
+            sigma = np.arctan2(sin_sigma, cos_sigma)
+            sin_alpha = np.where(sin_sigma == 0, 0.0, cos_u1 * cos_u2 * sin_lam / sin_sigma)
+            cos2_alpha = 1 - sin_alpha ** 2
+            # Equatorial lines have cos2_alpha == 0
+            cos_2sigma_m = np.where(cos2_alpha == 0, 0.0, cos_sigma - 2 * sin_u1 * sin_u2 / cos2_alpha)
+            c = WGS84_F / 16 * cos2_alpha * (4 + WGS84_F * (4 - 3 * cos2_alpha))
+            lam_next = dlon + (1 - c) * WGS84_F * sin_alpha * (
+                sigma + c * sin_sigma * (cos_2sigma_m + c * cos_sigma * (-1 + 2 * cos_2sigma_m ** 2))
+            )
+            converged = np.abs(lam_next - lam) < tolerance
+            lam = lam_next
+            if converged.all():
+                break
+
+        u_sq = cos2_alpha * (WGS84_A ** 2 - WGS84_B ** 2) / WGS84_B ** 2
+        big_a = 1 + u_sq / 16384 * (4096 + u_sq * (-768 + u_sq * (320 - 175 * u_sq)))
+        big_b = u_sq / 1024 * (256 + u_sq * (-128 + u_sq * (74 - 47 * u_sq)))
+        delta_sigma = big_b * sin_sigma * (cos_2sigma_m + big_b / 4 * (
+            cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)
+            - big_b / 6 * cos_2sigma_m * (-3 + 4 * sin_sigma ** 2) * (-3 + 4 * cos_2sigma_m ** 2)
+        ))
+        distance = WGS84_B * big_a * (sigma - delta_sigma)
+
+    if not converged.all():
+        distance = np.where(converged, distance, 0.0)
+        for index in np.flatnonzero(~converged):
+            distance[index] = _karney_inverse(lon1[index], lat1[index], lon2[index], lat2[index])
+    return distance
+
+
+def _karney_inverse(lon1, lat1, lon2, lat2):
+    """
+    Geodesic distance in meters between two points given in radians, with
+    GeographicLib. It converges everywhere but is not vectorized, so it is
+    only used for the rare pairs Vincenty's iteration cannot solve.
+    """
+    from geographiclib.geodesic import Geodesic
+
+    result = Geodesic.WGS84.Inverse(np.degrees(lat1), np.degrees(lon1), np.degrees(lat2), np.degrees(lon2),
+                                    Geodesic.DISTANCE)
+    return result['s12']
+
+
+def line_lengths(lines):
+    """
+    Geodesic lengths in m of a list of GeoJSON line coordinate arrays,
+    computed in one vectorized pass over all segments of all lines
+    """
+    lengths = np.zeros(len(lines))
+    parts = [_positions(line) for line in lines]
+    if sum(len(part) for part in parts) < 2:
+        return lengths
+
+    coords = np.radians(np.concatenate(parts))
+    owners = np.repeat(np.arange(len(parts)), [len(part) for part in parts])
+    # Consecutive vertices form a segment only when they belong to the same line
+    same_line = owners[:-1] == owners[1:]
+    start, end = coords[:-1][same_line], coords[1:][same_line]
+    segments = _vincenty_inverse(start[:, 0], start[:, 1], end[:, 0], end[:, 1])
+    return np.bincount(owners[:-1][same_line], weights=segments, minlength=len(lines))
+
+
+def geometry_length(geometry):
+    """
+    Per-part lengths in m of a GeoJSON LineString or MultiLineString
+    """
+    if geometry['type'] == 'LineString':
+        return line_lengths([geometry['coordinates']])
+    if geometry['type'] == 'MultiLineString':
+        return line_lengths(geometry['coordinates'])
+    raise ValueError('Invalid geometry type for distance calculation. Expected LineString or MultiLineString.')
@@ -0,0 +1,45 @@
+"""
+Gunicorn settings. Requests spend most of their time waiting on Earth Engine
+and Nominatim, so each worker process serves many requests concurrently on
+threads instead of one at a time.
+"""
+import os
+import shutil
+
+from sqlite_store import state_path
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8080')}"
+workers = int(os.environ.get('GUNICORN_WORKERS', 2))
+# 'gthread' needs no extra dependency; 'gevent' can be used if it is installed
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('GUNICORN_THREADS', 16))
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+
+# Workers write Prometheus samples here so /metrics can aggregate them.
+# It must be set before prometheus_client is imported by the app.
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', state_path('metrics'))
+
+
+def on_starting(server):
+    # Samples of a previous run must not be added to this one
+    directory = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory, exist_ok=True)
+
+
+def post_worker_init(worker):
+    # Start Earth Engine initialization as soon as the worker is up, without
+    # holding up the import of the app or waiting for a first request
+    from server import gee_initializer
+    gee_initializer.start()
+
+
+def child_exit(server, worker):
+    try:
+        from prometheus_client import multiprocess
+    except ImportError:
+        return
+    multiprocess.mark_process_dead(worker.pid)
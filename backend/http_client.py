@@ -0,0 +1,170 @@
+"""
+Shared outbound HTTP client: keep-alive connection pooling, a token-bucket
+rate limit coordinated across worker processes, bounded retries with jittered
+backoff, and single-flight coalescing of identical concurrent requests.
+"""
+import random
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import cassette
+import metrics
+import tracing
+from cache import SingleFlight
+from sqlite_store import ThreadLocalConnection, state_path
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+# Statuses that mean "slow down" rather than "failed"
+THROTTLE_STATUS_CODES = {429, 503}
+
+RATE_LIMIT_SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (
+    name TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated REAL NOT NULL
+);
+"""
+
+
+class RateLimitExceeded(requests.exceptions.RequestException):
+    """
+    Raised when a request would have to wait longer than allowed for a rate-limit slot.
+    retry_after is the delay in seconds after which it may succeed, when known.
+    """
+
+    def __init__(self, *args, retry_after=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """
+    Token bucket stored in a SQLite file so every worker on the host draws
+    from the same budget. Callers reserve a token up front and sleep until
+    it becomes available, which keeps concurrent callers in arrival order.
+    """
+
+    def __init__(self, name, rate, capacity=1, path=None):
+        self.name = name
+        self.rate = rate
+        self.capacity = capacity
+        self._db = ThreadLocalConnection(path or state_path('ratelimit.sqlite3'), RATE_LIMIT_SCHEMA)
+
+    def reserve(self, max_wait):
+        """
+        Reserve one token and return how long to wait before using it.
+        Raises RateLimitExceeded if the wait would exceed max_wait.
+        """
+        conn = self._db.get()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            now = time.time()
+            row = conn.execute('SELECT tokens, updated FROM buckets WHERE name = ?', (self.name,)).fetchone()
+            tokens = self.capacity if row is None else min(self.capacity, row[0] + (now - row[1]) * self.rate)
+            tokens -= 1
+            wait = max(0.0, -tokens / self.rate)
+            if wait > max_wait:
+                conn.execute('ROLLBACK')
+                raise RateLimitExceeded(f'Rate limit for {self.name} would delay the request by {wait:.1f}s',
+                                        retry_after=wait)
+            conn.execute('INSERT OR REPLACE INTO buckets (name, tokens, updated) VALUES (?, ?, ?)',
+                         (self.name, tokens, now))
+            conn.execute('COMMIT')
+            return wait
+        except RateLimitExceeded:
+            raise
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def acquire(self, max_wait):
+        wait = self.reserve(max_wait)
+        if wait > 0:
+            time.sleep(wait)
+
+
+class HTTPClient:
+    """
+    Pooled HTTP client for one upstream service
+    """
+
+    def __init__(self, name, rate=None, burst=1, max_retries=3, backoff=0.5,
+                 max_wait=10.0, pool_size=10, headers=None):
+        self.name = name
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_wait = max_wait
+        self.bucket = TokenBucket(name, rate, burst) if rate else None
+        # Records or replays traffic when CASSETTE_MODE is set
+        self.session = cassette.session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        if headers:
+            self.session.headers.update(headers)
+        self._inflight = SingleFlight()
+
+    def get(self, url, params=None, timeout=10):
+        """
+        GET a URL. Identical concurrent requests share a single upstream call.
+        Raises RateLimitExceeded when the upstream is still throttling (429
+        or 503) once the retries are used up.
+        """
+        key = (url, tuple(sorted((params or {}).items())))
+        return self._inflight.do(key, self._timed_get, url, params, timeout)
+
+    def _timed_get(self, url, params, timeout):
+        started = time.perf_counter()
+        status = 'error'
+        with tracing.span(f'http GET {self.name}', upstream=self.name, url=url) as current:
+            try:
+                response = self._get_with_retries(url, params, timeout)
+                status = response.status_code
+                return response
+            except RateLimitExceeded:
+                status = 'rate_limited'
+                raise
+            finally:
+                current.set_attribute('status', status)
+                metrics.observe_upstream(self.name, status, time.perf_counter() - started)
+
+    def _get_with_retries(self, url, params, timeout):
+        attempt = 0
+        while True:
+            if self.bucket:
+                self.bucket.acquire(self.max_wait)
+            try:
+                response = self.session.get(url, params=params, timeout=timeout)
+                if response.status_code not in RETRY_STATUS_CODES:
+                    return response
+                delay = self._retry_after(response)
+                if attempt >= self.max_retries:
+                    if response.status_code in THROTTLE_STATUS_CODES:
+                        raise RateLimitExceeded(
+                            f'{self.name} still answered HTTP {response.status_code} after {attempt} retries',
+                            retry_after=delay
+                        )
+                    return response
+                reason = f'HTTP {response.status_code}'
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = None
+                reason = str(e)
+
+            if delay is None:
+                # Full jitter keeps retries from workers from arriving in lockstep
+                delay = random.uniform(0, self.backoff * (2 ** attempt))
+            print(f"{self.name} request failed ({reason}), retrying in {delay:.1f}s")
+            if delay > self.max_wait:
+                raise RateLimitExceeded(f'{self.name} asked to retry after {delay:.1f}s', retry_after=delay)
+            time.sleep(delay)
+            attempt += 1
+
+    def _retry_after(self, response):
+        try:
+            return float(response.headers.get('Retry-After'))
+        except (TypeError, ValueError):
+            return None
@@ -0,0 +1,35 @@
+"""
+Deferred imports for heavy modules (Earth Engine, NumPy), so importing
+server.py stays fast and the import cost is paid when a module is first used.
+
+requests is not deferred: http_client and cassette subclass its exceptions
+and Session class, and server.py builds its pooled HTTP clients at import,
+so it would be loaded at import anyway.
+"""
+import importlib
+import threading
+
+
+class LazyModule:
+    """
+    Stand-in for a module that is imported on first attribute access
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = 'loaded' if self._module is not None else 'not loaded'
+        return f'<lazy module {self._name!r} ({state})>'
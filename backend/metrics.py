@@ -0,0 +1,137 @@
+"""
+Prometheus metrics for routes, Earth Engine calls, outbound HTTP and caches.
+
+Under gunicorn, PROMETHEUS_MULTIPROC_DIR (set by gunicorn.conf.py) makes
+every worker write its samples to a shared directory, and /metrics
+aggregates them, whichever worker answers. Without prometheus_client the
+recording helpers do nothing and /metrics reports it as unavailable.
+"""
+import os
+import time
+
+try:
+    import prometheus_client
+    from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram
+    from prometheus_client import multiprocess
+except ImportError:
+    prometheus_client = None
+
+# Earth Engine calls and page loads range from milliseconds to a minute
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+if prometheus_client is not None:
+    REQUEST_LATENCY = Histogram(
+        'http_request_duration_seconds', 'Time to produce a response, per route',
+        ['method', 'route'], buckets=LATENCY_BUCKETS
+    )
+    REQUESTS = Counter('http_requests_total', 'Responses per route and status', ['method', 'route', 'status'])
+    GEE_LATENCY = Histogram(
+        'gee_call_duration_seconds', 'Earth Engine call latency per operation',
+        ['operation'], buckets=LATENCY_BUCKETS
+    )
+    GEE_CALLS = Counter('gee_calls_total', 'Earth Engine calls per operation and outcome', ['operation', 'outcome'])
+    UPSTREAM_LATENCY = Histogram(
+        'upstream_request_duration_seconds', 'Outbound HTTP latency per upstream, retries included',
+        ['upstream'], buckets=LATENCY_BUCKETS
+    )
+    UPSTREAM_REQUESTS = Counter('upstream_requests_total', 'Outbound HTTP requests per upstream and status',
+                                ['upstream', 'status'])
+    FALLBACK_STAGES = Counter('satellite_plan_stage_total', 'Collection plans resolved per fallback stage and source',
+                              ['stage', 'source'])
+    CACHE_LOOKUPS = Counter('cache_lookups_total', 'Cache lookups per cache and result', ['cache', 'result'])
+    GEE_ADMISSION_WAIT = Histogram(
+        'gee_admission_wait_seconds', 'Time Earth Engine calls waited for a host-wide slot, per priority',
+        ['priority'], buckets=LATENCY_BUCKETS
+    )
+    GEE_ADMISSIONS = Counter('gee_admissions_total', 'Earth Engine admission decisions per priority and outcome',
+                             ['priority', 'outcome'])
+    # Host-wide values read from the shared admission store when /metrics is scraped; the latest report wins
+    GEE_ADMISSION_ACTIVE = Gauge('gee_admission_active', 'Earth Engine slots in use per priority',
+                                 ['priority'], multiprocess_mode='livemostrecent')
+    GEE_ADMISSION_QUEUE_DEPTH = Gauge('gee_admission_queue_depth', 'Earth Engine calls waiting for a slot per priority',
+                                      ['priority'], multiprocess_mode='livemostrecent')
+
+
+def enabled():
+    return prometheus_client is not None
+
+
+def observe_request(method, route, status, seconds):
+    if prometheus_client is not None:
+        REQUEST_LATENCY.labels(method, route).observe(seconds)
+        REQUESTS.labels(method, route, str(status)).inc()
+
+
+def observe_gee_call(operation, outcome, seconds=None):
+    """
+    outcome is 'ok', 'error', 'timeout' or 'busy'; rejected calls have no latency
+    """
+    if prometheus_client is not None:
+        if seconds is not None:
+            GEE_LATENCY.labels(operation).observe(seconds)
+        GEE_CALLS.labels(operation, outcome).inc()
+
+
+def observe_upstream(upstream, status, seconds):
+    if prometheus_client is not None:
+        UPSTREAM_LATENCY.labels(upstream).observe(seconds)
+        UPSTREAM_REQUESTS.labels(upstream, str(status)).inc()
+
+
+def count_fallback_stage(stage, source):
+    if prometheus_client is not None:
+        FALLBACK_STAGES.labels(stage, source).inc()
+
+
+def count_cache_lookup(cache, hit):
+    if prometheus_client is not None:
+        CACHE_LOOKUPS.labels(cache, 'hit' if hit else 'miss').inc()
+
+
+def observe_gee_admission(priority, outcome, seconds=None):
+    """
+    outcome is 'admitted', 'timeout' or 'rejected' (queue full)
+    """
+    if prometheus_client is not None:
+        if seconds is not None:
+            GEE_ADMISSION_WAIT.labels(priority).observe(seconds)
+        GEE_ADMISSIONS.labels(priority, outcome).inc()
+
+
+def set_gee_admission_state(priority, active, waiting):
+    if prometheus_client is not None:
+        GEE_ADMISSION_ACTIVE.labels(priority).set(active)
+        GEE_ADMISSION_QUEUE_DEPTH.labels(priority).set(waiting)
+
+
+def instrument_app(app):
+    """
+    Record latency and status of every Flask request, labelled by route
+    pattern so the number of series stays bounded
+    """
+    from flask import g, request
+
+    @app.before_request
+    def start_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        started = g.pop('request_started', None)
+        if started is not None:
+            route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+            # Streamed responses are timed until their first byte
+            observe_request(request.method, route, response.status_code, time.perf_counter() - started)
+        return response
+
+
+def render():
+    """
+    (body, content type) of the metrics exposition for all workers
+    """
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+    return prometheus_client.generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+Local spatio-temporal index of satellite scenes (footprint bounding boxes,
+acquisition dates and cloud cover) in SQLite with an R-tree.
+
+The satellite image planner asks it first which fallback candidate has
+imagery, and only probes Earth Engine for what the index cannot answer.
+The index only answers for collections, periods and areas recorded in its
+coverage table, i.e. where it is known to be complete.
+
+Populate it from collection metadata exported from Earth Engine, e.g.
+Export.table.toDrive(collection) as CSV with the .geo column:
+
+    python scene_index.py import landsat.csv --collection LANDSAT/LC08/C02/T1_L2 \
+        --start 2020-01-01 --end 2024-01-01
+
+and keep it current with incremental refreshes from Earth Engine:
+
+    python scene_index.py refresh LANDSAT/LC08/C02/T1_L2 -5 41 10 52
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+from datetime import datetime, timezone
+
+from sqlite_store import ThreadLocalConnection, state_path
+
+SCENE_INDEX_PATH = os.environ.get('SCENE_INDEX_PATH', state_path('scenes.sqlite3'))
+
+# Cloud cover property names of the supported collections
+CLOUD_PROPERTIES = ['CLOUD_COVER', 'CLOUDY_PIXEL_PERCENTAGE']
+
+
+def cloud_property(collection):
+    """
+    Name of the scene cloud cover property (percent) of a collection
+    """
+    return 'CLOUD_COVER' if collection.startswith('LANDSAT') else 'CLOUDY_PIXEL_PERCENTAGE'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scenes (
+    id INTEGER PRIMARY KEY,
+    collection TEXT NOT NULL,
+    scene_id TEXT NOT NULL,
+    acquired TEXT NOT NULL,
+    cloud_cover REAL,
+    UNIQUE (collection, scene_id)
+);
+CREATE INDEX IF NOT EXISTS scenes_collection_acquired ON scenes (collection, acquired);
+CREATE VIRTUAL TABLE IF NOT EXISTS scene_footprints USING rtree (id, min_lon, max_lon, min_lat, max_lat);
+CREATE TABLE IF NOT EXISTS coverage (
+    collection TEXT NOT NULL,
+    start TEXT NOT NULL,
+    end TEXT NOT NULL,
+    min_lon REAL NOT NULL,
+    min_lat REAL NOT NULL,
+    max_lon REAL NOT NULL,
+    max_lat REAL NOT NULL
+);
+"""
+
+GLOBAL_BOUNDS = (-180.0, -90.0, 180.0, 90.0)
+
+
+def footprint_bounds(geometry):
+    """
+    (west, south, east, north) of a GeoJSON geometry
+    """
+    coords = []
+
+    def collect(value):
+        if value and isinstance(value[0], (int, float)):
+            coords.append(value)
+        else:
+            for item in value:
+                collect(item)
+
+    collect(geometry['coordinates'])
+    lons = [c[0] for c in coords]
+    lats = [c[1] for c in coords]
+    return min(lons), min(lats), max(lons), max(lats)
+
+
+class SceneIndex:
+    """
+    Scene footprints and acquisition dates per collection
+    """
+
+    def __init__(self, path=SCENE_INDEX_PATH):
+        self.path = path
+        self._db = ThreadLocalConnection(path, SCHEMA)
+
+    def add_scenes(self, scenes):
+        """
+        Insert or update scenes given as dicts with collection, scene_id,
+        acquired (YYYY-MM-DD), cloud_cover and bounds (west, south, east, north)
+        """
+        conn = self._db.get()
+        count = 0
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            for scene in scenes:
+                west, south, east, north = scene['bounds']
+                row = conn.execute(
+                    'SELECT id FROM scenes WHERE collection = ? AND scene_id = ?',
+                    (scene['collection'], scene['scene_id'])
+                ).fetchone()
+                if row is None:
+                    cursor = conn.execute(
+                        'INSERT INTO scenes (collection, scene_id, acquired, cloud_cover) VALUES (?, ?, ?, ?)',
+                        (scene['collection'], scene['scene_id'], scene['acquired'], scene.get('cloud_cover'))
+                    )
+                    scene_row = cursor.lastrowid
+                else:
+                    scene_row = row[0]
+                    conn.execute('UPDATE scenes SET acquired = ?, cloud_cover = ? WHERE id = ?',
+                                 (scene['acquired'], scene.get('cloud_cover'), scene_row))
+                conn.execute('INSERT OR REPLACE INTO scene_footprints VALUES (?, ?, ?, ?, ?)',
+                             (scene_row, west, east, south, north))
+                count += 1
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return count
+
+    def add_coverage(self, collection, start, end, bounds=GLOBAL_BOUNDS):
+        """
+        Declare the index complete for collection over [start, end) within bounds
+        """
+        west, south, east, north = bounds
+        self._db.get().execute(
+            'INSERT INTO coverage (collection, start, end, min_lon, min_lat, max_lon, max_lat) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (collection, start, end, west, south, east, north)
+        )
+
+    def is_covered(self, collection, start, end, bounds):
+        """
+        Whether coverage periods containing bounds span [start, end) between
+        them, e.g. an import followed by refreshes
+        """
+        west, south, east, north = bounds
+        periods = self._db.get().execute(
+            'SELECT start, end FROM coverage WHERE collection = ? AND start < ? AND end > ? '
+            'AND min_lon <= ? AND min_lat <= ? AND max_lon >= ? AND max_lat >= ? ORDER BY start',
+            (collection, end, start, west, south, east, north)
+        ).fetchall()
+        covered_until = start
+        for period_start, period_end in periods:
+            if period_start > covered_until:
+                return False
+            covered_until = max(covered_until, period_end)
+            if covered_until >= end:
+                return True
+        return False
+
+    def count(self, collection, start, end, bounds, max_cloud_cover=None):
+        """
+        Number of scenes of collection acquired in [start, end) whose footprint
+        box intersects bounds and, if max_cloud_cover is given, whose cloud
+        cover is known and at most that percentage. None if the index is not
+        complete there. Footprint boxes are larger than footprints, so a
+        scene near the edge of bounds may be counted without covering it.
+        """
+        if not self.is_covered(collection, start, end, bounds):
+            return None
+        west, south, east, north = bounds
+        query = ('SELECT COUNT(*) FROM scenes s JOIN scene_footprints f ON f.id = s.id '
+                 'WHERE s.collection = ? AND s.acquired >= ? AND s.acquired < ? '
+                 'AND f.max_lon >= ? AND f.min_lon <= ? AND f.max_lat >= ? AND f.min_lat <= ?')
+        params = [collection, start, end, west, east, south, north]
+        if max_cloud_cover is not None:
+            query += ' AND s.cloud_cover <= ?'
+            params.append(max_cloud_cover)
+        (count,) = self._db.get().execute(query, params).fetchone()
+        return count
+
+    def latest_acquisition(self, collection):
+        (latest,) = self._db.get().execute(
+            'SELECT MAX(acquired) FROM scenes WHERE collection = ?', (collection,)
+        ).fetchone()
+        return latest
+
+    def stats(self):
+        conn = self._db.get()
+        return {
+            collection: {'scenes': scenes, 'first': first, 'last': last}
+            for collection, scenes, first, last in conn.execute(
+                'SELECT collection, COUNT(*), MIN(acquired), MAX(acquired) FROM scenes GROUP BY collection'
+            )
+        }
+
+
+def scene_from_row(row, collection=None):
+    """
+    Convert a row of an Earth Engine table export (CSV) into a scene dict.
+    The footprint comes from the .geo column or from min/max lon/lat columns.
+    """
+    if row.get('.geo'):
+        bounds = footprint_bounds(json.loads(row['.geo']))
+    else:
+        bounds = tuple(float(row[name]) for name in ('min_lon', 'min_lat', 'max_lon', 'max_lat'))
+
+    if row.get('system:time_start'):
+        acquired = datetime.fromtimestamp(float(row['system:time_start']) / 1000, tz=timezone.utc)
+        acquired = acquired.strftime('%Y-%m-%d')
+    else:
+        acquired = row['acquired'][:10]
+
+    cloud_cover = next((float(row[name]) for name in CLOUD_PROPERTIES if row.get(name) not in (None, '')), None)
+    return {
+        'collection': collection or row['collection'],
+        'scene_id': row.get('system:index') or row['scene_id'],
+        'acquired': acquired,
+        'cloud_cover': cloud_cover,
+        'bounds': bounds
+    }
+
+
+def import_csv(index, path, collection=None):
+    with open(path, newline='') as f:
+        return index.add_scenes(scene_from_row(row, collection) for row in csv.DictReader(f))
+
+
+def refresh_from_gee(index, collection, bounds, since=None, until=None):
+    """
+    Fetch scenes acquired since the last indexed date from Earth Engine in one
+    getInfo, and extend the coverage of the index accordingly
+    """
+    import ee
+
+    since = since or index.latest_acquisition(collection)
+    if since is None:
+        raise ValueError(f'No scenes indexed for {collection} yet, pass a start date')
+    until = until or datetime.now(timezone.utc).strftime('%Y-%m-%d')
+
+    scenes = ee.ImageCollection(collection).filterDate(since, until).filterBounds(ee.Geometry.Rectangle(list(bounds)))
+    metadata = ee.Dictionary({
+        'ids': scenes.aggregate_array('system:index'),
+        'times': scenes.aggregate_array('system:time_start'),
+        'clouds': scenes.aggregate_array(cloud_property(collection)),
+        'footprints': scenes.aggregate_array('system:footprint')
+    }).getInfo()
+
+    added = index.add_scenes(
+        {
+            'collection': collection,
+            'scene_id': scene_id,
+            'acquired': datetime.fromtimestamp(time_start / 1000, tz=timezone.utc).strftime('%Y-%m-%d'),
+            'cloud_cover': cloud,
+            'bounds': footprint_bounds(footprint)
+        }
+        for scene_id, time_start, cloud, footprint in zip(
+            metadata['ids'], metadata['times'], metadata['clouds'], metadata['footprints']
+        )
+    )
+    index.add_coverage(collection, since, until, bounds)
+    return added
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Manage the local satellite scene index')
+    parser.add_argument('--path', default=SCENE_INDEX_PATH, help='SQLite index file')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    import_parser = commands.add_parser('import', help='Import an Earth Engine metadata export (CSV)')
+    import_parser.add_argument('csv_path')
+    import_parser.add_argument('--collection', help='Collection of every row, if not in a column')
+    import_parser.add_argument('--start', help='Start of the period the export is complete for')
+    import_parser.add_argument('--end', help='End (exclusive) of the period the export is complete for')
+    import_parser.add_argument('--bounds', nargs=4, type=float, metavar=('WEST', 'SOUTH', 'EAST', 'NORTH'),
+                               default=GLOBAL_BOUNDS, help='Area the export is complete for')
+
+    refresh_parser = commands.add_parser('refresh', help='Fetch new scenes from Earth Engine')
+    refresh_parser.add_argument('collection')
+    refresh_parser.add_argument('bounds', nargs=4, type=float, metavar=('WEST', 'SOUTH', 'EAST', 'NORTH'))
+    refresh_parser.add_argument('--since', help='Start date, defaults to the last indexed acquisition')
+
+    commands.add_parser('stats', help='Show indexed scenes per collection')
+
+    args = parser.parse_args()
+    index = SceneIndex(args.path)
+
+    if args.command == 'import':
+        count = import_csv(index, args.csv_path, args.collection)
+        print(f"Imported {count} scenes")
+        if args.start and args.end:
+            if not args.collection:
+                parser.error('--collection is required to record coverage')
+            index.add_coverage(args.collection, args.start, args.end, tuple(args.bounds))
+            print(f"Recorded coverage for {args.collection} from {args.start} to {args.end}")
+    elif args.command == 'refresh':
+        import ee
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        ee.Initialize(project=os.environ.get('GEE_PROJECT_ID'))
+        count = refresh_from_gee(index, args.collection, tuple(args.bounds), args.since)
+        print(f"Indexed {count} new scenes for {args.collection}")
+    else:
+        print(json.dumps(index.stats(), indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
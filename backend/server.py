@@ -1,28 +1,105 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, g, jsonify, request
 from flask_cors import CORS
-import ee
 import requests
+import hashlib
 import json
-from datetime import datetime
+import math
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
 import os
+import sqlite3
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
+# Local modules read their settings from the environment when imported
+from cache import TTLCache
+from lazy_import import LazyModule
+import cassette
+import gee_admission
+import metrics
+import tracing
+from geocode_cache import GeocodeCache
+from http_client import HTTPClient, RateLimitExceeded
+from tile_cache import TileCache
+from tile_prefetch import TILE_PREFETCH_ENABLED, TilePrefetcher
+from scene_index import SCENE_INDEX_PATH, SceneIndex, cloud_property
+from gee_credentials import TokenRefresher, service_account_credentials
+from gee_runtime import (GEE_READY_TIMEOUT, BackgroundInitializer, GEEBusyError, GEEConfigurationError,
+                         GEETimeoutError, run_gee)
+
+# Earth Engine and NumPy are only imported when first used, to keep worker startup fast.
+# GEE_BACKEND=fake swaps in the offline stand-in of fake_ee.py for benchmarks and tests.
+GEE_BACKEND = os.environ.get('GEE_BACKEND', 'ee')
+ee = LazyModule('fake_ee' if GEE_BACKEND == 'fake' else 'ee')
+geodesy = LazyModule('geodesy')
+
 app = Flask(__name__, static_folder='docs', static_url_path='')
 CORS(app)  # Enable CORS for all routes
+metrics.instrument_app(app)
+
+@app.before_request
+def start_request_trace():
+    # Traces are stored under a server-generated ID so clients cannot overwrite
+    # each other's; a client's own X-Request-ID is only echoed and recorded
+    g.request_id = tracing.new_request_id()
+    g.client_request_id = request.headers.get('X-Request-ID')
+    if tracing.start_trace(g.request_id, force=tracing.force_requested(request.headers.get('X-Trace'))) is not None:
+        route = request.url_rule.rule if request.url_rule is not None else request.path
+        g.request_span = tracing.start_span(f'{request.method} {route}', method=request.method, path=request.path)
+        if g.client_request_id:
+            g.request_span.set_attribute('client_request_id', g.client_request_id)
+
+@app.after_request
+def finish_request_trace(response):
+    request_id = g.get('request_id')
+    if request_id is None:
+        return response
+    response.headers['X-Request-ID'] = g.get('client_request_id') or request_id
+    trace = tracing.current_trace()
+    if trace is not None:
+        # The key of the trace under /debug/trace
+        response.headers['X-Trace-ID'] = request_id
+        request_span = g.get('request_span')
+        request_span.set_attribute('status', response.status_code)
+
+        # Streamed responses are still running, so the trace ends when they close,
+        # possibly after another request has started on this thread
+        def finish():
+            tracing.end_span(request_span, trace=trace)
+            tracing.finish_trace(trace)
+        response.call_on_close(finish)
+    return response
 
 # Global variable to track GEE initialization status
 gee_initialized = False
 gee_error = None
+token_refresher = None
 
-# Initialize Earth Engine
+# Initialize Earth Engine. Returns False for failures worth retrying and raises
+# GEEConfigurationError for configuration errors that need an operator.
 def initialize_gee():
-    global gee_initialized, gee_error
+    global gee_initialized, gee_error, token_refresher
     print("=== Starting GEE Initialization ===")
 
     try:
+        if GEE_BACKEND == 'fake':
+            ee.Initialize(project='fake-project')
+            gee_initialized = True
+            gee_error = None
+            print("Using the offline fake Earth Engine backend")
+            return True
+
+        # Replayed calls need neither credentials nor a real project
+        if cassette.CASSETTE_MODE == 'replay':
+            ee.Initialize(None, project=cassette.REPLAY_PROJECT, http_transport=cassette.gee_transport())
+            gee_initialized = True
+            gee_error = None
+            print("Google Earth Engine initialized from the recorded cassette")
+            return True
+
         # Get project ID from environment variables or use default
         project_id = os.environ.get('GEE_PROJECT_ID', 'your-project-id')
         print(f"GEE_PROJECT_ID: {project_id}")
@@ -31,7 +108,7 @@ def initialize_gee():
         if project_id == 'your-project-id':
             gee_error = "Warning: Using default project ID. Please set GEE_PROJECT_ID in your environment variables. See GEE_AUTHENTICATION.md for setup instructions."
             print(gee_error)
-            return False
+            raise GEEConfigurationError(gee_error)
 
         # Check for service account key (for production deployment)
         service_account_key = os.environ.get('GEE_SERVICE_ACCOUNT_KEY')
@@ -43,19 +120,8 @@ def initialize_gee():
         if service_account_key or service_account_key_b64:
             print("Attempting service account authentication...")
             try:
-                import json
-                import tempfile
                 import base64
 
-                # Try to import google-auth
-                try:
-                    from google.oauth2 import service_account
-                    print("google-auth imported successfully")
-                except ImportError as import_err:
-                    print(f"Failed to import google-auth: {import_err}")
-                    gee_error = f"google-auth package not available: {import_err}"
-                    return False
-
                 # Use base64 decoded key if available, otherwise use direct JSON
                 if service_account_key_b64:
                     print("Using base64 encoded service account key")
@@ -65,42 +131,42 @@ def initialize_gee():
                     except Exception as decode_err:
                         print(f"Base64 decoding failed: {decode_err}")
                         gee_error = f"Failed to decode service account key: {decode_err}"
-                        return False
+                        raise GEEConfigurationError(gee_error)
                 else:
                     print("Using direct service account key")
                     key_json = service_account_key
 
-                # Write the service account key to a temporary file
-                try:
-                    with tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False) as f:
-                        json.dump(json.loads(key_json), f)
-                        key_file = f.name
-                    print(f"Service account key written to temp file: {key_file}")
-                except Exception as file_err:
-                    print(f"Failed to write service account key to file: {file_err}")
-                    gee_error = f"Failed to create service account key file: {file_err}"
-                    return False
-
-                # Create credentials from the service account key
+                # Create credentials straight from the key, without writing it to disk
                 try:
-                    credentials = service_account.Credentials.from_service_account_file(key_file)
+                    credentials = service_account_credentials(key_json)
                     print("Service account credentials created successfully")
                 except Exception as cred_err:
                     print(f"Failed to create credentials: {cred_err}")
                     gee_error = f"Failed to create service account credentials: {cred_err}"
-                    return False
+                    raise GEEConfigurationError(gee_error)
 
                 # Initialize Earth Engine
                 try:
-                    ee.Initialize(credentials, project=project_id)
+                    ee.Initialize(credentials, project=project_id, http_transport=cassette.gee_transport())
                     gee_initialized = True
+                    gee_error = None
                     print("Google Earth Engine initialized successfully with service account")
-                    return True
                 except Exception as init_err:
                     print(f"GEE initialization failed: {init_err}")
                     gee_error = f"GEE initialization failed: {init_err}"
                     return False
 
+                # Earth Engine keeps one authorized transport around these
+                # credentials; refreshing them ahead of expiry keeps token
+                # renewal out of request latency
+                if token_refresher is not None:
+                    token_refresher.stop()
+                token_refresher = TokenRefresher(credentials)
+                token_refresher.start()
+                return True
+
+            except GEEConfigurationError:
+                raise
             except Exception as sa_error:
                 print(f"Service account authentication failed: {sa_error}")
                 gee_error = f"Service account authentication failed: {str(sa_error)}"
@@ -109,19 +175,22 @@ def initialize_gee():
         # Fallback to interactive authentication (for local development)
         print("No service account key found, trying interactive authentication...")
         try:
-            ee.Initialize(project=project_id)
+            ee.Initialize(project=project_id, http_transport=cassette.gee_transport())
             gee_initialized = True
+            gee_error = None
             print("Google Earth Engine initialized successfully")
             return True
         except ee.EEException as e:
             if "authentication" in str(e).lower():
                 gee_error = "Earth Engine authentication required. Please run 'earthengine authenticate' locally or set up service account for production."
                 print(gee_error)
-                return False
+                raise GEEConfigurationError(gee_error)
             else:
                 print(f"GEE initialization error: {e}")
                 raise e
 
+    except GEEConfigurationError:
+        raise
     except ee.EEException as e:
         gee_error = f"Earth Engine error: {str(e)}. Please check GEE_AUTHENTICATION.md for setup instructions."
         print(f"Failed to initialize Google Earth Engine: {e}")
@@ -131,16 +200,66 @@ def initialize_gee():
         print(f"Failed to initialize Google Earth Engine: {e}")
         return False
 
-# Try to initialize GEE when the server starts
-initialize_gee()
+# Initialize GEE in the background, off the import path, and keep retrying
+# so transient auth or network failures recover by themselves; configuration
+# errors stop the retries. It starts with the first request (or from
+# gunicorn's post_worker_init hook).
+gee_initializer = BackgroundInitializer(initialize_gee)
+
+@app.before_request
+def start_gee_initialization():
+    gee_initializer.start()
+
+# Priority class of each route's Earth Engine calls; map layers are interactive
+GEE_ROUTE_PRIORITIES = {
+    'get_satellite_image_batch': 'batch',
+    'get_region_stats': 'stats',
+    'detect_change': 'stats',
+    'get_timeseries': 'stats',
+    'measure_area': 'stats',
+    'measure_distance': 'stats'
+}
+
+@app.before_request
+def set_gee_priority():
+    gee_admission.set_priority(GEE_ROUTE_PRIORITIES.get(request.endpoint, 'interactive'))
+
+def gee_ready(timeout=GEE_READY_TIMEOUT):
+    """
+    Wait up to timeout seconds for Earth Engine to be initialized. Fails
+    at once after a failed attempt instead of waiting for the next retry.
+    """
+    return gee_initialized or gee_initializer.wait(timeout)
+
+geocode_cache = GeocodeCache()
+
+# Nominatim's usage policy allows at most 1 request per second for the whole host
+NOMINATIM_URL = os.environ.get('NOMINATIM_URL', 'https://nominatim.openstreetmap.org/search')
+nominatim_client = HTTPClient(
+    'nominatim',
+    rate=float(os.environ.get('NOMINATIM_RATE_LIMIT', 1.0)),
+    max_retries=int(os.environ.get('NOMINATIM_MAX_RETRIES', 3)),
+    max_wait=float(os.environ.get('NOMINATIM_MAX_WAIT', 5)),
+    headers={'User-Agent': 'Satellite-Image-Analyzer/1.0'}
+)
 
 def geocode_location(location_name):
     """
-    Convert a location name to coordinates using a geocoding service
+    Convert a location name to coordinates using a geocoding service.
+    Answers, including "not found", are served from the persistent cache when possible.
+    Raises RateLimitExceeded when Nominatim's rate limit leaves no slot in time
+    or it keeps throttling, and requests.HTTPError when it answers with a 5xx.
     """
+    try:
+        found, cached = geocode_cache.get(location_name)
+        if found:
+            return cached
+    except sqlite3.Error as e:
+        print(f"Geocode cache unavailable: {e}")
+
     try:
         # Using OpenStreetMap Nominatim API for geocoding
-        url = "https://nominatim.openstreetmap.org/search"
+        url = NOMINATIM_URL
         params = {
             'q': location_name,
             'format': 'json',
@@ -148,11 +267,7 @@ def geocode_location(location_name):
             'addressdetails': 1
         }
 
-        headers = {
-            'User-Agent': 'Satellite-Image-Analyzer/1.0'
-        }
-
-        response = requests.get(url, params=params, headers=headers, timeout=10)
+        response = nominatim_client.get(url, params=params, timeout=10)
         response.raise_for_status()
 
         data = response.json()
@@ -170,16 +285,25 @@ def geocode_location(location_name):
             lat = float(best_result['lat'])
             lon = float(best_result['lon'])
             display_name = best_result['display_name']
-            return {
+            location = {
                 'lat': lat,
                 'lon': lon,
                 'display_name': display_name
             }
         else:
-            return None
+            location = None
     except requests.exceptions.Timeout:
         print("Geocoding request timed out")
         return None
+    except RateLimitExceeded:
+        # Being throttled says nothing about the location, so it is not a miss
+        raise
+    except requests.exceptions.HTTPError as e:
+        # Neither does a failing Nominatim
+        if e.response is not None and e.response.status_code >= 500:
+            raise
+        print(f"Geocoding request failed: {e}")
+        return None
     except requests.exceptions.RequestException as e:
         print(f"Network error during geocoding: {e}")
         return None
@@ -187,6 +311,13 @@ def geocode_location(location_name):
         print(f"Error geocoding location: {e}")
         return None
 
+    # Only answers from Nominatim are cached, never network failures
+    try:
+        geocode_cache.set(location_name, location)
+    except sqlite3.Error as e:
+        print(f"Failed to cache geocoding result: {e}")
+    return location
+
 @app.route('/geocode', methods=['POST'])
 def geocode():
     """
@@ -198,23 +329,395 @@ def geocode():
     if not location_name:
         return jsonify({'error': 'Location name is required'}), 400
     
-    location = geocode_location(location_name)
+    try:
+        location = geocode_location(location_name)
+    except RateLimitExceeded as e:
+        print(f"Geocoding throttled: {e}")
+        response = jsonify({'error': 'Too many geocoding requests right now. Please try again shortly.'})
+        response.headers['Retry-After'] = str(max(1, math.ceil(e.retry_after or 1)))
+        return response, 503
+    except requests.exceptions.HTTPError as e:
+        print(f"Geocoding service failed: {e}")
+        return jsonify({'error': 'The geocoding service is unavailable right now. Please try again shortly.'}), 502
     if location:
         return jsonify(location)
     else:
         return jsonify({'error': 'Location not found. Please try a different name or check your internet connection.'}), 404
 
+# Map IDs returned by getMapId are only valid for a limited time, so cached
+# entries expire well before GEE invalidates them.
+MAP_CACHE_TTL = int(os.environ.get('MAP_CACHE_TTL', 3600))
+MAP_CACHE_MAX_ENTRIES = int(os.environ.get('MAP_CACHE_MAX_ENTRIES', 2048))
+MAP_CACHE_MAX_BYTES = int(os.environ.get('MAP_CACHE_MAX_BYTES', 4 * 1024 * 1024))
+
+# Rounding to 4 decimals (~11m) lets repeat views of the same place share entries
+COORDINATE_PRECISION = 4
+
+# Which collection/window has imagery for a request, shared by all filters
+plan_cache = TTLCache('collection_plan', MAP_CACHE_TTL, MAP_CACHE_MAX_ENTRIES, MAP_CACHE_MAX_BYTES)
+# Map ID and token for a resolved collection/window and filter
+map_cache = TTLCache('map_id', MAP_CACHE_TTL, MAP_CACHE_MAX_ENTRIES, MAP_CACHE_MAX_BYTES)
+
+def normalize_location(location):
+    """
+    Round a {lat, lon} location so nearby requests share cache entries
+    """
+    return (round(float(location['lat']), COORDINATE_PRECISION),
+            round(float(location['lon']), COORDINATE_PRECISION))
+
+def region_bounds(lat, lon, buffer=0.1):
+    """
+    (west, south, east, north) of the bounding box around a location
+    """
+    return lon - buffer, lat - buffer, lon + buffer, lat + buffer
+
+def build_region(lat, lon, buffer=0.1):
+    """
+    Create a small bounding box around the location for better coverage (0.1 degrees ~11km)
+    """
+    west, south, east, north = region_bounds(lat, lon, buffer)
+    bounds = [
+        [west, south],
+        [east, south],
+        [east, north],
+        [west, north],
+        [west, south]
+    ]
+    return ee.Geometry.Polygon([bounds])
+
+def broadened_window(start_date, end_date, days):
+    """
+    Return a +/- days window around the midpoint of the provided range
+    """
+    start_dt = datetime.strptime(start_date, '%Y-%m-%d')
+    end_dt = datetime.strptime(end_date, '%Y-%m-%d')
+    mid_dt = start_dt + (end_dt - start_dt) / 2
+    return ((mid_dt - timedelta(days=days)).strftime('%Y-%m-%d'),
+            (mid_dt + timedelta(days=days)).strftime('%Y-%m-%d'))
+
+# Optional local index of scene footprints (see scene_index.py), used
+# when it has been populated for this host
+scene_index = SceneIndex(SCENE_INDEX_PATH) if os.path.exists(SCENE_INDEX_PATH) else None
+
+LANDSAT_COLLECTION = "LANDSAT/LC08/C02/T1_L2"
+SENTINEL_COLLECTION = "COPERNICUS/S2_SR"
+
+# Scenes cloudier than this percentage are left out of plans and composites (100 keeps every scene)
+MAX_CLOUD_COVER = float(os.environ.get('MAX_CLOUD_COVER', 100))
+
+def image_collection(collection_name, start, end, geometry):
+    """
+    Scenes of a collection acquired in [start, end) over geometry, within MAX_CLOUD_COVER
+    """
+    collection = ee.ImageCollection(collection_name).filterDate(start, end).filterBounds(geometry)
+    if MAX_CLOUD_COVER < 100:
+        collection = collection.filter(ee.Filter.lte(cloud_property(collection_name), MAX_CLOUD_COVER))
+    return collection
+
+def collection_candidates(start_date, end_date):
+    """
+    Ordered fallback cascade as (stage, collection, start, end) tuples:
+    Landsat +/- 30 days, Landsat +/- 90 days, Sentinel-2 on the original
+    dates, then Sentinel-2 +/- 30 days
+    """
+    broadened_start, broadened_end = broadened_window(start_date, end_date, 30)
+    broader_start, broader_end = broadened_window(start_date, end_date, 90)
+    return [
+        ('landsat_30d', LANDSAT_COLLECTION, broadened_start, broadened_end),
+        ('landsat_90d', LANDSAT_COLLECTION, broader_start, broader_end),
+        ('sentinel_original', SENTINEL_COLLECTION, start_date, end_date),
+        ('sentinel_30d', SENTINEL_COLLECTION, broadened_start, broadened_end)
+    ]
+
+def indexed_counts(candidates, bounds):
+    """
+    Image counts the local scene index can answer for, in cascade order. Stops
+    at the first candidate with images, since later stages will not be used,
+    or at the first one the index does not cover.
+    """
+    counts = {}
+    if scene_index is None:
+        return counts
+    max_cloud_cover = MAX_CLOUD_COVER if MAX_CLOUD_COVER < 100 else None
+    for stage, collection_name, start, end in candidates:
+        try:
+            count = scene_index.count(collection_name, start, end, bounds, max_cloud_cover)
+        except sqlite3.Error as e:
+            print(f"Scene index lookup failed: {e}")
+            break
+        if count is None:
+            break
+        counts[stage] = count
+        if count > 0:
+            break
+    return counts
+
+def select_collection(geometry, bounds, start_date, end_date, use_index=True):
+    """
+    Pick the first fallback candidate with images. The local scene index is
+    consulted first (unless use_index is False); the candidates it cannot
+    rule out are evaluated server-side in a single ee.Dictionary, so the
+    cascade costs at most one round trip instead of one per stage. Returns a
+    dict with stage, collection, start, end, image_count and source ('index'
+    or 'gee'); image_count is 0 when no candidate has images.
+    """
+    candidates = collection_candidates(start_date, end_date)
+    counts = indexed_counts(candidates, bounds) if use_index else {}
+    indexed = set(counts)
+    remaining = [candidate for candidate in candidates if candidate[0] not in indexed]
+    if counts:
+        print(f"Image counts from the scene index: {counts}")
+
+    if remaining and not any(count > 0 for count in counts.values()):
+        gee_counts = ee.Dictionary({
+            stage: image_collection(collection_name, start, end, geometry).size()
+            for stage, collection_name, start, end in remaining
+        })
+        gee_counts = run_gee('satellite.plan', gee_counts.getInfo)
+        print(f"Image counts per fallback stage: {gee_counts}")
+        counts.update(gee_counts)
+
+    for stage, collection_name, start, end in candidates:
+        if counts.get(stage, 0) > 0:
+            break
+    if counts.get(stage, 0) > 0:
+        source = 'index' if stage in indexed else 'gee'
+        metrics.count_fallback_stage(stage, source)
+    else:
+        source = 'index' if not remaining else 'gee'
+        metrics.count_fallback_stage('none', source)
+    return {
+        'stage': stage,
+        'collection': collection_name,
+        'start': start,
+        'end': end,
+        'image_count': counts.get(stage, 0),
+        'source': source
+    }
+
+# Band names per collection; NIR is SR_B5 on Landsat 8 but SR_B4 on Landsat 5/7, and B8 on Sentinel-2
+LANDSAT_8_BANDS = {'blue': 'SR_B2', 'green': 'SR_B3', 'red': 'SR_B4', 'nir': 'SR_B5'}
+LANDSAT_TM_BANDS = {'blue': 'SR_B1', 'green': 'SR_B2', 'red': 'SR_B3', 'nir': 'SR_B4'}
+SENTINEL_BANDS = {'blue': 'B2', 'green': 'B3', 'red': 'B4', 'nir': 'B8'}
+COLLECTION_BANDS = {
+    'LANDSAT/LC08/C02/T1_L2': LANDSAT_8_BANDS,
+    'LANDSAT/LE07/C02/T1_L2': LANDSAT_TM_BANDS,
+    'LANDSAT/LT05/C02/T1_L2': LANDSAT_TM_BANDS,
+    SENTINEL_COLLECTION: SENTINEL_BANDS
+}
+
+# Filters build_visualization knows; anything else renders as RGB on /satellite-image
+IMAGE_FILTERS = ('rgb', 'false_color', 'ndvi', 'ndwi')
+
+def build_visualization(filtered, collection_name, filter_type):
+    """
+    Build the median composite for a filtered collection and the
+    visualization parameters for the requested filter
+    """
+    # Get the median composite of available images and apply scaling
+    if collection_name.startswith('LANDSAT/'):
+        image = filtered.median().multiply(0.0000275).add(-0.2)
+    else:
+        # For Sentinel-2
+        image = filtered.median().multiply(0.0001)
+    bands = COLLECTION_BANDS.get(collection_name, SENTINEL_BANDS)
+
+    # Determine visualization parameters based on filter
+    if filter_type == 'ndwi':
+        # NDWI: (Green - NIR) / (Green + NIR)
+        green = image.select(bands['green'])
+        nir = image.select(bands['nir'])
+        ndwi = green.subtract(nir).divide(green.add(nir)).rename(['ndwi'])
+        vis_params = {
+            'bands': ['ndwi'],
+            'min': -1,
+            'max': 1,
+            'palette': ['blue', 'white', 'green']  # Water in blue, land in green
+        }
+        image = ndwi
+    elif filter_type == 'ndvi':
+        # NDVI: (NIR - Red) / (NIR + Red)
+        nir = image.select(bands['nir'])
+        red = image.select(bands['red'])
+        ndvi = nir.subtract(red).divide(nir.add(red)).rename(['ndvi'])
+        vis_params = {
+            'bands': ['ndvi'],
+            'min': -1,
+            'max': 1,
+            'palette': ['red', 'yellow', 'green']  # Low veg red, high veg green
+        }
+        image = ndvi
+    elif filter_type == 'false_color':
+        # False color: NIR, Red, Green for vegetation enhancement
+        vis_params = {
+            'bands': [bands['nir'], bands['red'], bands['green']],
+            'min': 0,
+            'max': 0.3
+        }
+    else:
+        # Default RGB
+        vis_params = {
+            'bands': [bands['red'], bands['green'], bands['blue']],
+            'min': 0,
+            'max': 0.3
+        }
+
+    return image, vis_params
+
+def build_composite(geometry, plan, filter_type):
+    """
+    Composite image and visualization parameters for a resolved plan
+    """
+    filtered = image_collection(plan['collection'], plan['start'], plan['end'], geometry)
+    return build_visualization(filtered, plan['collection'], filter_type)
+
+def create_map_id(geometry, plan, filter_type):
+    """
+    Build the composite for a resolved plan and create its map ID
+    """
+    image, vis_params = build_composite(geometry, plan, filter_type)
+
+    # Get the map ID and token for visualization
+    map_id = run_gee('satellite.map_id', image.getMapId, vis_params)
+    return {
+        'map_id': map_id['mapid'],
+        'token': map_id.get('token', ''),  # Token might be empty in newer GEE versions
+        'image_count': plan['image_count']
+    }
+
+NO_IMAGES_MESSAGE = 'No satellite images found for the specified location and date range. This could be due to:\n• Location not covered by satellite imagery (e.g., poles, oceans)\n• Cloud cover blocking the view\n• Date range with no available images\n• Try a different location or date range.'
+
+def resolve_plan(lat, lon, geometry, start_date, end_date, live=False):
+    """
+    Cached collection plan for a rounded location and date range. With
+    live=True the plan is recomputed from Earth Engine counts alone and
+    replaces the cached one. Returns a (plan key, plan) tuple.
+    """
+    plan_key = (lat, lon, start_date, end_date)
+    if live:
+        plan = select_collection(geometry, region_bounds(lat, lon), start_date, end_date, use_index=False)
+        plan_cache.set(plan_key, plan)
+    else:
+        plan = plan_cache.get_or_compute(plan_key, lambda: select_collection(geometry, region_bounds(lat, lon), start_date, end_date))
+    print(f"Using {plan['collection']} ({plan['image_count']} images) for {plan['start']} to {plan['end']} around location {lat}, {lon}")
+    return plan_key, plan
+
+def render_with_plans(lat, lon, geometry, windows, render):
+    """
+    Call render(*resolved) with a (plan key, plan) tuple per (start_date,
+    end_date) window. The scene index matches footprint bounding boxes, so a
+    plan it answered may pick a collection with no image over the region
+    itself; if Earth Engine then fails, the plans are recomputed from live
+    counts and rendered once more.
+    """
+    resolved = [resolve_plan(lat, lon, geometry, *window) for window in windows]
+    try:
+        return render(*resolved)
+    except ee.EEException as e:
+        if not any(plan['source'] == 'index' for _, plan in resolved):
+            raise
+        print(f"Plan from the scene index failed in Earth Engine ({e}), recounting images live")
+    return render(*[resolve_plan(lat, lon, geometry, *window, live=True) for window in windows])
+
+def render_satellite_image(location, start_date, end_date, filter_type):
+    """
+    Resolve the collection for a request and create its map ID, reusing cached
+    plans and map IDs. Returns a (response body, status code) tuple.
+    """
+    lat, lon = normalize_location(location)
+    geometry = build_region(lat, lon)
+    broadened_start, broadened_end = broadened_window(start_date, end_date, 30)
+
+    def render(resolved):
+        plan_key, plan = resolved
+        if plan['image_count'] == 0:
+            return {'error': NO_IMAGES_MESSAGE}, 404
+
+        def create():
+            result = create_map_id(geometry, plan, filter_type)
+            if tile_prefetcher is not None:
+                # A new map ID for the same view (e.g. another filter) supersedes this one
+                tile_prefetcher.schedule(plan_key, full_map_id(result['map_id']), region_bounds(lat, lon))
+            return result
+
+        map_key = (lat, lon, plan['collection'], plan['start'], plan['end'], filter_type)
+        cached = map_cache.get_or_compute(map_key, create)
+
+        return {
+            'map_id': cached['map_id'],
+            'token': cached['token'],
+            'location': location,
+            'collection': plan['collection'],
+            'image_count': cached['image_count'],
+            'date_range': f'{start_date} to {end_date} (broadened to {broadened_start} to {broadened_end})',
+            'filter': filter_type
+        }, 200
+
+    return render_with_plans(lat, lon, geometry, [(start_date, end_date)], render)
+
+def gee_response(action, render, *args):
+    """
+    Call render(*args), which returns a (body, status) tuple, with GEE
+    failures turned into error responses
+    """
+    try:
+        return render(*args)
+    except GEEBusyError as e:
+        print(f"Rejected request to {action}: {e}")
+        return {'error': 'The server is busy with other Earth Engine requests. Please try again shortly.'}, 503
+    except GEETimeoutError as e:
+        print(f"Failed to {action}: {e}")
+        return {'error': f'{str(e)}. Please try again or narrow the date range.'}, 504
+    except Exception as e:
+        print(f"Failed to {action}: {e}")
+        return {'error': f'Failed to {action}: {str(e)}. Please check GEE_AUTHENTICATION.md for setup instructions.'}, 500
+
+def satellite_image_response(location, start_date, end_date, filter_type):
+    """
+    render_satellite_image with GEE failures turned into error responses
+    """
+    return gee_response('retrieve satellite image', render_satellite_image, location, start_date, end_date, filter_type)
+
+def validate_image_request(location, start_date, end_date):
+    """
+    Return an error message for invalid satellite image parameters, or None
+    """
+    if not all([location, start_date, end_date]):
+        return 'Location, start_date, and end_date are required'
+
+    try:
+        normalize_location(location)
+    except (KeyError, TypeError, ValueError):
+        return 'Location must contain numeric lat and lon values'
+
+    # Validate date format and range
+    try:
+        start_dt = datetime.strptime(start_date, '%Y-%m-%d')
+        end_dt = datetime.strptime(end_date, '%Y-%m-%d')
+
+        if start_dt >= end_dt:
+            return 'Start date must be before end date'
+
+        # Ensure reasonable date range (not too large)
+        date_diff = (end_dt - start_dt).days
+        if date_diff > 365:  # Max 1 year range
+            return 'Date range cannot exceed 1 year'
+
+    except (TypeError, ValueError) as e:
+        return f'Invalid date format. Use YYYY-MM-DD format. Error: {str(e)}'
+    return None
+
 @app.route('/satellite-image', methods=['POST'])
 def get_satellite_image():
     """
     Get a satellite image from Google Earth Engine for a specific location and date range
     """
     # Check if GEE is initialized
-    if not gee_initialized:
+    if not gee_ready():
         return jsonify({
             'error': 'Google Earth Engine not initialized',
             'details': gee_error or 'Please check server logs for details. See GEE_AUTHENTICATION.md for setup instructions.'
-        }), 500
+        }), 503
     
     data = request.get_json()
     location = data.get('location')
@@ -223,181 +726,593 @@ def get_satellite_image():
     filter_type = data.get('filter', 'rgb')  # Default to RGB
     # Removed event_type parameter handling
 
-    if not all([location, start_date, end_date]):
-        return jsonify({'error': 'Location, start_date, and end_date are required'}), 400
-
-    # Validate date format and range
-    try:
-        from datetime import datetime
-        start_dt = datetime.strptime(start_date, '%Y-%m-%d')
-        end_dt = datetime.strptime(end_date, '%Y-%m-%d')
+    error = validate_image_request(location, start_date, end_date)
+    if error:
+        return jsonify({'error': error}), 400
+    
+    body, status = satellite_image_response(location, start_date, end_date, filter_type)
+    return jsonify(body), status
 
-        if start_dt >= end_dt:
-            return jsonify({'error': 'Start date must be before end date'}), 400
+BATCH_MAX_ITEMS = int(os.environ.get('BATCH_MAX_ITEMS', 100))
+BATCH_MAX_PARALLEL = int(os.environ.get('BATCH_MAX_PARALLEL', 4))
 
-        # Ensure reasonable date range (not too large)
-        date_diff = (end_dt - start_dt).days
-        if date_diff > 365:  # Max 1 year range
-            return jsonify({'error': 'Date range cannot exceed 1 year'}), 400
+@app.route('/satellite-image/batch', methods=['POST'])
+def get_satellite_image_batch():
+    """
+    Get satellite images for a list of {location, start_date, end_date, filter}
+    items. Items are rendered concurrently and each result is streamed back as
+    an NDJSON line {"index", "status", "result"} as soon as it completes.
+    """
+    if not gee_ready():
+        return jsonify({
+            'error': 'Google Earth Engine not initialized',
+            'details': gee_error or 'Please check server logs for details. See GEE_AUTHENTICATION.md for setup instructions.'
+        }), 503
 
-    except ValueError as e:
-        return jsonify({'error': f'Invalid date format. Use YYYY-MM-DD format. Error: {str(e)}'}), 400
-    
+    data = request.get_json()
+    items = data.get('items')
+    if not isinstance(items, list) or not items:
+        return jsonify({'error': 'items must be a non-empty list'}), 400
+    if len(items) > BATCH_MAX_ITEMS:
+        return jsonify({'error': f'A batch cannot contain more than {BATCH_MAX_ITEMS} items'}), 400
     try:
-        # Create a small bounding box around the location for better coverage (0.1 degrees ~11km)
-        lat = location['lat']
-        lon = location['lon']
-        buffer = 0.1
-        bounds = [
-            [lon - buffer, lat - buffer],
-            [lon + buffer, lat - buffer],
-            [lon + buffer, lat + buffer],
-            [lon - buffer, lat + buffer],
-            [lon - buffer, lat - buffer]
-        ]
-        geometry = ee.Geometry.Polygon([bounds])
+        parallel = max(1, min(int(data.get('max_parallel', BATCH_MAX_PARALLEL)), BATCH_MAX_PARALLEL))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'max_parallel must be an integer'}), 400
 
-        # Use a default satellite collection
-        collection_name = "LANDSAT/LC08/C02/T1_L2"
+    # Identical items are rendered once; shared plans and map IDs between
+    # different items are deduplicated by the caches
+    invalid = []
+    groups = {}
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            invalid.append((index, {'error': 'Each item must be an object'}))
+            continue
+        params = (item.get('location'), item.get('start_date'), item.get('end_date'), item.get('filter', 'rgb'))
+        error = validate_image_request(*params[:3])
+        if not error and params[3] not in IMAGE_FILTERS:
+            error = f"filter must be one of {', '.join(IMAGE_FILTERS)}"
+        if error:
+            invalid.append((index, {'error': error}))
+            continue
+        key = (normalize_location(params[0]),) + params[1:]
+        groups.setdefault(key, (params, []))[1].append(index)
 
-        # Load the satellite image collection
-        collection = ee.ImageCollection(collection_name)
+    def generate():
+        for index, body in invalid:
+            yield json.dumps({'index': index, 'status': 400, 'result': body}) + '\n'
 
-        # Broaden the initial date range: +/- 30 days around the provided range midpoint
-        from datetime import datetime, timedelta
-        start_dt = datetime.strptime(start_date, '%Y-%m-%d')
-        end_dt = datetime.strptime(end_date, '%Y-%m-%d')
-        mid_dt = start_dt + (end_dt - start_dt) / 2
-        broadened_start = (mid_dt - timedelta(days=30)).strftime('%Y-%m-%d')
-        broadened_end = (mid_dt + timedelta(days=30)).strftime('%Y-%m-%d')
-
-        # Filter by broadened date and geometry
-        filtered = collection.filterDate(broadened_start, broadened_end).filterBounds(geometry)
-
-        # Check if we have any images
-        image_count = filtered.size().getInfo()
-        print(f"Found {image_count} images for broadened date range {broadened_start} to {broadened_end} around location {lat}, {lon}")
-
-        if image_count == 0:
-            # Try an even broader date range: +/- 90 days
-            print("No images found, trying broader date range...")
-            broader_start = (mid_dt - timedelta(days=90)).strftime('%Y-%m-%d')
-            broader_end = (mid_dt + timedelta(days=90)).strftime('%Y-%m-%d')
-
-            print(f"Trying extended range: {broader_start} to {broader_end}")
-            filtered = collection.filterDate(broader_start, broader_end).filterBounds(geometry)
-            image_count = filtered.size().getInfo()
-            print(f"Found {image_count} images in extended range")
-
-            if image_count == 0:
-                # Try with Sentinel-2 as an alternative with original dates
-                print("No Landsat images found, trying Sentinel-2...")
-                collection_name = "COPERNICUS/S2_SR"
-                collection = ee.ImageCollection(collection_name)
-                filtered = collection.filterDate(start_date, end_date).filterBounds(geometry)
-                image_count = filtered.size().getInfo()
-                print(f"Found {image_count} Sentinel-2 images")
-
-                if image_count == 0:
-                    # Final try: Sentinel-2 with broadened dates
-                    filtered = collection.filterDate(broadened_start, broadened_end).filterBounds(geometry)
-                    image_count = filtered.size().getInfo()
-                    print(f"Found {image_count} Sentinel-2 images in broadened range")
-
-                    if image_count == 0:
-                        return jsonify({
-                            'error': f'No satellite images found for the specified location and date range. This could be due to:\n• Location not covered by satellite imagery (e.g., poles, oceans)\n• Cloud cover blocking the view\n• Date range with no available images\n• Try a different location or date range.'
-                        }), 404
-
-        # Get the median composite of available images and apply scaling
-        if collection_name == "LANDSAT/LC08/C02/T1_L2" or collection_name == "LANDSAT/LE07/C02/T1_L2" or collection_name == "LANDSAT/LT05/C02/T1_L2":
-            image = filtered.median().multiply(0.0000275).add(-0.2)
-            band_prefix = 'SR_'
-        else:
-            # For Sentinel-2
-            image = filtered.median().multiply(0.0001)
-            band_prefix = ''
-
-        # Determine visualization parameters based on filter
-        if filter_type == 'ndwi':
-            # NDWI: (Green - NIR) / (Green + NIR)
-            green = image.select(f'{band_prefix}B3')
-            nir = image.select(f'{band_prefix}B5')
-            ndwi = green.subtract(nir).divide(green.add(nir)).rename(['ndwi'])
-            vis_params = {
-                'bands': ['ndwi'],
-                'min': -1,
-                'max': 1,
-                'palette': ['blue', 'white', 'green']  # Water in blue, land in green
+        executor = ThreadPoolExecutor(max_workers=parallel, thread_name_prefix='batch')
+        try:
+            futures = {
+                executor.submit(tracing.propagate(satellite_image_response), *params): indices
+                for params, indices in groups.values()
             }
-            image = ndwi
-        elif filter_type == 'ndvi':
-            # NDVI: (NIR - Red) / (NIR + Red)
-            nir = image.select(f'{band_prefix}B5')
-            red = image.select(f'{band_prefix}B4')
-            ndvi = nir.subtract(red).divide(nir.add(red)).rename(['ndvi'])
-            vis_params = {
-                'bands': ['ndvi'],
-                'min': -1,
-                'max': 1,
-                'palette': ['red', 'yellow', 'green']  # Low veg red, high veg green
+            for future in as_completed(futures):
+                body, status = future.result()
+                for index in futures[future]:
+                    if 'location' in body:
+                        body = dict(body, location=items[index]['location'])
+                    yield json.dumps({'index': index, 'status': status, 'result': body}) + '\n'
+        finally:
+            # Stop pending items if the client goes away
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    return Response(generate(), mimetype='application/x-ndjson')
+
+REGION_STATS_INDICES = ('ndvi', 'ndwi')
+REGION_STATS_PERCENTILES = [10, 25, 50, 75, 90]
+# Both indices range from -1 to 1
+REGION_STATS_HISTOGRAM_BINS = int(os.environ.get('REGION_STATS_HISTOGRAM_BINS', 20))
+REGION_STATS_SCALE = int(os.environ.get('REGION_STATS_SCALE', 30))
+
+stats_cache = TTLCache('region_stats', MAP_CACHE_TTL, MAP_CACHE_MAX_ENTRIES, MAP_CACHE_MAX_BYTES)
+
+def region_stats_reducer():
+    """
+    Mean, standard deviation, percentiles, histogram and valid pixel count
+    combined into one reducer, so they are computed in a single pass
+    """
+    return (ee.Reducer.mean()
+            .combine(ee.Reducer.stdDev(), sharedInputs=True)
+            .combine(ee.Reducer.percentile(REGION_STATS_PERCENTILES), sharedInputs=True)
+            .combine(ee.Reducer.fixedHistogram(-1, 1, REGION_STATS_HISTOGRAM_BINS), sharedInputs=True)
+            .combine(ee.Reducer.count(), sharedInputs=True))
+
+def summarize_region_stats(values, index):
+    """
+    Turn the reduceRegion output for an index band into the response format
+    """
+    histogram = values.get(f'{index}_histogram') or []
+    width = 2 / REGION_STATS_HISTOGRAM_BINS
+    total = sum(count for _, count in histogram)
+    stats = {
+        'mean': values.get(f'{index}_mean'),
+        'std_dev': values.get(f'{index}_stdDev'),
+        'percentiles': {f'p{p}': values.get(f'{index}_p{p}') for p in REGION_STATS_PERCENTILES},
+        'histogram': [
+            {'min': round(lower, 6), 'max': round(lower + width, 6), 'count': count}
+            for lower, count in histogram
+        ],
+        'valid_pixels': values.get(f'{index}_count', 0)
+    }
+    if index == 'ndwi':
+        # Open water has a positive NDWI; 0 is a bin edge, so this is exact
+        stats['water_fraction'] = (sum(count for lower, count in histogram if round(lower, 6) >= 0) / total) if total else None
+    return stats
+
+def render_region_stats(location, start_date, end_date, index):
+    """
+    Statistics of an index composite over the region around a location,
+    computed with one reduceRegion call. Returns a (response body, status code) tuple.
+    """
+    lat, lon = normalize_location(location)
+    geometry = build_region(lat, lon)
+
+    def render(resolved):
+        _, plan = resolved
+        if plan['image_count'] == 0:
+            return {'error': NO_IMAGES_MESSAGE}, 404
+
+        def compute():
+            image, _ = build_composite(geometry, plan, index)
+            values = image.reduceRegion(
+                reducer=region_stats_reducer(),
+                geometry=geometry,
+                scale=REGION_STATS_SCALE,
+                maxPixels=1e9
+            )
+            return summarize_region_stats(run_gee('region_stats', values.getInfo), index)
+
+        stats_key = (lat, lon, plan['collection'], plan['start'], plan['end'], index)
+        stats = stats_cache.get_or_compute(stats_key, compute)
+
+        return {
+            'location': location,
+            'collection': plan['collection'],
+            'image_count': plan['image_count'],
+            'date_range': f"{plan['start']} to {plan['end']}",
+            'index': index,
+            'scale': REGION_STATS_SCALE,
+            'stats': stats
+        }, 200
+
+    return render_with_plans(lat, lon, geometry, [(start_date, end_date)], render)
+
+@app.route('/region-stats', methods=['POST'])
+def get_region_stats():
+    """
+    Get NDVI or NDWI statistics (mean, standard deviation, percentiles,
+    histogram, valid pixel count) for the same composite as /satellite-image
+    """
+    if not gee_ready():
+        return jsonify({
+            'error': 'Google Earth Engine not initialized',
+            'details': gee_error or 'Please check server logs for details. See GEE_AUTHENTICATION.md for setup instructions.'
+        }), 503
+
+    data = request.get_json()
+    location = data.get('location')
+    start_date = data.get('start_date')
+    end_date = data.get('end_date')
+    index = data.get('index', 'ndvi')
+
+    error = validate_image_request(location, start_date, end_date)
+    if error:
+        return jsonify({'error': error}), 400
+    if index not in REGION_STATS_INDICES:
+        return jsonify({'error': f"index must be one of {', '.join(REGION_STATS_INDICES)}"}), 400
+
+    body, status = gee_response('compute region statistics', render_region_stats, location, start_date, end_date, index)
+    return jsonify(body), status
+
+CHANGE_THRESHOLD = float(os.environ.get('CHANGE_THRESHOLD', 0.2))
+CHANGE_VIS_PARAMS = {
+    'bands': ['difference'],
+    'min': -0.5,
+    'max': 0.5,
+    'palette': ['red', 'white', 'green']  # Decrease in red, increase in green
+}
+
+change_cache = TTLCache('change_detection', MAP_CACHE_TTL, MAP_CACHE_MAX_ENTRIES, MAP_CACHE_MAX_BYTES)
+
+def change_image(geometry, before_plan, after_plan, index, threshold):
+    """
+    One multi-band image holding both composites, their difference, and the
+    area (m²) of pixels whose index rose or fell by more than threshold
+    """
+    before, _ = build_composite(geometry, before_plan, index)
+    after, _ = build_composite(geometry, after_plan, index)
+    difference = after.subtract(before).rename('difference')
+    pixel_area = ee.Image.pixelArea()
+    return ee.Image.cat([
+        before.rename('before'),
+        after.rename('after'),
+        difference,
+        pixel_area.updateMask(difference.mask()).rename('valid_area'),
+        pixel_area.updateMask(difference.gt(threshold)).rename('gained_area'),
+        pixel_area.updateMask(difference.lt(-threshold)).rename('lost_area')
+    ])
+
+def summarize_change(values):
+    """
+    Turn the reduceRegion output of change_image into the response format
+    """
+    before_mean = values.get('before_mean')
+    after_mean = values.get('after_mean')
+    gained = (values.get('gained_area_sum') or 0) / 1e6
+    lost = (values.get('lost_area_sum') or 0) / 1e6
+    valid = (values.get('valid_area_sum') or 0) / 1e6
+    change_percentage = None
+    if before_mean and after_mean is not None:
+        change_percentage = (after_mean - before_mean) / abs(before_mean) * 100
+    return {
+        'before_mean': before_mean,
+        'after_mean': after_mean,
+        'mean_difference': values.get('difference_mean'),
+        'change_percentage': change_percentage,
+        'gained_area_km2': gained,
+        'lost_area_km2': lost,
+        'changed_area_km2': gained + lost,
+        'valid_area_km2': valid,
+        'changed_fraction': ((gained + lost) / valid) if valid else None
+    }
+
+def render_change_detection(location, before_window, after_window, index, threshold):
+    """
+    Compare index composites of two date windows over the region around a
+    location. The statistics come from one reduceRegion call over a single
+    graph, and the difference layer gets its own map ID. Returns a
+    (response body, status code) tuple.
+    """
+    lat, lon = normalize_location(location)
+    geometry = build_region(lat, lon)
+
+    def render(before_resolved, after_resolved):
+        _, before_plan = before_resolved
+        _, after_plan = after_resolved
+        if before_plan['image_count'] == 0 or after_plan['image_count'] == 0:
+            return {'error': NO_IMAGES_MESSAGE}, 404
+
+        def compute():
+            image = change_image(geometry, before_plan, after_plan, index, threshold)
+            values = image.reduceRegion(
+                reducer=ee.Reducer.mean().combine(ee.Reducer.sum(), sharedInputs=True),
+                geometry=geometry,
+                scale=REGION_STATS_SCALE,
+                maxPixels=1e9
+            )
+            # The map ID request does not depend on the statistics, so both go out together
+            with ThreadPoolExecutor(max_workers=1, thread_name_prefix='change') as executor:
+                map_future = executor.submit(tracing.propagate(run_gee), 'change.map_id', image.getMapId, CHANGE_VIS_PARAMS)
+                stats = summarize_change(run_gee('change.stats', values.getInfo))
+                map_id = map_future.result()
+            return {
+                'map_id': map_id['mapid'],
+                'token': map_id.get('token', ''),
+                'stats': stats
             }
-            image = ndvi
-        elif filter_type == 'false_color':
-            # False color: NIR, Red, Green for vegetation enhancement
-            vis_params = {
-                'bands': [f'{band_prefix}B5', f'{band_prefix}B4', f'{band_prefix}B3'],  # NIR, Red, Green
-                'min': 0,
-                'max': 0.3
+
+        change_key = (
+            lat, lon,
+            before_plan['collection'], before_plan['start'], before_plan['end'],
+            after_plan['collection'], after_plan['start'], after_plan['end'],
+            index, threshold
+        )
+        result = change_cache.get_or_compute(change_key, compute)
+
+        def period(plan):
+            return {
+                'collection': plan['collection'],
+                'image_count': plan['image_count'],
+                'date_range': f"{plan['start']} to {plan['end']}"
             }
-        else:
-            # Default RGB
-            vis_params = {
-                'bands': [f'{band_prefix}B4', f'{band_prefix}B3', f'{band_prefix}B2'],
-                'min': 0,
-                'max': 0.3
+
+        return dict(result, **{
+            'location': location,
+            'index': index,
+            'threshold': threshold,
+            'scale': REGION_STATS_SCALE,
+            'before': period(before_plan),
+            'after': period(after_plan),
+            # The windows are planned independently and may fall back to different sensors
+            'mixed_sensors': before_plan['collection'] != after_plan['collection']
+        }), 200
+
+    return render_with_plans(lat, lon, geometry, [before_window, after_window], render)
+
+@app.route('/change-detection', methods=['POST'])
+def detect_change():
+    """
+    Compare NDVI or NDWI between a "before" and an "after" date window:
+    mean difference, changed area in km² and a difference layer map ID
+    """
+    if not gee_ready():
+        return jsonify({
+            'error': 'Google Earth Engine not initialized',
+            'details': gee_error or 'Please check server logs for details. See GEE_AUTHENTICATION.md for setup instructions.'
+        }), 503
+
+    data = request.get_json()
+    location = data.get('location')
+    before = data.get('before') or {}
+    after = data.get('after') or {}
+    index = data.get('index', 'ndvi')
+
+    if not isinstance(before, dict) or not isinstance(after, dict):
+        return jsonify({'error': 'before and after must be objects with start_date and end_date'}), 400
+    before_window = (before.get('start_date'), before.get('end_date'))
+    after_window = (after.get('start_date'), after.get('end_date'))
+    for window in (before_window, after_window):
+        error = validate_image_request(location, *window)
+        if error:
+            return jsonify({'error': error}), 400
+    if index not in REGION_STATS_INDICES:
+        return jsonify({'error': f"index must be one of {', '.join(REGION_STATS_INDICES)}"}), 400
+    try:
+        threshold = float(data.get('threshold', CHANGE_THRESHOLD))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'threshold must be a number'}), 400
+    if not 0 < threshold < 2:
+        return jsonify({'error': 'threshold must be between 0 and 2'}), 400
+
+    body, status = gee_response('detect change', render_change_detection, location, before_window, after_window, index, threshold)
+    return jsonify(body), status
+
+TIMESERIES_COLLECTIONS = {'landsat': LANDSAT_COLLECTION, 'sentinel': SENTINEL_COLLECTION}
+TIMESERIES_MAX_YEARS = int(os.environ.get('TIMESERIES_MAX_YEARS', 10))
+# Months evaluated per getInfo, and chunks in flight per request
+TIMESERIES_CHUNK_MONTHS = int(os.environ.get('TIMESERIES_CHUNK_MONTHS', 12))
+TIMESERIES_PARALLEL = int(os.environ.get('TIMESERIES_PARALLEL', 2))
+
+# Chunks are immutable once their months are over, so they are cached like map IDs
+timeseries_cache = TTLCache('timeseries', MAP_CACHE_TTL, MAP_CACHE_MAX_ENTRIES, MAP_CACHE_MAX_BYTES)
+
+def month_windows(start_date, end_date):
+    """
+    Yield (start, end) date strings for each calendar month overlapping
+    [start_date, end_date), clipped to that range
+    """
+    start_dt = datetime.strptime(start_date, '%Y-%m-%d')
+    end_dt = datetime.strptime(end_date, '%Y-%m-%d')
+    month = start_dt.replace(day=1)
+    while month < end_dt:
+        next_month = (month + timedelta(days=32)).replace(day=1)
+        yield (max(month, start_dt).strftime('%Y-%m-%d'), min(next_month, end_dt).strftime('%Y-%m-%d'))
+        month = next_month
+
+def timeseries_chunks(start_date, end_date, size=TIMESERIES_CHUNK_MONTHS):
+    """
+    Group month windows into lists of at most size windows, lazily
+    """
+    chunk = []
+    for window in month_windows(start_date, end_date):
+        chunk.append(window)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def timeseries_point(geometry, collection_name, index, start, end):
+    """
+    Server-side dictionary with the mean index of one month's composite.
+    Months without images only report their image count.
+    """
+    filtered = image_collection(collection_name, start, end, geometry)
+    image, _ = build_visualization(filtered, collection_name, index)
+    values = image.reduceRegion(
+        reducer=ee.Reducer.mean().combine(ee.Reducer.count(), sharedInputs=True),
+        geometry=geometry,
+        scale=REGION_STATS_SCALE,
+        maxPixels=1e9
+    )
+    point = ee.Dictionary({'date': start, 'image_count': filtered.size()})
+    return point.combine(ee.Dictionary(ee.Algorithms.If(filtered.size().gt(0), values, {})))
+
+def fetch_timeseries_chunk(lat, lon, collection_name, index, chunk):
+    """
+    Evaluate the points of one chunk of months in a single getInfo.
+    Returns a (response body, status code) tuple.
+    """
+    def compute():
+        geometry = build_region(lat, lon)
+        points = ee.List([timeseries_point(geometry, collection_name, index, start, end) for start, end in chunk])
+        return [
+            {
+                'date': point['date'],
+                'mean': point.get(f'{index}_mean'),
+                'valid_pixels': point.get(f'{index}_count', 0),
+                'image_count': point['image_count']
             }
+            for point in run_gee('timeseries.chunk', points.getInfo)
+        ]
 
-        # Get the map ID and token for visualization
-        map_id = image.getMapId(vis_params)
+    chunk_key = (lat, lon, collection_name, index, chunk[0][0], chunk[-1][1])
+    return {'points': timeseries_cache.get_or_compute(chunk_key, compute)}, 200
 
+@app.route('/timeseries', methods=['POST'])
+def get_timeseries():
+    """
+    Monthly mean NDVI or NDWI around a location. Months are evaluated in
+    chunks, and points are streamed as NDJSON lines (or Server-Sent Events
+    when the client accepts text/event-stream) as each chunk completes.
+    """
+    if not gee_ready():
         return jsonify({
-            'map_id': map_id['mapid'],
-            'token': map_id.get('token', ''),  # Token might be empty in newer GEE versions
-            'location': location,
-            'collection': collection_name,
-            'image_count': image_count,
-            'date_range': f'{start_date} to {end_date} (broadened to {broadened_start} to {broadened_end})',
-            'filter': filter_type
-        })
-    except Exception as e:
-        print(f"Error getting satellite image: {e}")
-        return jsonify({'error': f'Failed to retrieve satellite image: {str(e)}. Please check GEE_AUTHENTICATION.md for setup instructions.'}), 500
+            'error': 'Google Earth Engine not initialized',
+            'details': gee_error or 'Please check server logs for details. See GEE_AUTHENTICATION.md for setup instructions.'
+        }), 503
+
+    data = request.get_json()
+    location = data.get('location')
+    start_date = data.get('start_date')
+    end_date = data.get('end_date')
+    index = data.get('index', 'ndvi')
+    collection = data.get('collection', 'landsat')
+
+    if not all([location, start_date, end_date]):
+        return jsonify({'error': 'Location, start_date, and end_date are required'}), 400
+    try:
+        lat, lon = normalize_location(location)
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'error': 'Location must contain numeric lat and lon values'}), 400
+    try:
+        start_dt = datetime.strptime(start_date, '%Y-%m-%d')
+        end_dt = datetime.strptime(end_date, '%Y-%m-%d')
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': f'Invalid date format. Use YYYY-MM-DD format. Error: {str(e)}'}), 400
+    if start_dt >= end_dt:
+        return jsonify({'error': 'Start date must be before end date'}), 400
+    if (end_dt - start_dt).days > TIMESERIES_MAX_YEARS * 366:
+        return jsonify({'error': f'Date range cannot exceed {TIMESERIES_MAX_YEARS} years'}), 400
+    if index not in REGION_STATS_INDICES:
+        return jsonify({'error': f"index must be one of {', '.join(REGION_STATS_INDICES)}"}), 400
+    if collection not in TIMESERIES_COLLECTIONS:
+        return jsonify({'error': f"collection must be one of {', '.join(TIMESERIES_COLLECTIONS)}"}), 400
+    collection_name = TIMESERIES_COLLECTIONS[collection]
+
+    mimetype = request.accept_mimetypes.best_match(['application/x-ndjson', 'text/event-stream'])
+    if mimetype == 'text/event-stream':
+        def encode(message):
+            return f'data: {json.dumps(message)}\n\n'
+    else:
+        mimetype = 'application/x-ndjson'
+        def encode(message):
+            return json.dumps(message) + '\n'
+
+    def generate():
+        # Only TIMESERIES_PARALLEL chunks are held at a time, whatever the
+        # length of the series; results are emitted in date order
+        executor = ThreadPoolExecutor(max_workers=TIMESERIES_PARALLEL, thread_name_prefix='timeseries')
+        try:
+            pending = []
+            for chunk in timeseries_chunks(start_date, end_date):
+                pending.append((chunk, executor.submit(
+                    tracing.propagate(gee_response), 'compute time series', fetch_timeseries_chunk, lat, lon, collection_name, index, chunk
+                )))
+                if len(pending) < TIMESERIES_PARALLEL:
+                    continue
+                yield from chunk_messages(*pending.pop(0))
+            for chunk, future in pending:
+                yield from chunk_messages(chunk, future)
+        finally:
+            # Stop pending chunks if the client goes away
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def chunk_messages(chunk, future):
+        body, status = future.result()
+        if status != 200:
+            yield encode({'start': chunk[0][0], 'end': chunk[-1][1], 'status': status, 'error': body['error']})
+            return
+        for point in body['points']:
+            yield encode(point)
+
+    return Response(generate(), mimetype=mimetype)
+
+TILE_UPSTREAM_URL = 'https://earthengine.googleapis.com/v1'
+# Tiles of a map ID never change, so browsers may keep them as long as we keep the map ID
+TILE_MAX_AGE = int(os.environ.get('TILE_MAX_AGE', MAP_CACHE_TTL))
+MAP_ID_PATTERN = re.compile(r'^(projects/[\w.-]+/maps/)?[\w-]+$')
+
+tile_cache = TileCache()
+tile_client = HTTPClient(
+    'earthengine-tiles',
+    max_retries=2,
+    max_wait=5,
+    pool_size=int(os.environ.get('TILE_POOL_SIZE', 32))
+)
+
+def full_map_id(mapid):
+    """
+    Older map IDs are returned without their project prefix
+    """
+    if '/' not in mapid:
+        return f'projects/earthengine-legacy/maps/{mapid}'
+    return mapid
+
+def fetch_tile(mapid, z, x, y, token=None):
+    """
+    Return (tile bytes, upstream status) from the local tile cache or Earth Engine.
+    Tile bytes are None when Earth Engine did not return a tile.
+    """
+    key = f'{mapid}/{z}/{x}/{y}'
+    data = tile_cache.get(key)
+    if data is not None:
+        return data, 200
+
+    params = {'token': token} if token else None
+    response = tile_client.get(f'{TILE_UPSTREAM_URL}/{mapid}/tiles/{z}/{x}/{y}', params=params, timeout=30)
+    if response.status_code != 200:
+        return None, response.status_code
+
+    try:
+        tile_cache.put(key, response.content)
+    except OSError as e:
+        print(f"Failed to cache tile: {e}")
+    return response.content, 200
+
+# Optional warm-up of the tiles of newly created map IDs
+tile_prefetcher = TilePrefetcher(fetch_tile) if TILE_PREFETCH_ENABLED else None
+
+@app.route('/tiles/<path:mapid>/<int:z>/<int:x>/<int:y>', methods=['GET'])
+def get_tile(mapid, z, x, y):
+    """
+    Serve an Earth Engine map tile through the local tile cache
+    """
+    if not MAP_ID_PATTERN.match(mapid):
+        return jsonify({'error': 'Invalid map ID'}), 400
+    if x >= 2 ** z or y >= 2 ** z:
+        return jsonify({'error': 'Tile coordinates out of range'}), 400
+
+    try:
+        data, status = fetch_tile(full_map_id(mapid), z, x, y, request.args.get('token'))
+    except requests.exceptions.RequestException as e:
+        print(f"Error fetching tile: {e}")
+        return jsonify({'error': 'Failed to fetch tile from Earth Engine'}), 502
+    if data is None:
+        return jsonify({'error': f'Earth Engine returned status {status} for this tile'}), (404 if status == 404 else 502)
+
+    response = Response(data, mimetype='image/png')
+    response.headers['Cache-Control'] = f'public, max-age={TILE_MAX_AGE}'
+    response.set_etag(hashlib.sha1(data).hexdigest())
+    return response.make_conditional(request)
 
 def calculate_area(geometry):
     """
-    Calculate area of a polygon geometry using GEE
+    Calculate area of a polygon geometry locally on the WGS84 ellipsoid.
+    Raises ValueError for invalid geometries.
     """
     try:
-        if not gee_initialized:
+        part_areas = geodesy.geometry_area(geometry) / 1e6
+        return {'area': float(part_areas.sum()), 'unit': 'km²', 'per_part': part_areas.tolist()}
+    except ValueError:
+        raise
+    except Exception as e:
+        print(f"Error calculating area: {e}")
+        return {'error': str(e)}
+
+def calculate_area_gee(geometry):
+    """
+    Calculate area of a polygon geometry using GEE.
+    Every part, holes included, is evaluated in a single getInfo.
+    """
+    try:
+        if not gee_ready():
             return {'error': 'Google Earth Engine not initialized'}
         
-        total_area = 0
         if geometry['type'] == 'Polygon':
-            coords = geometry['coordinates'][0]  # exterior ring
-            ee_geom = ee.Geometry.Polygon([coords])
-            area = ee_geom.area().getInfo() / 1e6
-            total_area += area
+            polygons = [geometry['coordinates']]
         elif geometry['type'] == 'MultiPolygon':
-            for poly in geometry['coordinates']:
-                coords = poly[0]  # exterior ring of first polygon
-                ee_geom = ee.Geometry.Polygon([coords])
-                area = ee_geom.area().getInfo() / 1e6
-                total_area += area
+            polygons = geometry['coordinates']
         else:
             return {'error': 'Invalid geometry type for area calculation. Expected Polygon or MultiPolygon.'}
         
-        return {'area': total_area, 'unit': 'km²'}
+        # Passing all rings keeps the holes of each part
+        part_areas = ee.List([ee.Geometry.Polygon(polygon).area() for polygon in polygons])
+        part_areas = run_gee('measure.area', part_areas.getInfo)
+        part_areas = [area / 1e6 for area in part_areas]
+        return {'area': sum(part_areas), 'unit': 'km²', 'per_part': part_areas}
     except Exception as e:
         print(f"Error calculating area: {e}")
         return {'error': str(e)}
@@ -405,49 +1320,73 @@ def calculate_area(geometry):
 @app.route('/measure-area', methods=['POST'])
 def measure_area():
     """
-    Endpoint to measure area from GeoJSON polygon
+    Endpoint to measure area from GeoJSON polygon.
+    Pass "verify": "gee" to cross-check the local result against Earth Engine.
     """
-    if not gee_initialized:
-        return jsonify({
-            'error': 'Google Earth Engine not initialized',
-            'details': gee_error or 'Please check server logs for details.'
-        }), 500
-    
     data = request.get_json()
     geometry = data.get('geometry')
+    verify = data.get('verify')
     
     if not geometry:
         return jsonify({'error': 'Geometry is required'}), 400
     
-    result = calculate_area(geometry)
+    try:
+        result = calculate_area(geometry)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     if 'error' in result:
         return jsonify(result), 500
+
+    if verify == 'gee':
+        if not gee_ready():
+            return jsonify({
+                'error': 'Google Earth Engine not initialized',
+                'details': gee_error or 'Please check server logs for details.'
+            }), 503
+
+        gee_result = calculate_area_gee(geometry)
+        if 'error' in gee_result:
+            return jsonify(gee_result), 500
+        result['gee_area'] = gee_result['area']
+        result['gee_per_part'] = gee_result['per_part']
+        result['difference'] = result['area'] - gee_result['area']
     
     return jsonify(result)
 
 def calculate_distance(geometry):
     """
-    Calculate length of a line geometry using GEE
+    Calculate length of a line geometry locally on the WGS84 ellipsoid.
+    Raises ValueError for invalid geometries.
+    """
+    try:
+        part_lengths = geodesy.geometry_length(geometry) / 1000
+        return {'distance': float(part_lengths.sum()), 'unit': 'km', 'per_part': part_lengths.tolist()}
+    except ValueError:
+        raise
+    except Exception as e:
+        print(f"Error calculating distance: {e}")
+        return {'error': str(e)}
+
+def calculate_distance_gee(geometry):
+    """
+    Calculate length of a line geometry using GEE.
+    Every part is evaluated in a single getInfo.
     """
     try:
-        if not gee_initialized:
+        if not gee_ready():
             return {'error': 'Google Earth Engine not initialized'}
         
-        total_length = 0
         if geometry['type'] == 'LineString':
-            coords = geometry['coordinates']
-            ee_geom = ee.Geometry.LineString(coords)
-            length = ee_geom.length().getInfo() / 1000
-            total_length += length
+            lines = [geometry['coordinates']]
         elif geometry['type'] == 'MultiLineString':
-            for line in geometry['coordinates']:
-                ee_geom = ee.Geometry.LineString(line)
-                length = ee_geom.length().getInfo() / 1000
-                total_length += length
+            lines = geometry['coordinates']
         else:
             return {'error': 'Invalid geometry type for distance calculation. Expected LineString or MultiLineString.'}
         
-        return {'distance': total_length, 'unit': 'km'}
+        part_lengths = ee.List([ee.Geometry.LineString(line).length() for line in lines])
+        part_lengths = run_gee('measure.distance', part_lengths.getInfo)
+        part_lengths = [length / 1000 for length in part_lengths]
+        return {'distance': sum(part_lengths), 'unit': 'km', 'per_part': part_lengths}
     except Exception as e:
         print(f"Error calculating distance: {e}")
         return {'error': str(e)}
@@ -455,23 +1394,36 @@ def calculate_distance(geometry):
 @app.route('/measure-distance', methods=['POST'])
 def measure_distance():
     """
-    Endpoint to measure distance from GeoJSON polyline
+    Endpoint to measure distance from GeoJSON polyline.
+    Pass "verify": "gee" to cross-check the local result against Earth Engine.
     """
-    if not gee_initialized:
-        return jsonify({
-            'error': 'Google Earth Engine not initialized',
-            'details': gee_error or 'Please check server logs for details.'
-        }), 500
-    
     data = request.get_json()
     geometry = data.get('geometry')
+    verify = data.get('verify')
     
     if not geometry:
         return jsonify({'error': 'Geometry is required'}), 400
     
-    result = calculate_distance(geometry)
+    try:
+        result = calculate_distance(geometry)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     if 'error' in result:
         return jsonify(result), 500
+
+    if verify == 'gee':
+        if not gee_ready():
+            return jsonify({
+                'error': 'Google Earth Engine not initialized',
+                'details': gee_error or 'Please check server logs for details.'
+            }), 503
+
+        gee_result = calculate_distance_gee(geometry)
+        if 'error' in gee_result:
+            return jsonify(gee_result), 500
+        result['gee_distance'] = gee_result['distance']
+        result['gee_per_part'] = gee_result['per_part']
+        result['difference'] = result['distance'] - gee_result['distance']
     
     return jsonify(result)
 
@@ -484,6 +1436,10 @@ def health_check():
         'status': 'ok',
         'gee_initialized': gee_initialized,
         'gee_error': gee_error,
+        'gee_init_attempts': gee_initializer.attempts,
+        # Set when initialization gave up on a configuration error
+        'gee_init_failure': gee_initializer.failure,
+        'gee_backend': GEE_BACKEND,
         'timestamp': datetime.now().isoformat()
     })
 
@@ -498,13 +1454,70 @@ def auth_status():
         'project_id': os.environ.get('GEE_PROJECT_ID', 'not set')
     })
 
+@app.route('/cache-stats', methods=['GET'])
+def cache_stats():
+    """
+    Hit/miss counters for the satellite image, analysis, geocoding and tile caches
+    """
+    stats = {
+        plan_cache.name: plan_cache.stats(),
+        map_cache.name: map_cache.stats(),
+        stats_cache.name: stats_cache.stats(),
+        change_cache.name: change_cache.stats(),
+        timeseries_cache.name: timeseries_cache.stats(),
+        geocode_cache.name: geocode_cache.stats(),
+        tile_cache.name: tile_cache.stats()
+    }
+    if tile_prefetcher is not None:
+        stats[tile_prefetcher.name] = tile_prefetcher.stats()
+    return jsonify(stats)
+
+@app.route('/debug/trace/<request_id>', methods=['GET'])
+def debug_trace(request_id):
+    """
+    Waterfall of a traced request's spans, by the X-Trace-ID of its response.
+    ?format=otlp returns the raw OTLP JSON and ?format=text a plain text
+    rendering. Only served when TRACE_DEBUG_ENDPOINT is enabled.
+    """
+    if not tracing.TRACE_DEBUG_ENDPOINT:
+        return jsonify({'error': 'API route not found'}), 404
+    otlp = tracing.load_trace(request_id)
+    if otlp is None:
+        return jsonify({
+            'error': 'Trace not found',
+            'details': f'Only sampled requests are traced (TRACE_SAMPLE_RATE={tracing.TRACE_SAMPLE_RATE}); traced responses carry an X-Trace-ID header.'
+        }), 404
+
+    output_format = request.args.get('format')
+    if output_format == 'otlp':
+        return jsonify(otlp)
+    view = tracing.waterfall(otlp)
+    if output_format == 'text':
+        return Response('\n'.join(view['lines']) + '\n', mimetype='text/plain')
+    return jsonify(dict(view, request_id=request_id))
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """
+    Prometheus metrics aggregated over all workers
+    """
+    if not metrics.enabled():
+        return jsonify({'error': 'Metrics require the prometheus_client package'}), 501
+    if gee_admission.controller is not None:
+        try:
+            gee_admission.controller.publish()
+        except sqlite3.Error as e:
+            print(f"Failed to read Earth Engine admission state: {e}")
+    body, content_type = metrics.render()
+    return Response(body, content_type=content_type)
+
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
 def catch_all(path):
     """
     Serve the React app for all routes
     """
-    if path.startswith('api/') or path in ['geocode', 'satellite-image', 'health', 'auth-status']:
+    if path.startswith('api/') or path in ['geocode', 'satellite-image', 'health', 'auth-status', 'cache-stats', 'satellite-image/batch', 'region-stats', 'change-detection', 'timeseries', 'metrics']:
         return jsonify({'error': 'API route not found'}), 404
     return app.send_static_file('index.html')
 
@@ -0,0 +1,51 @@
+"""
+Helpers for the small SQLite files that hold state shared by all gunicorn
+workers on a host (caches, rate limits, indexes).
+"""
+import os
+import sqlite3
+import threading
+
+CACHE_DIR = os.environ.get('CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache'))
+
+
+def state_path(filename):
+    """
+    Default location of a shared state file inside CACHE_DIR
+    """
+    return os.path.join(CACHE_DIR, filename)
+
+
+def connect(path, timeout=10.0):
+    """
+    Open a SQLite database tuned for many concurrent readers and short writes
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute(f'PRAGMA busy_timeout={int(timeout * 1000)}')
+    return conn
+
+
+class ThreadLocalConnection:
+    """
+    Lazily opens one connection per thread, since SQLite connections
+    cannot be shared between threads
+    """
+
+    def __init__(self, path, schema=None):
+        self.path = path
+        self.schema = schema
+        self._local = threading.local()
+
+    def get(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = connect(self.path)
+            if self.schema:
+                conn.executescript(self.schema)
+            self._local.conn = conn
+        return conn
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Tests for the in-memory TTL/LRU cache used by the satellite image endpoint
+"""
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from cache import TTLCache
+
+
+class TestTTLCache(unittest.TestCase):
+    """Test expiry, eviction and counters"""
+
+    def test_hit_and_miss_counters(self):
+        cache = TTLCache('test', ttl=60)
+        self.assertIsNone(cache.get('a'))
+        cache.set('a', {'map_id': 'x'})
+        self.assertEqual(cache.get('a'), {'map_id': 'x'})
+
+        stats = cache.stats()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['hit_ratio'], 0.5)
+
+    def test_entries_expire(self):
+        cache = TTLCache('test', ttl=10)
+        with patch('cache.time.monotonic', return_value=time.monotonic()) as clock:
+            cache.set('a', 1)
+            clock.return_value += 11
+            self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.stats()['entries'], 0)
+
+    def test_lru_eviction_by_count(self):
+        cache = TTLCache('test', ttl=60, max_entries=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')  # 'b' is now least recently used
+        cache.set('c', 3)
+
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('c'), 3)
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_lru_eviction_by_size(self):
+        cache = TTLCache('test', ttl=60, max_bytes=30)
+        cache.set('a', 'x' * 10)
+        cache.set('b', 'y' * 10)
+        cache.set('c', 'z' * 10)
+
+        self.assertIsNone(cache.get('a'))
+        self.assertLessEqual(cache.stats()['bytes'], 30)
+
+    def test_get_or_compute_runs_once_for_concurrent_misses(self):
+        cache = TTLCache('test', ttl=60)
+        release = threading.Event()
+        calls = []
+
+        def compute():
+            calls.append(1)
+            release.wait(5)
+            return 'value'
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute('a', compute)))
+                   for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.1)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['value'] * 4)
+        self.assertEqual(cache.get('a'), 'value')
+
+    def test_get_or_compute_rechecks_after_taking_the_lead(self):
+        cache = TTLCache('test', ttl=60)
+        cache.set('a', 'stored')
+        calls = []
+
+        def compute():
+            calls.append(1)
+            return 'computed'
+
+        # The miss happened just before the previous leader stored its value
+        with patch.object(cache, 'get', return_value=None):
+            self.assertEqual(cache.get_or_compute('a', compute), 'stored')
+        self.assertEqual(calls, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
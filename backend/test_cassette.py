@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Tests for recording and replaying outbound traffic
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httplib2
+
+import cassette
+
+
+class Upstream(BaseHTTPRequestHandler):
+    calls = 0
+
+    def do_GET(self):
+        type(self).calls += 1
+        body = json.dumps([{'path': self.path}]).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('X-Server-Only', 'dropped')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubTransport:
+    """Earth Engine API stand-in returning the request body in the response"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def request(self, uri, method='GET', body=None, headers=None):
+        self.calls += 1
+        time.sleep(0.05)
+        return httplib2.Response({'status': 200, 'content-type': 'application/json'}), \
+            json.dumps({'result': body}).encode('utf-8')
+
+
+class TestCassette(unittest.TestCase):
+    """Test recording, replay, latency and compaction"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'cassette.jsonl')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_http_requests_replay_offline(self):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), Upstream)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f'http://127.0.0.1:{server.server_address[1]}/search'
+        try:
+            recorder = cassette.CassetteSession(cassette.Cassette(self.path, 'record'))
+            recorded = recorder.get(url, params={'q': 'paris'})
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        player = cassette.CassetteSession(cassette.Cassette(self.path, 'replay'))
+        replayed = player.get(url, params={'q': 'paris'})
+        self.assertEqual(replayed.status_code, 200)
+        self.assertEqual(replayed.json(), recorded.json())
+        self.assertEqual(replayed.headers['Content-Type'], 'application/json')
+        self.assertNotIn('X-Server-Only', replayed.headers)
+        self.assertEqual(Upstream.calls, 1)
+        with self.assertRaises(cassette.CassetteMiss):
+            player.get(url, params={'q': 'lyon'})
+
+    def test_gee_calls_replay_with_recorded_latency(self):
+        stub = StubTransport()
+        recorder = cassette.GEETransport(cassette.Cassette(self.path, 'record'), inner=stub)
+        body = '{"expression": {"values": {"0": {"constantValue": 1}}}}'
+        recorder.request('https://earthengine.googleapis.com/v1/projects/recorded/value:compute', 'POST', body)
+
+        # The project differs between recording and replay
+        uri = 'https://earthengine.googleapis.com/v1/projects/cassette-replay/value:compute'
+        player = cassette.GEETransport(cassette.Cassette(self.path, 'replay'), inner=stub)
+        started = time.perf_counter()
+        response, content = player.request(uri, 'POST', body)
+        self.assertGreaterEqual(time.perf_counter() - started, 0.04)
+        self.assertEqual(response.status, 200)
+        self.assertEqual(json.loads(content), {'result': body})
+        self.assertEqual(stub.calls, 1)
+
+        fast = cassette.GEETransport(cassette.Cassette(self.path, 'replay', latency='zero'), inner=stub)
+        started = time.perf_counter()
+        fast.request(uri, 'POST', body)
+        self.assertLess(time.perf_counter() - started, 0.04)
+
+        response, content = fast.request(uri, 'POST', '{"other": true}')
+        self.assertEqual(response.status, 404)
+        self.assertIn('No recorded response', json.loads(content)['error']['message'])
+
+    def test_compact_merges_repeated_responses(self):
+        recorder = cassette.Cassette(self.path, 'record')
+        for latency in (0.1, 0.2, 0.3):
+            recorder.record('http', 'GET', 'https://example.org/a', None, 200, {}, b'same', latency)
+        recorder.record('http', 'GET', 'https://example.org/b', None, 200, {}, b'\x89PNG', 0.4)
+
+        compacted = os.path.join(self.directory.name, 'cassette.jsonl.gz')
+        self.assertEqual(cassette.compact(self.path, compacted), 2)
+        player = cassette.Cassette(compacted, 'replay', latency='zero')
+        self.assertEqual(len(player), 4)
+        self.assertEqual(player.play('GET', 'https://example.org/b')[2], b'\x89PNG')
+        summary = cassette.stats(compacted)['http example.org']
+        self.assertEqual(summary['calls'], 4)
+        self.assertEqual(summary['distinct_responses'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Tests for the offline Earth Engine stand-in, on its own and behind server.py
+"""
+import os
+import unittest
+
+# server.py picks its Earth Engine backend when imported
+os.environ['GEE_BACKEND'] = 'fake'
+
+import fake_ee
+import server
+
+POLYGON = {'type': 'Polygon', 'coordinates': [[[2.3, 48.8], [2.4, 48.8], [2.4, 48.9], [2.3, 48.9], [2.3, 48.8]]]}
+LOCATION = {'lat': 48.85, 'lon': 2.35}
+
+
+class TestFakeEE(unittest.TestCase):
+    """Test the lazy API, synthetic data and fault injection"""
+
+    def setUp(self):
+        fake_ee.configure(latency=0, jitter=0, error_rate=0, empty_collections=set(), seed=0)
+        fake_ee.reset_counts()
+
+    def test_collection_size_follows_revisit(self):
+        geometry = fake_ee.Geometry.Polygon(POLYGON['coordinates'])
+        landsat = fake_ee.ImageCollection('LANDSAT/LC08/C02/T1_L2').filterDate('2023-01-01', '2023-12-31')
+        sentinel = fake_ee.ImageCollection('COPERNICUS/S2_SR').filterDate('2023-01-01', '2023-12-31')
+        self.assertIn(landsat.filterBounds(geometry).size().getInfo(), (22, 23))
+        self.assertEqual(sentinel.filterBounds(geometry).size().getInfo(), 73)
+        # Nothing before the mission started
+        self.assertEqual(sentinel.filterDate('2015-01-01', '2016-01-01').size().getInfo(), 0)
+        self.assertEqual(fake_ee.call_counts(), {'getInfo': 3, 'getMapId': 0})
+
+    def test_reductions_are_deterministic(self):
+        geometry = fake_ee.Geometry.Polygon(POLYGON['coordinates'])
+        image = fake_ee.ImageCollection('COPERNICUS/S2_SR').filterDate('2023-06-01', '2023-07-01') \
+            .filterBounds(geometry).median().multiply(0.0001)
+        ndvi = image.select('B8').subtract(image.select('B4')) \
+            .divide(image.select('B8').add(image.select('B4'))).rename('NDVI')
+        reducer = fake_ee.Reducer.mean().combine(fake_ee.Reducer.count(), sharedInputs=True)
+        first = ndvi.reduceRegion(reducer=reducer, geometry=geometry, scale=30).getInfo()
+        second = ndvi.reduceRegion(reducer=reducer, geometry=geometry, scale=30).getInfo()
+        self.assertEqual(first, second)
+        self.assertEqual(set(first), {'NDVI_mean', 'NDVI_count'})
+        self.assertTrue(-1 <= first['NDVI_mean'] <= 1)
+        self.assertEqual(ndvi.getMapId()['mapid'], ndvi.getMapId()['mapid'])
+
+    def test_empty_composite_has_no_bands(self):
+        fake_ee.configure(empty_collections={'COPERNICUS/S2_SR'})
+        geometry = fake_ee.Geometry.Polygon(POLYGON['coordinates'])
+        filtered = fake_ee.ImageCollection('COPERNICUS/S2_SR').filterDate('2023-06-01', '2023-07-01')
+        values = filtered.median().select('B4').reduceRegion(fake_ee.Reducer.mean(), geometry, 30)
+        with self.assertRaises(fake_ee.EEException):
+            values.getInfo()
+        # The branch that is not taken is never evaluated
+        guarded = fake_ee.Algorithms.If(filtered.size().gt(0), values, {})
+        self.assertEqual(fake_ee.Dictionary(guarded).getInfo(), {})
+
+    def test_geometry_measurements(self):
+        area = fake_ee.Geometry.Polygon(POLYGON['coordinates']).area().getInfo()
+        length = fake_ee.Geometry.LineString([[2.3, 48.8], [2.4, 48.8]]).length().getInfo()
+        self.assertAlmostEqual(area / 1e6, 81.6, delta=0.1)
+        self.assertAlmostEqual(length / 1000, 7.34, delta=0.01)
+
+    def test_error_injection(self):
+        fake_ee.configure(error_rate=1.0, error_message='Quota exceeded')
+        with self.assertRaisesRegex(fake_ee.EEException, 'Quota exceeded'):
+            fake_ee.List([1]).getInfo()
+        fake_ee.configure(error_rate=0.5, seed=1)
+        outcomes = []
+        for _ in range(20):
+            try:
+                fake_ee.List([1]).getInfo()
+                outcomes.append(True)
+            except fake_ee.EEException:
+                outcomes.append(False)
+        self.assertIn(True, outcomes)
+        self.assertIn(False, outcomes)
+
+
+class TestServerOnFakeEE(unittest.TestCase):
+    """Test the Earth Engine routes end to end without an account"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.client = server.app.test_client()
+        cls.client.get('/health')
+        server.gee_ready()
+
+    def setUp(self):
+        fake_ee.configure(latency=0, jitter=0, error_rate=0, empty_collections=set(), seed=0)
+        fake_ee.reset_counts()
+        # Results cached by an earlier run would hide the Earth Engine calls
+        for cache in (server.plan_cache, server.map_cache, server.stats_cache):
+            cache.clear()
+
+    def test_satellite_image(self):
+        response = self.client.post('/satellite-image', json={
+            'location': LOCATION, 'start_date': '2022-01-01', 'end_date': '2022-06-30', 'filter': 'ndvi'
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json['map_id'].startswith('projects/fake-project/maps/'))
+        self.assertEqual(fake_ee.call_counts(), {'getInfo': 1, 'getMapId': 1})
+
+    def test_measure_area_verified_against_gee(self):
+        response = self.client.post('/measure-area', json={'geometry': POLYGON, 'verify': 'gee'})
+        self.assertEqual(response.status_code, 200)
+        self.assertAlmostEqual(response.json['difference'], 0, places=6)
+
+    def test_injected_errors_surface_as_500(self):
+        fake_ee.configure(error_rate=1.0)
+        response = self.client.post('/region-stats', json={
+            'location': {'lat': 10, 'lon': 20}, 'start_date': '2022-01-01', 'end_date': '2022-06-30'
+        })
+        self.assertEqual(response.status_code, 500)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Tests for host-wide Earth Engine admission control
+"""
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+import gee_admission
+from gee_admission import AdmissionController, AdmissionRejected
+
+
+class TestAdmissionController(unittest.TestCase):
+    """Test slot caps, priority order, bounded waits and sharing between processes"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'admission.sqlite3')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def controller(self, limit=4, **kwargs):
+        kwargs.setdefault('shares', {'interactive': 1, 'stats': 0.75, 'batch': 0.5})
+        return AdmissionController(self.path, limit, **kwargs)
+
+    def test_each_class_only_fills_its_share_of_the_slots(self):
+        controller = self.controller()
+        self.assertEqual(controller.caps, {'interactive': 4, 'stats': 3, 'batch': 2})
+        batch = [controller.acquire('batch'), controller.acquire('batch')]
+        with self.assertRaises(AdmissionRejected):
+            controller.acquire('batch', max_wait=0.05)
+        # Batch work leaves room for other calls, but does not start while they hold the slots
+        stats = controller.acquire('stats', max_wait=0)
+        controller.acquire('interactive', max_wait=0)
+        with self.assertRaises(AdmissionRejected):
+            controller.acquire('stats', max_wait=0.05)
+        controller.release(batch[0])
+        with self.assertRaises(AdmissionRejected):
+            controller.acquire('batch', max_wait=0.05)
+        controller.release(stats)
+        controller.acquire('stats', max_wait=0.05)
+        self.assertEqual(controller.snapshot()['active'], {'interactive': 1, 'stats': 1, 'batch': 1})
+
+    def test_interactive_calls_are_admitted_before_queued_batch_calls(self):
+        controller = self.controller(limit=1)
+        held = controller.acquire('interactive')
+        admitted = []
+
+        def wait(priority):
+            lease = controller.acquire(priority, max_wait=5)
+            admitted.append(priority)
+            controller.release(lease)
+
+        batch = threading.Thread(target=wait, args=('batch',))
+        batch.start()
+        while controller.snapshot()['waiting']['batch'] == 0:
+            time.sleep(0.005)
+        interactive = threading.Thread(target=wait, args=('interactive',))
+        interactive.start()
+        while controller.snapshot()['waiting']['interactive'] == 0:
+            time.sleep(0.005)
+
+        controller.release(held)
+        batch.join()
+        interactive.join()
+        self.assertEqual(admitted, ['interactive', 'batch'])
+
+    def test_full_queue_rejects_at_once(self):
+        controller = self.controller(limit=1, max_queue=1)
+        held = controller.acquire('stats')
+        waiting = threading.Thread(target=lambda: controller.release(controller.acquire('stats', max_wait=5)))
+        waiting.start()
+        while controller.snapshot()['waiting']['stats'] == 0:
+            time.sleep(0.005)
+
+        started = time.monotonic()
+        with self.assertRaisesRegex(AdmissionRejected, 'queue is full'):
+            controller.acquire('stats', max_wait=5)
+        self.assertLess(time.monotonic() - started, 1)
+        controller.release(held)
+        waiting.join()
+        self.assertEqual(controller.snapshot()['waiting'], {'interactive': 0, 'stats': 0, 'batch': 0})
+
+    def test_wait_is_bounded_and_leaves_no_queue_entry(self):
+        controller = self.controller(limit=1)
+        controller.acquire('interactive')
+        started = time.monotonic()
+        with self.assertRaisesRegex(AdmissionRejected, 'No Earth Engine slot'):
+            controller.acquire('interactive', max_wait=0.1)
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(controller.snapshot()['waiting']['interactive'], 0)
+
+    def test_slots_are_shared_by_controllers_on_the_same_file(self):
+        first, second = self.controller(limit=2), self.controller(limit=2)
+        first.acquire('interactive')
+        lease = second.acquire('interactive')
+        with self.assertRaises(AdmissionRejected):
+            first.acquire('interactive', max_wait=0.05)
+        second.release(lease)
+        first.acquire('interactive', max_wait=0.05)
+
+    def test_expired_leases_are_reclaimed(self):
+        holder, controller = self.controller(limit=1, lease_ttl=0.05), self.controller(limit=1)
+        holder.acquire('interactive')
+        # The holder neither renews nor releases its slot, as if its worker had died
+        with holder._held_lock:
+            holder._held.clear()
+        controller.acquire('interactive', max_wait=1)
+
+    def test_held_leases_are_renewed_until_released(self):
+        holder, controller = self.controller(limit=1, lease_ttl=0.1), self.controller(limit=1)
+        lease = holder.acquire('interactive')
+        time.sleep(0.3)
+        with self.assertRaises(AdmissionRejected):
+            controller.acquire('interactive', max_wait=0.05)
+        holder.release(lease)
+        controller.acquire('interactive', max_wait=0.05)
+
+    def test_waiting_calls_poll_without_the_write_lock(self):
+        controller = self.controller(limit=1)
+        held = controller.acquire('interactive')
+        transaction = controller._transaction
+        writes = []
+
+        def counted(work):
+            writes.append(threading.current_thread().name)
+            return transaction(work)
+
+        with mock.patch.object(controller, '_transaction', counted):
+            waiting = threading.Thread(target=lambda: controller.release(controller.acquire('interactive', max_wait=5)),
+                                       name='waiter')
+            waiting.start()
+            time.sleep(0.3)
+            # Only the enqueue write, however many times it polled
+            self.assertEqual(writes.count('waiter'), 1)
+            controller.release(held)
+            waiting.join()
+        # Then one write to take the slot and one to release it
+        self.assertEqual(writes.count('waiter'), 3)
+
+    def test_priority_follows_the_context(self):
+        self.assertEqual(gee_admission.current_priority(), 'interactive')
+        thread_priority = []
+
+        def worker():
+            gee_admission.set_priority('batch')
+            thread_priority.append(gee_admission.current_priority())
+
+        thread = threading.Thread(target=worker)
+        thread.start()
+        thread.join()
+        self.assertEqual(thread_priority, ['batch'])
+        self.assertEqual(gee_admission.current_priority(), 'interactive')
+        with self.assertRaises(ValueError):
+            gee_admission.set_priority('urgent')
+        self.assertEqual(gee_admission.parse_shares('batch=0.25')['batch'], 0.25)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Tests for background refresh of Earth Engine service account tokens
+"""
+import threading
+import unittest
+from datetime import datetime, timedelta, timezone
+
+from gee_credentials import TokenRefresher
+
+
+class FakeCredentials:
+    def __init__(self, lifetime):
+        self.lifetime = lifetime
+        self.token = None
+        self.expiry = None
+        self.refreshed = threading.Event()
+
+    def refresh(self, request):
+        self.token = 'token'
+        self.expiry = datetime.now(timezone.utc).replace(tzinfo=None) + self.lifetime
+        self.refreshed.set()
+
+
+class TestTokenRefresher(unittest.TestCase):
+    """Test when tokens are refreshed"""
+
+    def test_refreshes_missing_token(self):
+        credentials = FakeCredentials(timedelta(hours=1))
+        refresher = TokenRefresher(credentials, margin=300)
+        refresher.start()
+        try:
+            self.assertTrue(credentials.refreshed.wait(5))
+        finally:
+            refresher.stop()
+        self.assertEqual(credentials.token, 'token')
+
+    def test_waits_until_refresh_margin(self):
+        credentials = FakeCredentials(timedelta(hours=1))
+        credentials.refresh(None)
+        refresher = TokenRefresher(credentials, margin=300)
+        self.assertAlmostEqual(refresher.seconds_until_refresh(), 3300, delta=5)
+
+        credentials.expiry = datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(seconds=60)
+        self.assertEqual(refresher.seconds_until_refresh(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
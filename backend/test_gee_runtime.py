@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Tests for the bounded Earth Engine call executor
+"""
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+import gee_admission
+import gee_runtime
+from gee_runtime import BackgroundInitializer, GEEBusyError, GEEConfigurationError, GEETimeoutError, run_gee
+
+
+class TestRunGee(unittest.TestCase):
+    """Test results, timeouts and load shedding"""
+
+    def test_returns_result(self):
+        self.assertEqual(run_gee('test.add', lambda a, b: a + b, 2, 3), 5)
+
+    def test_propagates_errors(self):
+        def fail():
+            raise ValueError('boom')
+
+        with self.assertRaises(ValueError):
+            run_gee('test.fail', fail)
+
+    def test_times_out(self):
+        release = threading.Event()
+        try:
+            with self.assertRaises(GEETimeoutError):
+                run_gee('test.slow', release.wait, 5, timeout=0.05)
+        finally:
+            release.set()
+
+    @mock.patch.object(gee_admission, 'controller', None)
+    def test_rejects_when_saturated(self):
+        release = threading.Event()
+        capacity = gee_runtime.GEE_MAX_CONCURRENCY + gee_runtime.GEE_MAX_PENDING
+        for _ in range(capacity):
+            with self.assertRaises(GEETimeoutError):
+                run_gee('test.block', release.wait, 5, timeout=0)
+        try:
+            with self.assertRaises(GEEBusyError):
+                run_gee('test.extra', lambda: None)
+        finally:
+            release.set()
+
+    def test_holds_a_host_wide_slot_until_the_call_finishes(self):
+        with tempfile.TemporaryDirectory() as directory:
+            controller = gee_admission.AdmissionController(
+                os.path.join(directory, 'admission.sqlite3'), 1, max_wait=0.05
+            )
+            release = threading.Event()
+            with mock.patch.object(gee_admission, 'controller', controller):
+                try:
+                    with self.assertRaises(GEETimeoutError):
+                        run_gee('test.block', release.wait, 5, timeout=0)
+                    # The call outlived its timeout and still holds the only slot
+                    with self.assertRaises(GEEBusyError):
+                        run_gee('test.extra', lambda: None, priority='batch')
+                finally:
+                    release.set()
+                for _ in range(100):
+                    if controller.snapshot()['active']['interactive'] == 0:
+                        break
+                    time.sleep(0.01)
+                self.assertEqual(run_gee('test.after', lambda: 1), 1)
+
+
+class TestBackgroundInitializer(unittest.TestCase):
+    """Test retries and readiness gating"""
+
+    def test_retries_until_success(self):
+        results = iter([False, False, True])
+        initializer = BackgroundInitializer(lambda: next(results), retry_delay=0.01)
+        initializer.start()
+        self.assertTrue(initializer.ready.wait(5))
+        self.assertTrue(initializer.wait(5))
+        self.assertEqual(initializer.attempts, 3)
+
+    def test_wait_times_out_while_initializing(self):
+        release = threading.Event()
+        initializer = BackgroundInitializer(lambda: release.wait(5))
+        try:
+            self.assertFalse(initializer.wait(0.05))
+        finally:
+            release.set()
+        self.assertTrue(initializer.wait(5))
+
+    def test_wait_fails_at_once_after_a_failed_attempt(self):
+        initializer = BackgroundInitializer(lambda: False, retry_delay=60)
+        self.assertFalse(initializer.wait(5))
+        # The retry is still pending, but requests no longer wait for it
+        started = time.perf_counter()
+        self.assertFalse(initializer.wait(5))
+        self.assertLess(time.perf_counter() - started, 1)
+        self.assertEqual(initializer.attempts, 1)
+
+    def test_configuration_errors_stop_the_retries(self):
+        calls = []
+
+        def init():
+            calls.append(1)
+            raise GEEConfigurationError('GEE_PROJECT_ID is not set')
+
+        initializer = BackgroundInitializer(init, retry_delay=0.01)
+        self.assertFalse(initializer.wait(5))
+        time.sleep(0.1)
+        self.assertEqual((len(calls), initializer.attempts), (1, 1))
+        self.assertEqual(initializer.failure, 'GEE_PROJECT_ID is not set')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Tests for the persistent SQLite geocoding cache
+"""
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+from geocode_cache import GeocodeCache, normalize_query
+
+PARIS = {'lat': 48.8566, 'lon': 2.3522, 'display_name': 'Paris, France'}
+
+
+class TestGeocodeCache(unittest.TestCase):
+    """Test persistence, expiry, eviction and stats"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'geocode.sqlite3')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_normalized_queries_share_entries(self):
+        self.assertEqual(normalize_query('  Paris   FRANCE '), 'paris france')
+        cache = GeocodeCache(self.path)
+        cache.set('Paris, France', PARIS)
+        self.assertEqual(cache.get('paris,  france'), (True, PARIS))
+
+    def test_survives_new_instance(self):
+        GeocodeCache(self.path).set('Paris', PARIS)
+        self.assertEqual(GeocodeCache(self.path).get('Paris'), (True, PARIS))
+
+    def test_negative_caching(self):
+        cache = GeocodeCache(self.path, negative_ttl=60)
+        cache.set('Atlantis', None)
+        self.assertEqual(cache.get('Atlantis'), (True, None))
+        self.assertEqual(cache.get('Lemuria'), (False, None))
+
+    def test_entries_expire(self):
+        cache = GeocodeCache(self.path, ttl=10)
+        now = time.time()
+        with patch('geocode_cache.time.time', return_value=now):
+            cache.set('Paris', PARIS)
+        with patch('geocode_cache.time.time', return_value=now + 11):
+            self.assertEqual(cache.get('Paris'), (False, None))
+
+    def test_lru_eviction(self):
+        cache = GeocodeCache(self.path, max_entries=2, access_interval=60)
+        now = time.time()
+        for offset, name in enumerate(['a', 'b']):
+            with patch('geocode_cache.time.time', return_value=now + offset):
+                cache.set(name, PARIS)
+        with patch('geocode_cache.time.time', return_value=now + 30):
+            cache.get('b')  # Too recent to move 'b'
+        with patch('geocode_cache.time.time', return_value=now + 61):
+            cache.get('a')  # 'b' is now least recently used
+        with patch('geocode_cache.time.time', return_value=now + 62):
+            cache.set('c', PARIS)
+
+        self.assertEqual(cache.get('b'), (False, None))
+        self.assertEqual(cache.get('a'), (True, PARIS))
+        self.assertEqual(cache.stats()['entries'], 2)
+
+    def test_recent_hits_do_not_write(self):
+        cache = GeocodeCache(self.path, access_interval=60)
+        cache.set('Paris', PARIS)
+        statements = []
+        cache._db.get().set_trace_callback(statements.append)
+        for _ in range(3):
+            cache.get('Paris')
+        cache.get('Lemuria')
+        self.assertEqual([statement for statement in statements if not statement.startswith('SELECT')], [])
+
+    def test_stats(self):
+        cache = GeocodeCache(self.path)
+        cache.get('Paris')
+        cache.set('Paris', PARIS)
+        cache.get('Paris')
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+        self.assertEqual(stats['hit_ratio'], 0.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Tests for the local WGS84 measurement engine
+"""
+import unittest
+
+import geodesy
+
+# 1 x 1 degree cell on the equator, reference value from GeographicLib
+EQUATOR_CELL = [[0, 0], [1, 0], [1, 1], [0, 1], [0, 0]]
+EQUATOR_CELL_AREA = 12308778361.47
+# Geodesic triangle around the north pole, reference value from GeographicLib
+POLAR_TRIANGLE = [[0, 80], [120, 80], [240, 80]]
+POLAR_TRIANGLE_AREA = 1634782820860.69
+
+
+class TestGeometryArea(unittest.TestCase):
+    """Test polygon area calculation"""
+
+    def test_polygon_area(self):
+        areas = geodesy.geometry_area({'type': 'Polygon', 'coordinates': [EQUATOR_CELL]})
+        self.assertAlmostEqual(areas[0] / EQUATOR_CELL_AREA, 1.0, places=6)
+
+    def test_ring_orientation_and_closure_are_ignored(self):
+        reversed_open = list(reversed(EQUATOR_CELL))[:-1]
+        areas = geodesy.ring_areas([EQUATOR_CELL, reversed_open])
+        self.assertAlmostEqual(areas[0], areas[1], places=3)
+
+    def test_holes_are_subtracted(self):
+        hole = [[0.25, 0.25], [0.75, 0.25], [0.75, 0.75], [0.25, 0.75], [0.25, 0.25]]
+        hole_area = geodesy.ring_areas([hole])[0]
+        areas = geodesy.geometry_area({'type': 'Polygon', 'coordinates': [EQUATOR_CELL, hole]})
+        self.assertAlmostEqual(areas[0], geodesy.ring_areas([EQUATOR_CELL])[0] - hole_area, places=3)
+
+    def test_multipolygon_parts(self):
+        shifted = [[lon + 10, lat] for lon, lat in EQUATOR_CELL]
+        areas = geodesy.geometry_area({'type': 'MultiPolygon', 'coordinates': [[EQUATOR_CELL], [shifted]]})
+        self.assertEqual(len(areas), 2)
+        self.assertAlmostEqual(areas[0], areas[1], places=3)
+
+    def test_antimeridian_crossing(self):
+        ring = [[179.5, 0], [-179.5, 0], [-179.5, 1], [179.5, 1], [179.5, 0]]
+        areas = geodesy.geometry_area({'type': 'Polygon', 'coordinates': [ring]})
+        self.assertAlmostEqual(areas[0] / EQUATOR_CELL_AREA, 1.0, places=6)
+
+    def test_rings_around_a_pole(self):
+        south = [[lon, -lat] for lon, lat in POLAR_TRIANGLE]
+        areas = geodesy.ring_areas([POLAR_TRIANGLE, list(reversed(POLAR_TRIANGLE)), south])
+        for area in areas:
+            self.assertAlmostEqual(area / POLAR_TRIANGLE_AREA, 1.0, places=3)
+
+    def test_altitudes_are_ignored(self):
+        with_altitude = [[lon, lat, 100.0 * i] for i, (lon, lat) in enumerate(EQUATOR_CELL)]
+        areas = geodesy.geometry_area({'type': 'Polygon', 'coordinates': [with_altitude]})
+        self.assertAlmostEqual(areas[0] / EQUATOR_CELL_AREA, 1.0, places=6)
+
+    def test_malformed_positions_are_rejected(self):
+        for ring in ([0, 0, 1, 0, 1, 1], [[0], [1], [2]], [[0, 0], [1, 0, 5], [1, 1]]):
+            with self.assertRaises(ValueError):
+                geodesy.geometry_area({'type': 'Polygon', 'coordinates': [ring]})
+
+    def test_degenerate_ring_has_no_area(self):
+        self.assertEqual(geodesy.ring_areas([[[0, 0], [1, 1]]])[0], 0.0)
+
+    def test_invalid_geometry_type(self):
+        with self.assertRaises(ValueError):
+            geodesy.geometry_area({'type': 'Point', 'coordinates': [0, 0]})
+
+
+class TestGeometryLength(unittest.TestCase):
+    """Test line length calculation"""
+
+    def test_linestring_length(self):
+        # Paris to London, reference value from GeographicLib
+        lengths = geodesy.geometry_length({'type': 'LineString', 'coordinates': [[2.35, 48.85], [-0.12, 51.5]]})
+        self.assertAlmostEqual(lengths[0], 343492.8154, places=3)
+
+    def test_multilinestring_per_part(self):
+        first = [[0, 0], [1, 0], [1, 1]]
+        second = [[10, 0], [11, 0]]
+        lengths = geodesy.geometry_length({'type': 'MultiLineString', 'coordinates': [first, second]})
+        self.assertEqual(len(lengths), 2)
+        self.assertAlmostEqual(lengths[0], 221893.8794, places=3)
+        # The gap between the two parts is not counted
+        self.assertAlmostEqual(lengths[1], geodesy.line_lengths([[[0, 0], [1, 0]]])[0], places=3)
+
+    def test_antimeridian_crossing(self):
+        lengths = geodesy.line_lengths([[[179.9, 10], [-179.9, 10]]])
+        self.assertAlmostEqual(lengths[0], 21927.8725, places=3)
+
+    def test_nearly_antipodal_points(self):
+        # Pairs Vincenty's iteration cannot solve, reference values from GeographicLib
+        lines = [
+            [[0, 0], [180, 0]],
+            [[0, 0], [179.9, 0]],
+            [[0, 0], [179.7, 0]],
+            [[0, 0.5], [179.5, -0.5]],
+            [[10, 30], [-170.2, -29.9]]
+        ]
+        expected = [20003931.4586, 20003008.4215, 19995624.8900, 19980861.9089, 19989832.8276]
+        lengths = geodesy.line_lengths(lines)
+        for length, reference in zip(lengths, expected):
+            self.assertAlmostEqual(length, reference, places=3)
+
+    def test_altitudes_are_ignored(self):
+        flat = geodesy.line_lengths([[[0, 0], [1, 1], [2, 0]]])[0]
+        lengths = geodesy.line_lengths([[[0, 0, 10], [1, 1, 2000], [2, 0, 0]]])
+        self.assertAlmostEqual(lengths[0], flat, places=6)
+
+    def test_malformed_positions_are_rejected(self):
+        with self.assertRaises(ValueError):
+            geodesy.geometry_length({'type': 'LineString', 'coordinates': [0, 0, 1, 1]})
+
+    def test_single_point_has_no_length(self):
+        self.assertEqual(geodesy.line_lengths([[[0, 0]]])[0], 0.0)
+
+    def test_invalid_geometry_type(self):
+        with self.assertRaises(ValueError):
+            geodesy.geometry_length({'type': 'Polygon', 'coordinates': []})
+
+
+if __name__ == '__main__':
+    unittest.main()
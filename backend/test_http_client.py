@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Tests for the pooled, rate-limited outbound HTTP client
+"""
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+from http_client import HTTPClient, RateLimitExceeded, TokenBucket
+
+
+def make_response(status_code, headers=None):
+    response = MagicMock()
+    response.status_code = status_code
+    response.headers = headers or {}
+    return response
+
+
+class TestTokenBucket(unittest.TestCase):
+    """Test the cross-process token bucket"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'ratelimit.sqlite3')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_reservations_are_spaced_by_rate(self):
+        bucket = TokenBucket('test', rate=1.0, capacity=1, path=self.path)
+        now = time.time()
+        with patch('http_client.time.time', return_value=now):
+            self.assertEqual(bucket.reserve(max_wait=10), 0.0)
+            self.assertAlmostEqual(bucket.reserve(max_wait=10), 1.0)
+            self.assertAlmostEqual(bucket.reserve(max_wait=10), 2.0)
+
+    def test_buckets_share_state_through_the_file(self):
+        now = time.time()
+        with patch('http_client.time.time', return_value=now):
+            TokenBucket('test', rate=1.0, path=self.path).reserve(max_wait=10)
+            self.assertAlmostEqual(TokenBucket('test', rate=1.0, path=self.path).reserve(max_wait=10), 1.0)
+
+    def test_rejects_waits_beyond_limit(self):
+        bucket = TokenBucket('test', rate=0.1, capacity=1, path=self.path)
+        bucket.reserve(max_wait=1)
+        with self.assertRaises(RateLimitExceeded) as raised:
+            bucket.reserve(max_wait=1)
+        self.assertAlmostEqual(raised.exception.retry_after, 10.0, delta=0.5)
+
+
+class TestHTTPClient(unittest.TestCase):
+    """Test retries and single-flight coalescing"""
+
+    @patch('http_client.time.sleep')
+    def test_retries_on_429_honouring_retry_after(self, sleep):
+        client = HTTPClient('test', max_retries=2)
+        client.session.get = MagicMock(side_effect=[
+            make_response(429, {'Retry-After': '2'}),
+            make_response(503),
+            make_response(200)
+        ])
+
+        response = client.get('https://example.org/search', params={'q': 'paris'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(client.session.get.call_count, 3)
+        self.assertEqual(sleep.call_args_list[0].args[0], 2.0)
+
+    @patch('http_client.time.sleep')
+    def test_gives_up_after_max_retries(self, sleep):
+        client = HTTPClient('test', max_retries=1)
+        client.session.get = MagicMock(return_value=make_response(500))
+
+        self.assertEqual(client.get('https://example.org').status_code, 500)
+        self.assertEqual(client.session.get.call_count, 2)
+
+    @patch('http_client.time.sleep')
+    def test_persistent_throttling_raises_with_retry_after(self, sleep):
+        client = HTTPClient('test', max_retries=1)
+        client.session.get = MagicMock(return_value=make_response(429, {'Retry-After': '3'}))
+
+        with self.assertRaises(RateLimitExceeded) as raised:
+            client.get('https://example.org')
+        self.assertEqual(raised.exception.retry_after, 3.0)
+        self.assertEqual(client.session.get.call_count, 2)
+
+    def test_identical_concurrent_requests_share_one_call(self):
+        client = HTTPClient('test')
+        release = threading.Event()
+
+        def slow_get(*args, **kwargs):
+            release.wait(5)
+            return make_response(200)
+
+        client.session.get = MagicMock(side_effect=slow_get)
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(client.get('https://example.org', {'q': 'paris'})))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.1)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(client.session.get.call_count, 1)
+        self.assertEqual(len(results), 5)
+        self.assertTrue(all(result is results[0] for result in results))
+
+
+if __name__ == '__main__':
+    unittest.main()
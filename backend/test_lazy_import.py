@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+"""
+Tests for deferred module imports
+"""
+import sys
+import unittest
+
+from lazy_import import LazyModule
+
+
+class TestLazyModule(unittest.TestCase):
+    """Test that modules load on first use only"""
+
+    def test_imports_on_first_attribute_access(self):
+        sys.modules.pop('colorsys', None)
+        module = LazyModule('colorsys')
+        self.assertNotIn('colorsys', sys.modules)
+        self.assertEqual(module.rgb_to_hsv(1.0, 0.0, 0.0), (0.0, 1.0, 1.0))
+        self.assertIn('colorsys', sys.modules)
+
+    def test_missing_attribute(self):
+        with self.assertRaises(AttributeError):
+            LazyModule('colorsys').does_not_exist
+
+
+if __name__ == '__main__':
+    unittest.main()
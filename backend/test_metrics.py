@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Tests for the Prometheus instrumentation of GEE calls and caches
+"""
+import unittest
+
+import metrics
+from cache import TTLCache
+from gee_runtime import run_gee
+
+
+@unittest.skipUnless(metrics.enabled(), 'prometheus_client is not installed')
+class TestMetrics(unittest.TestCase):
+    """Test that calls and lookups are counted"""
+
+    def sample(self, name, labels):
+        from prometheus_client import REGISTRY
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    def test_gee_calls_are_counted_per_outcome(self):
+        labels = {'operation': 'test.metrics', 'outcome': 'error'}
+        before = self.sample('gee_calls_total', labels)
+
+        def fail():
+            raise ValueError('boom')
+
+        with self.assertRaises(ValueError):
+            run_gee('test.metrics', fail)
+        self.assertEqual(self.sample('gee_calls_total', labels), before + 1)
+        self.assertGreater(self.sample('gee_call_duration_seconds_count', {'operation': 'test.metrics'}), 0)
+
+    def test_cache_lookups_are_counted(self):
+        cache = TTLCache('test_metrics', ttl=60)
+        cache.set('a', 1)
+        cache.get('a')
+        cache.get('b')
+        self.assertEqual(self.sample('cache_lookups_total', {'cache': 'test_metrics', 'result': 'hit'}), 1)
+        self.assertEqual(self.sample('cache_lookups_total', {'cache': 'test_metrics', 'result': 'miss'}), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Performance regression gate: compares Earth Engine round trips, p95 latency,
+import time and peak RSS against benchmarks/baseline.json.
+
+Round trip counts are deterministic and always checked. The timing and memory
+checks can be skipped on noisy shared runners with PERF_GATE_TIMINGS=0.
+Record a new baseline with python benchmarks/regression.py --update.
+"""
+import os
+import unittest
+
+from benchmarks import regression
+
+CHECK_TIMINGS = os.environ.get('PERF_GATE_TIMINGS', '1') != '0'
+
+
+class TestPerformanceRegression(unittest.TestCase):
+    """Test current numbers against the committed baseline"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.baseline = regression.load_baseline()
+        cls.results = regression.measure() if CHECK_TIMINGS else regression.measure_server()
+
+    def failures(self, keys):
+        baseline = {key: self.baseline[key] for key in keys}
+        baseline['tolerance'] = self.baseline['tolerance']
+        # Checks that are not part of this test are compared with themselves
+        for key in ('gee_calls_per_request', 'latency_p95_ms'):
+            baseline.setdefault(key, {})
+        for key in ('import_ms', 'peak_rss_mb'):
+            baseline.setdefault(key, float('inf'))
+        results = dict(self.results)
+        results.setdefault('import_ms', 0)
+        return regression.compare(results, baseline)
+
+    def test_gee_round_trips(self):
+        self.assertEqual(self.failures(['gee_calls_per_request']), [])
+
+    @unittest.skipUnless(CHECK_TIMINGS, 'PERF_GATE_TIMINGS=0')
+    def test_latency(self):
+        self.assertEqual(self.failures(['latency_p95_ms']), [])
+
+    @unittest.skipUnless(CHECK_TIMINGS, 'PERF_GATE_TIMINGS=0')
+    def test_import_time_and_memory(self):
+        self.assertEqual(self.failures(['import_ms', 'peak_rss_mb']), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Tests for the local scene availability index
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+from scene_index import SceneIndex, scene_from_row
+
+LANDSAT = 'LANDSAT/LC08/C02/T1_L2'
+
+
+class TestSceneIndex(unittest.TestCase):
+    """Test coverage-aware counts over the R-tree"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.index = SceneIndex(os.path.join(self.directory, 'scenes.sqlite3'))
+        self.index.add_scenes([{
+            'collection': LANDSAT,
+            'scene_id': 'LC08_196030_20230615',
+            'acquired': '2023-06-15',
+            'cloud_cover': 12.5,
+            'bounds': (2.0, 48.0, 3.0, 49.0)
+        }])
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_unknown_without_coverage(self):
+        self.assertIsNone(self.index.count(LANDSAT, '2023-06-01', '2023-07-01', (2.3, 48.8, 2.4, 48.9)))
+
+    def test_counts_within_coverage(self):
+        self.index.add_coverage(LANDSAT, '2023-01-01', '2024-01-01')
+        self.assertEqual(self.index.count(LANDSAT, '2023-06-01', '2023-07-01', (2.3, 48.8, 2.4, 48.9)), 1)
+        # Open ocean and a window without acquisitions
+        self.assertEqual(self.index.count(LANDSAT, '2023-06-01', '2023-07-01', (-30.1, 40.0, -29.9, 40.2)), 0)
+        self.assertEqual(self.index.count(LANDSAT, '2023-06-16', '2023-07-01', (2.3, 48.8, 2.4, 48.9)), 0)
+
+    def test_coverage_must_contain_window_and_area(self):
+        self.index.add_coverage(LANDSAT, '2023-01-01', '2024-01-01', (0.0, 45.0, 5.0, 50.0))
+        self.assertIsNone(self.index.count(LANDSAT, '2022-12-01', '2023-02-01', (2.3, 48.8, 2.4, 48.9)))
+        self.assertIsNone(self.index.count(LANDSAT, '2023-06-01', '2023-07-01', (10.0, 48.8, 10.1, 48.9)))
+
+    def test_adjacent_coverage_periods_are_merged(self):
+        # An import followed by a refresh
+        self.index.add_coverage(LANDSAT, '2023-01-01', '2023-06-10')
+        self.index.add_coverage(LANDSAT, '2023-06-10', '2023-09-01')
+        self.assertEqual(self.index.count(LANDSAT, '2023-06-01', '2023-07-01', (2.3, 48.8, 2.4, 48.9)), 1)
+        self.assertIsNone(self.index.count(LANDSAT, '2023-06-01', '2023-10-01', (2.3, 48.8, 2.4, 48.9)))
+
+        self.index.add_coverage(LANDSAT, '2023-09-15', '2024-01-01')
+        self.assertIsNone(self.index.count(LANDSAT, '2023-08-01', '2023-10-01', (2.3, 48.8, 2.4, 48.9)))
+
+    def test_cloud_cover_limit(self):
+        self.index.add_coverage(LANDSAT, '2023-01-01', '2024-01-01')
+        self.assertEqual(self.index.count(LANDSAT, '2023-06-01', '2023-07-01', (2.3, 48.8, 2.4, 48.9),
+                                          max_cloud_cover=20), 1)
+        self.assertEqual(self.index.count(LANDSAT, '2023-06-01', '2023-07-01', (2.3, 48.8, 2.4, 48.9),
+                                          max_cloud_cover=10), 0)
+
+    def test_reimport_updates_scene(self):
+        self.index.add_scenes([{
+            'collection': LANDSAT,
+            'scene_id': 'LC08_196030_20230615',
+            'acquired': '2023-06-15',
+            'bounds': (20.0, 48.0, 21.0, 49.0)
+        }])
+        self.index.add_coverage(LANDSAT, '2023-01-01', '2024-01-01')
+        self.assertEqual(self.index.stats()[LANDSAT]['scenes'], 1)
+        self.assertEqual(self.index.count(LANDSAT, '2023-06-01', '2023-07-01', (2.3, 48.8, 2.4, 48.9)), 0)
+
+    def test_scene_from_export_row(self):
+        scene = scene_from_row({
+            'system:index': 'LC08_196030_20230615',
+            'system:time_start': '1686825600000',
+            'CLOUD_COVER': '3.2',
+            '.geo': '{"type":"Polygon","coordinates":[[[2,48],[3,48.2],[2.8,49],[1.9,48.9],[2,48]]]}'
+        }, LANDSAT)
+        self.assertEqual(scene['acquired'], '2023-06-15')
+        self.assertEqual(scene['cloud_cover'], 3.2)
+        self.assertEqual(scene['bounds'], (1.9, 48, 3, 49))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,483 @@
+#!/usr/bin/env python3
+"""
+Tests for the Earth Engine routes of server.py, run against the offline fake backend
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+# server.py picks its Earth Engine backend when imported
+os.environ['GEE_BACKEND'] = 'fake'
+
+import fake_ee
+import server
+import tracing
+from http_client import RateLimitExceeded
+from scene_index import SceneIndex
+
+LANDSAT = server.LANDSAT_COLLECTION
+SENTINEL = server.SENTINEL_COLLECTION
+
+
+class ServerTestCase(unittest.TestCase):
+    """Fake backend reset to instant, error-free calls and empty caches"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.client = server.app.test_client()
+        cls.client.get('/health')
+        server.gee_ready()
+
+    def setUp(self):
+        fake_ee.configure(latency=0, jitter=0, error_rate=0, empty_collections=set(), seed=0)
+        fake_ee.reset_counts()
+        # Results cached by an earlier test would hide the Earth Engine calls
+        for cache in (server.plan_cache, server.map_cache, server.stats_cache, server.change_cache,
+                      server.timeseries_cache):
+            cache.clear()
+        patcher = mock.patch.object(server, 'scene_index', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class TestCollectionFallback(ServerTestCase):
+    """Test that every stage of the fallback cascade is resolved in one round trip"""
+
+    def select(self, start_date, end_date, empty=()):
+        fake_ee.configure(empty_collections=set(empty))
+        geometry = server.build_region(40.0, 0.0)
+        plan = server.select_collection(geometry, server.region_bounds(40.0, 0.0), start_date, end_date)
+        self.assertEqual(fake_ee.call_counts(), {'getInfo': 1, 'getMapId': 0})
+        return plan
+
+    def test_landsat_broadened_window(self):
+        plan = self.select('2023-01-01', '2023-06-30')
+        self.assertEqual((plan['stage'], plan['collection']), ('landsat_30d', LANDSAT))
+        self.assertEqual((plan['start'], plan['end']), ('2023-03-02', '2023-05-01'))
+        self.assertGreater(plan['image_count'], 0)
+
+    def test_landsat_broader_window(self):
+        # Landsat 8 only reaches the +/- 90 day window, which ends after its first acquisition
+        plan = self.select('2013-02-01', '2013-02-20')
+        self.assertEqual((plan['stage'], plan['collection']), ('landsat_90d', LANDSAT))
+        self.assertGreater(plan['image_count'], 0)
+
+    def test_sentinel_original_window(self):
+        plan = self.select('2023-01-01', '2023-06-30', empty=(LANDSAT,))
+        self.assertEqual((plan['stage'], plan['collection']), ('sentinel_original', SENTINEL))
+        self.assertEqual((plan['start'], plan['end']), ('2023-01-01', '2023-06-30'))
+
+    def test_sentinel_broadened_window(self):
+        # Sentinel-2 only reaches the +/- 30 day window, which ends after its first acquisition
+        plan = self.select('2017-03-01', '2017-03-20', empty=(LANDSAT,))
+        self.assertEqual((plan['stage'], plan['collection']), ('sentinel_30d', SENTINEL))
+        self.assertGreater(plan['image_count'], 0)
+
+    def test_no_images(self):
+        plan = self.select('2023-01-01', '2023-06-30', empty=(LANDSAT, SENTINEL))
+        self.assertEqual(plan['image_count'], 0)
+
+
+class TestSceneIndexPlans(ServerTestCase):
+    """Test plans answered by the local scene index"""
+
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        index = SceneIndex(os.path.join(self.directory.name, 'scenes.sqlite3'))
+        # The footprint box reaches the region around (40, 0), the footprint itself may not
+        index.add_scenes([{
+            'collection': LANDSAT,
+            'scene_id': 'LC08_199032_20230401',
+            'acquired': '2023-04-01',
+            'cloud_cover': 60.0,
+            'bounds': (0.05, 39.0, 1.5, 40.05)
+        }])
+        index.add_coverage(LANDSAT, '2023-01-01', '2023-04-15')
+        index.add_coverage(LANDSAT, '2023-04-15', '2024-01-01')
+        patcher = mock.patch.object(server, 'scene_index', index)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.request = {'location': {'lat': 40.0, 'lon': 0.0}, 'start_date': '2023-01-01', 'end_date': '2023-06-30'}
+
+    def test_index_answers_without_a_count_round_trip(self):
+        response = self.client.post('/satellite-image', json=self.request)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['collection'], LANDSAT)
+        self.assertEqual(fake_ee.call_counts(), {'getInfo': 0, 'getMapId': 1})
+
+    def test_falls_back_to_live_counts_when_the_indexed_collection_is_empty(self):
+        fake_ee.configure(empty_collections={LANDSAT})
+        response = self.client.post('/satellite-image', json=self.request)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['collection'], SENTINEL)
+        # The failed map ID, the live count and the map ID of the new plan
+        self.assertEqual(fake_ee.call_counts(), {'getInfo': 1, 'getMapId': 2})
+
+        # The corrected plan replaced the cached one
+        fake_ee.reset_counts()
+        response = self.client.post('/region-stats', json=self.request)
+        self.assertEqual(response.json['collection'], SENTINEL)
+        self.assertEqual(fake_ee.call_counts(), {'getInfo': 1, 'getMapId': 0})
+
+    def test_cloud_cover_limit_applies_to_index_and_gee(self):
+        geometry = server.build_region(40.0, 0.0)
+        with mock.patch.object(server, 'MAX_CLOUD_COVER', 50):
+            plan = server.select_collection(geometry, server.region_bounds(40.0, 0.0), '2023-01-01', '2023-06-30')
+        # The indexed Landsat scene is too cloudy, so Sentinel-2 is counted in Earth Engine
+        self.assertEqual((plan['stage'], plan['source']), ('sentinel_original', 'gee'))
+        all_scenes = server.image_collection(SENTINEL, '2023-01-01', '2023-06-30', geometry).size().getInfo()
+        self.assertTrue(0 < plan['image_count'] < all_scenes)
+
+
+class TestSentinelBands(ServerTestCase):
+    """Test that Sentinel-2 composites use B8 rather than the Landsat NIR band"""
+
+    def direct_index(self, first, second, name):
+        geometry = server.build_region(40.0, 0.0)
+        image = fake_ee.ImageCollection(SENTINEL).filterDate('2023-01-01', '2023-06-30') \
+            .filterBounds(geometry).median().multiply(0.0001)
+        a, b = image.select(first), image.select(second)
+        values = a.subtract(b).divide(a.add(b)).rename([name]).reduceRegion(
+            reducer=server.region_stats_reducer(), geometry=geometry, scale=server.REGION_STATS_SCALE
+        ).getInfo()
+        return values[f'{name}_mean']
+
+    def region_stats(self, index):
+        response = self.client.post('/region-stats', json={
+            'location': {'lat': 40.0, 'lon': 0.0}, 'start_date': '2023-01-01', 'end_date': '2023-06-30', 'index': index
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['collection'], SENTINEL)
+        return response.json['stats']['mean']
+
+    def test_ndvi_uses_b8_and_b4(self):
+        fake_ee.configure(empty_collections={LANDSAT})
+        self.assertAlmostEqual(self.region_stats('ndvi'), self.direct_index('B8', 'B4', 'ndvi'))
+
+    def test_ndwi_uses_b3_and_b8(self):
+        fake_ee.configure(empty_collections={LANDSAT})
+        self.assertAlmostEqual(self.region_stats('ndwi'), self.direct_index('B3', 'B8', 'ndwi'))
+
+    def test_visualization_bands(self):
+        filtered = fake_ee.ImageCollection(SENTINEL)
+        self.assertEqual(server.build_visualization(filtered, SENTINEL, 'false_color')[1]['bands'], ['B8', 'B4', 'B3'])
+        self.assertEqual(server.build_visualization(filtered, SENTINEL, 'rgb')[1]['bands'], ['B4', 'B3', 'B2'])
+        self.assertEqual(server.build_visualization(filtered, LANDSAT, 'false_color')[1]['bands'],
+                         ['SR_B5', 'SR_B4', 'SR_B3'])
+
+
+class TestChangeDetection(ServerTestCase):
+    """Test round trips, missing imagery and validation of /change-detection"""
+
+    def detect(self, **kwargs):
+        request = dict({
+            'location': {'lat': 40.0, 'lon': 0.0},
+            'before': {'start_date': '2022-01-01', 'end_date': '2022-06-30'},
+            'after': {'start_date': '2023-01-01', 'end_date': '2023-06-30'}
+        }, **kwargs)
+        return self.client.post('/change-detection', json=request)
+
+    def test_two_plans_one_reduction_and_one_map_id(self):
+        response = self.detect()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json['before']['collection'], response.json['after']['collection']), (LANDSAT, LANDSAT))
+        self.assertFalse(response.json['mixed_sensors'])
+        self.assertIsNotNone(response.json['stats']['mean_difference'])
+        self.assertEqual(fake_ee.call_counts(), {'getInfo': 3, 'getMapId': 1})
+
+    def test_mixed_sensors_are_reported(self):
+        select_collection = server.select_collection
+
+        def select(geometry, bounds, start_date, end_date, use_index=True):
+            # Only the after window falls back to Sentinel-2
+            fake_ee.configure(empty_collections={LANDSAT} if start_date == '2023-01-01' else set())
+            try:
+                return select_collection(geometry, bounds, start_date, end_date, use_index)
+            finally:
+                fake_ee.configure(empty_collections=set())
+
+        with mock.patch.object(server, 'select_collection', select):
+            response = self.detect()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json['before']['collection'], response.json['after']['collection']), (LANDSAT, SENTINEL))
+        self.assertTrue(response.json['mixed_sensors'])
+
+    def test_no_imagery(self):
+        fake_ee.configure(empty_collections={LANDSAT, SENTINEL})
+        response = self.detect()
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(fake_ee.call_counts(), {'getInfo': 2, 'getMapId': 0})
+
+    def test_rejects_invalid_thresholds(self):
+        for threshold in (0, 2, 'abc'):
+            self.assertEqual(self.detect(threshold=threshold).status_code, 400)
+        self.assertEqual(fake_ee.call_counts(), {'getInfo': 0, 'getMapId': 0})
+
+    def test_rejects_reversed_windows(self):
+        response = self.detect(after={'start_date': '2023-06-30', 'end_date': '2023-01-01'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json['error'], 'Start date must be before end date')
+
+
+class TestTimeseriesWindows(unittest.TestCase):
+    """Test the month windows and chunks of a time series"""
+
+    def test_months_are_clipped_to_the_range(self):
+        self.assertEqual(list(server.month_windows('2023-01-15', '2023-03-10')), [
+            ('2023-01-15', '2023-02-01'), ('2023-02-01', '2023-03-01'), ('2023-03-01', '2023-03-10')
+        ])
+
+    def test_end_date_is_exclusive(self):
+        self.assertEqual(list(server.month_windows('2023-12-01', '2024-01-01')), [('2023-12-01', '2024-01-01')])
+
+    def test_chunks_hold_at_most_size_months(self):
+        chunks = list(server.timeseries_chunks('2023-01-01', '2024-03-01', size=6))
+        self.assertEqual([len(chunk) for chunk in chunks], [6, 6, 2])
+        self.assertEqual((chunks[0][0][0], chunks[-1][-1][1]), ('2023-01-01', '2024-03-01'))
+        # Consecutive chunks share their boundary date
+        self.assertEqual(chunks[0][-1][1], chunks[1][0][0])
+
+
+class TestTimeseries(ServerTestCase):
+    """Test the framing, chunk errors and round trips of /timeseries"""
+
+    def series(self, start_date='2022-01-01', end_date='2024-01-01', headers=None, **kwargs):
+        return self.client.post('/timeseries', headers=headers, json=dict({
+            'location': {'lat': 40.0, 'lon': 0.0}, 'start_date': start_date, 'end_date': end_date
+        }, **kwargs))
+
+    def test_ndjson_points_in_date_order(self):
+        response = self.series()
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        points = ndjson(response)
+        self.assertEqual([point['date'] for point in points], [start for start, _ in server.month_windows('2022-01-01', '2024-01-01')])
+        self.assertTrue(all(point['image_count'] > 0 and point['mean'] is not None for point in points))
+
+    def test_one_round_trip_per_chunk(self):
+        self.series().get_data()
+        self.assertEqual(fake_ee.call_counts(), {'getInfo': 2, 'getMapId': 0})
+
+    def test_server_sent_events(self):
+        response = self.series(end_date='2022-03-01', headers={'Accept': 'text/event-stream'})
+        self.assertEqual(response.mimetype, 'text/event-stream')
+        events = response.get_data(as_text=True).split('\n\n')
+        self.assertEqual(events[-1], '')
+        self.assertTrue(all(event.startswith('data: ') for event in events[:-1]))
+        self.assertEqual([json.loads(event[len('data: '):])['date'] for event in events[:-1]], ['2022-01-01', '2022-02-01'])
+
+    def test_failed_chunks_get_an_error_line(self):
+        fake_ee.configure(error_rate=1)
+        lines = ndjson(self.series())
+        self.assertEqual([(line['start'], line['end'], line['status']) for line in lines], [
+            ('2022-01-01', '2023-01-01', 500), ('2023-01-01', '2024-01-01', 500)
+        ])
+        self.assertTrue(all(line['error'] for line in lines))
+
+    def test_sentinel_points_use_b8(self):
+        points = ndjson(self.series(start_date='2023-03-01', end_date='2023-04-01', collection='sentinel'))
+        geometry = server.build_region(40.0, 0.0)
+        image = server.image_collection(SENTINEL, '2023-03-01', '2023-04-01', geometry).median().multiply(0.0001)
+        nir, red = image.select('B8'), image.select('B4')
+        expected = nir.subtract(red).divide(nir.add(red)).rename(['ndvi']).reduceRegion(
+            reducer=fake_ee.Reducer.mean(), geometry=geometry, scale=server.REGION_STATS_SCALE
+        ).getInfo()['ndvi']
+        self.assertEqual(len(points), 1)
+        self.assertAlmostEqual(points[0]['mean'], expected)
+
+
+class TestInitialization(unittest.TestCase):
+    """Test that configuration errors are not retried"""
+
+    def test_missing_project_is_a_configuration_error(self):
+        with mock.patch.object(server, 'GEE_BACKEND', 'ee'), \
+                mock.patch.object(server.cassette, 'CASSETTE_MODE', None), \
+                mock.patch.dict(os.environ, {'GEE_PROJECT_ID': 'your-project-id'}), \
+                mock.patch.object(server, 'gee_error', None):
+            with self.assertRaises(server.GEEConfigurationError):
+                server.initialize_gee()
+            self.assertIn('GEE_PROJECT_ID', server.gee_error)
+
+
+class TestGeocode(ServerTestCase):
+    """Test that throttling is not reported as an unknown location"""
+
+    def test_rate_limited_lookup_asks_to_retry(self):
+        throttled = RateLimitExceeded('Rate limit for nominatim would delay the request by 7.2s', retry_after=7.2)
+        with mock.patch.object(server.geocode_cache, 'get', return_value=(False, None)), \
+                mock.patch.object(server.geocode_cache, 'set') as cache_set, \
+                mock.patch.object(server.nominatim_client, 'get', side_effect=throttled):
+            response = self.client.post('/geocode', json={'location': 'Paris'})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers['Retry-After'], '8')
+        cache_set.assert_not_called()
+
+    def geocode_upstream(self, status, headers=None):
+        upstream = mock.MagicMock(status_code=status, headers=headers or {})
+        upstream.raise_for_status.side_effect = server.requests.exceptions.HTTPError(response=upstream)
+        with mock.patch.object(server.geocode_cache, 'get', return_value=(False, None)), \
+                mock.patch.object(server.geocode_cache, 'set') as cache_set, \
+                mock.patch.object(server.nominatim_client, 'bucket', None), \
+                mock.patch.object(server.nominatim_client.session, 'get', return_value=upstream), \
+                mock.patch('http_client.time.sleep'):
+            response = self.client.post('/geocode', json={'location': 'Paris'})
+        cache_set.assert_not_called()
+        return response
+
+    def test_nominatim_still_throttling_after_retries_asks_to_retry(self):
+        response = self.geocode_upstream(429, {'Retry-After': '2'})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers['Retry-After'], '2')
+
+    def test_failing_nominatim_is_not_reported_as_not_found(self):
+        self.assertEqual(self.geocode_upstream(500).status_code, 502)
+
+
+class TestTracing(ServerTestCase):
+    """Test that clients can neither force tracing nor choose trace keys"""
+
+    def setUp(self):
+        super().setUp()
+        for name, value in (('TRACE_SAMPLE_RATE', 0), ('TRACE_FORCE_TOKEN', 's3cret'), ('TRACE_DEBUG_ENDPOINT', True)):
+            patcher = mock.patch.object(tracing, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_force_header_needs_the_token(self):
+        self.assertNotIn('X-Trace-ID', self.client.get('/health', headers={'X-Trace': '1'}).headers)
+        self.assertIn('X-Trace-ID', self.client.get('/health', headers={'X-Trace': 's3cret'}).headers)
+
+    def test_client_request_ids_are_echoed_but_not_trace_keys(self):
+        first = self.client.get('/health', headers={'X-Trace': 's3cret', 'X-Request-ID': 'shared'})
+        second = self.client.get('/health', headers={'X-Trace': 's3cret', 'X-Request-ID': 'shared'})
+        self.assertEqual(first.headers['X-Request-ID'], 'shared')
+        self.assertNotEqual(first.headers['X-Trace-ID'], 'shared')
+        self.assertNotEqual(first.headers['X-Trace-ID'], second.headers['X-Trace-ID'])
+
+        # Traces are stored when their response closes; the second one did not replace the first
+        first.close()
+        second.close()
+        response = self.client.get(f"/debug/trace/{first.headers['X-Trace-ID']}")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['request_id'], first.headers['X-Trace-ID'])
+        self.assertEqual(self.client.get('/debug/trace/shared').status_code, 404)
+
+    def test_debug_endpoint_is_off_by_default(self):
+        trace_id = self.client.get('/health', headers={'X-Trace': 's3cret'}).headers['X-Trace-ID']
+        with mock.patch.object(tracing, 'TRACE_DEBUG_ENDPOINT', False):
+            response = self.client.get(f'/debug/trace/{trace_id}')
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn('spans', response.json)
+
+
+class TestMeasure(ServerTestCase):
+    """Test that malformed coordinates are rejected instead of measured"""
+
+    def test_area_of_malformed_ring(self):
+        response = self.client.post('/measure-area', json={'geometry': {
+            'type': 'Polygon', 'coordinates': [[[0, 0], [1, 0, 5], [1, 1], [0, 0]]]
+        }})
+        self.assertEqual(response.status_code, 400)
+
+    def test_distance_of_malformed_line(self):
+        response = self.client.post('/measure-distance', json={'geometry': {
+            'type': 'LineString', 'coordinates': [0, 0, 1, 1]
+        }})
+        self.assertEqual(response.status_code, 400)
+
+
+def ndjson(response):
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+class TestSatelliteImageBatch(ServerTestCase):
+    """Test streaming, deduplication, per-item errors and the parallelism cap"""
+
+    def item(self, lat, start_date='2023-01-01', end_date='2023-06-30', **kwargs):
+        return dict({'location': {'lat': lat, 'lon': 0.0}, 'start_date': start_date, 'end_date': end_date}, **kwargs)
+
+    def test_invalid_items_get_their_own_error_lines_first(self):
+        response = self.client.post('/satellite-image/batch', json={'items': [
+            self.item(40.0),
+            'not an object',
+            self.item(41.0, start_date='2023-06-30', end_date='2023-01-01'),
+            {'location': {'lat': 'north', 'lon': 0}, 'start_date': '2023-01-01', 'end_date': '2023-06-30'},
+            self.item(42.0, filter=['ndvi']),
+            self.item(43.0, filter='infrared')
+        ]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        lines = ndjson(response)
+        self.assertEqual([line['index'] for line in lines[:5]], [1, 2, 3, 4, 5])
+        self.assertTrue(all(line['status'] == 400 for line in lines[:5]))
+        self.assertEqual(lines[1]['result']['error'], 'Start date must be before end date')
+        self.assertEqual(lines[3]['result']['error'], 'filter must be one of rgb, false_color, ndvi, ndwi')
+        self.assertEqual((lines[5]['index'], lines[5]['status']), (0, 200))
+        self.assertTrue(lines[5]['result']['map_id'].startswith('projects/fake-project/maps/'))
+
+    def test_identical_items_are_rendered_once(self):
+        # The second item only differs by less than the coordinate rounding
+        items = [self.item(40.0), self.item(40.00001), self.item(40.0)]
+        lines = ndjson(self.client.post('/satellite-image/batch', json={'items': items}))
+        self.assertEqual(sorted(line['index'] for line in lines), [0, 1, 2])
+        self.assertEqual(len({line['result']['map_id'] for line in lines}), 1)
+        # Each line echoes the location of its own item
+        self.assertEqual({line['index']: line['result']['location']['lat'] for line in lines},
+                         {0: 40.0, 1: 40.00001, 2: 40.0})
+        self.assertEqual(fake_ee.call_counts(), {'getInfo': 1, 'getMapId': 1})
+
+    def test_results_stream_in_completion_order(self):
+        def render(location, start_date, end_date, filter_type):
+            # The first item is the slowest
+            time.sleep(0.3 if location['lat'] == 40.0 else 0)
+            return {'location': location}, 200
+
+        with mock.patch.object(server, 'satellite_image_response', render):
+            lines = ndjson(self.client.post('/satellite-image/batch', json={
+                'items': [self.item(40.0), self.item(41.0)], 'max_parallel': 2
+            }))
+        self.assertEqual([line['index'] for line in lines], [1, 0])
+
+    def test_parallelism_is_capped(self):
+        lock = threading.Lock()
+        running = [0]
+        peak = [0]
+
+        def render(location, start_date, end_date, filter_type):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.05)
+            with lock:
+                running[0] -= 1
+            return {'location': location}, 200
+
+        items = [self.item(40.0 + i) for i in range(8)]
+        with mock.patch.object(server, 'satellite_image_response', render):
+            lines = ndjson(self.client.post('/satellite-image/batch', json={'items': items, 'max_parallel': 2}))
+            self.assertEqual(len(lines), 8)
+            self.assertEqual(peak[0], 2)
+
+            # Requests cannot raise the server-wide limit
+            peak[0] = 0
+            with mock.patch.object(server, 'BATCH_MAX_PARALLEL', 3):
+                self.client.post('/satellite-image/batch', json={'items': items, 'max_parallel': 50}).get_data()
+            self.assertEqual(peak[0], 3)
+
+    def test_rejects_invalid_batches(self):
+        self.assertEqual(self.client.post('/satellite-image/batch', json={'items': []}).status_code, 400)
+        self.assertEqual(self.client.post('/satellite-image/batch', json={
+            'items': [self.item(40.0)], 'max_parallel': 'many'
+        }).status_code, 400)
+        with mock.patch.object(server, 'BATCH_MAX_ITEMS', 2):
+            response = self.client.post('/satellite-image/batch', json={'items': [self.item(40.0)] * 3})
+        self.assertEqual(response.status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Tests for the on-disk tile cache and tile prefetching
+"""
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+
+from tile_cache import TileCache
+from tile_prefetch import TilePrefetcher, tiles_for_bounds
+
+
+class TestTileCache(unittest.TestCase):
+    """Test storage and LRU eviction"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_round_trip(self):
+        cache = TileCache(self.tmpdir.name, max_bytes=1024)
+        self.assertIsNone(cache.get('map/1/0/0'))
+        cache.put('map/1/0/0', b'tile')
+        self.assertEqual(TileCache(self.tmpdir.name).get('map/1/0/0'), b'tile')
+
+    def test_evicts_least_recently_used(self):
+        cache = TileCache(self.tmpdir.name, max_bytes=250)
+        cache.put('a', b'x' * 100)
+        cache.put('b', b'x' * 100)
+        # Make 'a' the most recently used tile
+        os.utime(cache._path('b'), (1, 1))
+        cache.get('a')
+        cache.put('c', b'x' * 100)
+        cache._wait_for_maintenance()
+
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNotNone(cache.get('a'))
+        self.assertIsNotNone(cache.get('c'))
+        self.assertLessEqual(cache.stats()['bytes'], 250)
+
+    def test_overwrites_count_their_size_once(self):
+        cache = TileCache(self.tmpdir.name, max_bytes=1024)
+        cache.put('a', b'x' * 100)
+        cache._wait_for_maintenance()
+        cache.put('a', b'x' * 100)
+        cache.put('a', b'x' * 40)
+        self.assertEqual(cache.stats()['bytes'], 40)
+
+    def test_size_cap_is_shared_by_workers(self):
+        # Two workers writing to the same directory
+        first = TileCache(self.tmpdir.name, max_bytes=250)
+        second = TileCache(self.tmpdir.name, max_bytes=250)
+        first.put('a', b'x' * 100)
+        second.put('b', b'x' * 100)
+        first.put('c', b'x' * 100)
+        first._wait_for_maintenance()
+        second._wait_for_maintenance()
+
+        on_disk = sum(size for _, size, _ in first._scan())
+        self.assertLessEqual(on_disk, 250)
+        self.assertEqual(second.stats()['bytes'], on_disk)
+
+    def test_count_is_rebuilt_from_the_directory(self):
+        cache = TileCache(self.tmpdir.name, max_bytes=1024, rescan_interval=0)
+        cache.put('a', b'x' * 100)
+        # A tile removed by another process or by hand
+        os.unlink(cache._path('a'))
+        cache.put('b', b'x' * 10)
+        cache._wait_for_maintenance()
+        self.assertEqual(cache.stats()['bytes'], 10)
+
+    def test_request_thread_never_scans(self):
+        cache = TileCache(self.tmpdir.name, max_bytes=250)
+        scan = cache._scan
+        scanned_by = []
+
+        def record_scan():
+            scanned_by.append(threading.current_thread())
+            return scan()
+
+        with patch.object(cache, '_scan', side_effect=record_scan):
+            for key in 'abcd':
+                cache.put(key, b'x' * 100)
+            cache._wait_for_maintenance()
+
+        self.assertTrue(scanned_by)
+        self.assertNotIn(threading.current_thread(), scanned_by)
+        self.assertLessEqual(cache.stats()['bytes'], 250)
+
+
+class TestTilePrefetcher(unittest.TestCase):
+    """Test tile coverage, budgets and cancellation"""
+
+    def test_tiles_for_bounds(self):
+        self.assertEqual(tiles_for_bounds(-180, -85, 180, 85, 1), [(1, 0, 0), (1, 0, 1), (1, 1, 0), (1, 1, 1)])
+        # 0.2 degree box around Paris at zoom 12
+        tiles = tiles_for_bounds(2.25, 48.75, 2.45, 48.95, 12)
+        self.assertEqual({z for z, _, _ in tiles}, {12})
+        self.assertEqual(len(tiles), 12)
+
+    def test_prefetches_tiles_within_budget(self):
+        fetched = []
+        done = threading.Event()
+
+        def fetch(mapid, z, x, y):
+            fetched.append((mapid, z, x, y))
+            if len(fetched) == 4:
+                done.set()
+            return b'x' * 10, 200
+
+        prefetcher = TilePrefetcher(fetch, min_zoom=11, max_zoom=12, concurrency=1, max_tiles=4)
+        prefetcher.schedule('view', 'map-1', (2.25, 48.75, 2.45, 48.95))
+        self.assertTrue(done.wait(5))
+        prefetcher._executor.shutdown(wait=True)
+
+        self.assertEqual(len(fetched), 4)
+        self.assertEqual(prefetcher.stats()['bytes'], 40)
+        self.assertEqual(prefetcher.stats()['active_jobs'], 0)
+
+    def test_superseded_map_id_is_cancelled(self):
+        release = threading.Event()
+        fetched = []
+
+        def fetch(mapid, z, x, y):
+            release.wait(5)
+            fetched.append(mapid)
+            return b'x', 200
+
+        prefetcher = TilePrefetcher(fetch, min_zoom=12, max_zoom=12, concurrency=1)
+        prefetcher.schedule('view', 'old', (2.25, 48.75, 2.45, 48.95))
+        prefetcher.schedule('view', 'new', (2.25, 48.75, 2.45, 48.95))
+        release.set()
+        prefetcher._executor.shutdown(wait=True)
+
+        # Only the tile already in flight when the job was superseded is fetched
+        self.assertLessEqual(fetched.count('old'), 1)
+        self.assertEqual(fetched.count('new'), 12)
+        self.assertEqual(prefetcher.stats()['cancelled'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Tests for per-request span tracing and OTLP export
+"""
+import threading
+import unittest
+from unittest import mock
+
+import tracing
+
+
+class TestTracing(unittest.TestCase):
+    """Test span nesting, sampling and the OTLP format"""
+
+    def test_unsampled_requests_record_nothing(self):
+        self.assertIsNone(tracing.start_trace('unsampled'))
+        with tracing.span('call') as current:
+            current.set_attribute('status', 200)
+        self.assertIsNone(tracing.current_trace())
+
+    def test_spans_nest_and_export_as_otlp(self):
+        trace = tracing.start_trace('sampled', force=True)
+        root = tracing.start_span('POST /satellite-image')
+        with tracing.span('gee satellite.plan', operation='satellite.plan'):
+            pass
+
+        def in_thread():
+            with tracing.span('gee satellite.map_id'):
+                pass
+
+        worker = threading.Thread(target=tracing.propagate(in_thread))
+        worker.start()
+        worker.join()
+        tracing.end_span(root)
+
+        spans = tracing.to_otlp(trace)['resourceSpans'][0]['scopeSpans'][0]['spans']
+        by_name = {span['name']: span for span in spans}
+        self.assertNotIn('parentSpanId', by_name['POST /satellite-image'])
+        self.assertEqual(by_name['gee satellite.plan']['parentSpanId'], root.span_id)
+        self.assertEqual(by_name['gee satellite.plan']['attributes'],
+                         [{'key': 'operation', 'value': {'stringValue': 'satellite.plan'}}])
+        # Spans from other threads join the trace of the request that started them
+        self.assertEqual(by_name['gee satellite.map_id']['parentSpanId'], root.span_id)
+        self.assertTrue(all(span['traceId'] == trace.trace_id for span in spans))
+
+    def test_errors_are_recorded(self):
+        trace = tracing.start_trace('failing', force=True)
+        with self.assertRaises(ValueError):
+            with tracing.span('gee measure.area'):
+                raise ValueError('boom')
+        (span,) = tracing.to_otlp(trace)['resourceSpans'][0]['scopeSpans'][0]['spans']
+        self.assertEqual(span['status'], {'code': 2, 'message': 'ValueError: boom'})
+
+    def test_forcing_requires_the_configured_token(self):
+        self.assertFalse(tracing.force_requested('1'))
+        with mock.patch.object(tracing, 'TRACE_FORCE_TOKEN', 's3cret'):
+            self.assertTrue(tracing.force_requested('s3cret'))
+            self.assertFalse(tracing.force_requested('1'))
+            self.assertFalse(tracing.force_requested(None))
+
+    def test_waterfall(self):
+        trace = tracing.start_trace('waterfall', force=True)
+        root = tracing.start_span('GET /health')
+        with tracing.span('child'):
+            pass
+        tracing.end_span(root)
+        view = tracing.waterfall(tracing.to_otlp(trace))
+        self.assertEqual([row['name'] for row in view['spans']], ['GET /health', 'child'])
+        self.assertEqual([row['depth'] for row in view['spans']], [0, 1])
+        self.assertEqual(len(view['lines']), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
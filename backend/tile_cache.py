@@ -0,0 +1,209 @@
+"""
+Size-bounded on-disk cache for Earth Engine map tiles, shared by all workers
+on a host. Least recently used tiles are evicted first.
+"""
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+from sqlite_store import ThreadLocalConnection, state_path
+
+TILE_CACHE_DIR = os.environ.get('TILE_CACHE_DIR', state_path('tiles'))
+TILE_CACHE_MAX_BYTES = int(os.environ.get('TILE_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+# The shared byte count is rebuilt from the directory this often, to correct
+# drift from concurrent overwrites and files removed by other means
+TILE_CACHE_RESCAN_INTERVAL = float(os.environ.get('TILE_CACHE_RESCAN_INTERVAL', 300))
+
+USAGE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS usage (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    bytes INTEGER NOT NULL,
+    scanned REAL NOT NULL
+);
+"""
+
+
+class TileCache:
+    """
+    Stores tiles as files named by the hash of their key. File modification
+    times record the last access, so eviction works across processes, and
+    the total size is kept in a SQLite file next to the tiles so writes
+    from every worker count against the same cap. Directory walks (rescans
+    and eviction) run on a background thread, never on the request path.
+    """
+
+    def __init__(self, directory=TILE_CACHE_DIR, max_bytes=TILE_CACHE_MAX_BYTES,
+                 rescan_interval=TILE_CACHE_RESCAN_INTERVAL):
+        self.name = 'tiles'
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.rescan_interval = rescan_interval
+        self._db = ThreadLocalConnection(os.path.join(directory, 'usage.sqlite3'), USAGE_SCHEMA)
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='tile-cache')
+        self._maintenance = None
+        self._maintenance_queued = False
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """
+        Return the cached tile bytes for key, or None
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            metrics.count_cache_lookup(self.name, False)
+            return None
+        with self._lock:
+            self.hits += 1
+        metrics.count_cache_lookup(self.name, True)
+        return data
+
+    def put(self, key, data):
+        """
+        Store tile bytes, evicting least recently used tiles beyond the size cap
+        """
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # An overwritten tile only adds the difference in size
+        try:
+            previous = os.stat(path).st_size
+        except OSError:
+            previous = 0
+        # Write to a temporary file first so readers never see partial tiles
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+        try:
+            total = self._add_bytes(len(data) - previous)
+        except sqlite3.Error as e:
+            # The tile is stored; the next write or rescan catches up
+            print(f"Failed to update tile cache size: {e}")
+            return
+        if total is None or total > self.max_bytes:
+            self._schedule_maintenance()
+
+    def stats(self):
+        try:
+            row = self._db.get().execute('SELECT bytes FROM usage').fetchone()
+        except sqlite3.Error:
+            row = None
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'bytes': row[0] if row is not None else None,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': (self.hits / lookups) if lookups else 0.0
+            }
+
+    def _add_bytes(self, delta):
+        """
+        Add delta to the shared byte count and return the new total, or None
+        when the count is missing or older than rescan_interval and has to be
+        rebuilt from the directory
+        """
+        conn = self._db.get()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT bytes, scanned FROM usage').fetchone()
+            total = None
+            if row is not None:
+                conn.execute('UPDATE usage SET bytes = ?', (row[0] + delta,))
+                if time.time() - row[1] < self.rescan_interval:
+                    total = row[0] + delta
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return total
+
+    def _schedule_maintenance(self):
+        """
+        Queue a rescan and eviction pass unless one is already waiting to run
+        """
+        with self._lock:
+            if self._maintenance_queued:
+                return
+            self._maintenance_queued = True
+            self._maintenance = self._executor.submit(self._maintain)
+
+    def _wait_for_maintenance(self):
+        with self._lock:
+            maintenance = self._maintenance
+        if maintenance is not None:
+            maintenance.result()
+
+    def _set_bytes(self, total):
+        self._db.get().execute('INSERT OR REPLACE INTO usage (id, bytes, scanned) VALUES (0, ?, ?)',
+                               (total, time.time()))
+
+    def _path(self, key):
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, digest[:2], digest[2:] + '.tile')
+
+    def _scan(self):
+        """
+        Yield (path, size, last access) for every cached tile
+        """
+        for root, _, files in os.walk(self.directory):
+            for filename in files:
+                if not filename.endswith('.tile'):
+                    continue
+                path = os.path.join(root, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                yield path, stat.st_size, stat.st_mtime
+
+    def _maintain(self):
+        """
+        Rebuild the byte count from the directory and evict the least recently
+        used tiles until the cache is at 90% of its cap. Other workers may be
+        evicting too, so the directory is the source of truth.
+        """
+        with self._lock:
+            # Writes from here on need another pass
+            self._maintenance_queued = False
+        try:
+            started = time.time()
+            tiles = sorted(self._scan(), key=lambda tile: tile[2])
+            total = sum(size for _, size, _ in tiles)
+            evicted = 0
+            if total > self.max_bytes:
+                target = self.max_bytes * 0.9
+                for path, size, _ in tiles:
+                    if total <= target:
+                        break
+                    try:
+                        os.unlink(path)
+                    except OSError:
+                        pass
+                    total -= size
+                    evicted += 1
+            self._set_bytes(total)
+            if evicted:
+                print(f"Evicted {evicted} tiles down to {total} bytes in {time.time() - started:.2f}s")
+        except Exception as e:
+            print(f"Tile cache maintenance failed: {e}")
@@ -0,0 +1,125 @@
+"""
+Background pre-warming of the tile cache right after a map ID is created,
+so the first view of a new image does not pay cold tile generation on GEE.
+"""
+import math
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+TILE_PREFETCH_ENABLED = os.environ.get('TILE_PREFETCH', 'false').lower() in ('1', 'true', 'yes')
+TILE_PREFETCH_MIN_ZOOM = int(os.environ.get('TILE_PREFETCH_MIN_ZOOM', 10))
+TILE_PREFETCH_MAX_ZOOM = int(os.environ.get('TILE_PREFETCH_MAX_ZOOM', 13))
+TILE_PREFETCH_CONCURRENCY = int(os.environ.get('TILE_PREFETCH_CONCURRENCY', 4))
+TILE_PREFETCH_MAX_TILES = int(os.environ.get('TILE_PREFETCH_MAX_TILES', 200))
+TILE_PREFETCH_MAX_BYTES = int(os.environ.get('TILE_PREFETCH_MAX_BYTES', 16 * 1024 * 1024))
+# Upper bound on tiles waiting in the queue across all jobs
+TILE_PREFETCH_MAX_QUEUE = int(os.environ.get('TILE_PREFETCH_MAX_QUEUE', 1000))
+
+
+def tiles_for_bounds(west, south, east, north, zoom):
+    """
+    Web Mercator (z, x, y) tiles covering a lon/lat bounding box
+    """
+    def tile_x(lon):
+        return int((lon + 180.0) / 360.0 * 2 ** zoom)
+
+    def tile_y(lat):
+        lat = max(min(lat, 85.0511), -85.0511)
+        rad = math.radians(lat)
+        return int((1.0 - math.asinh(math.tan(rad)) / math.pi) / 2.0 * 2 ** zoom)
+
+    last = 2 ** zoom - 1
+    x_min, x_max = max(0, tile_x(west)), min(last, tile_x(east))
+    y_min, y_max = max(0, tile_y(north)), min(last, tile_y(south))
+    return [(zoom, x, y) for x in range(x_min, x_max + 1) for y in range(y_min, y_max + 1)]
+
+
+class _Job:
+    def __init__(self, mapid):
+        self.mapid = mapid
+        self.cancelled = threading.Event()
+        self.bytes = 0
+        self.remaining = 0
+
+
+class TilePrefetcher:
+    """
+    Fetches the tiles of new map IDs on a small background pool.
+    fetch(mapid, z, x, y) must return (tile bytes or None, status) and fill
+    the tile cache. Scheduling a new map ID for the same group cancels the
+    job of the map ID it supersedes.
+    """
+
+    def __init__(self, fetch, min_zoom=TILE_PREFETCH_MIN_ZOOM, max_zoom=TILE_PREFETCH_MAX_ZOOM,
+                 concurrency=TILE_PREFETCH_CONCURRENCY, max_tiles=TILE_PREFETCH_MAX_TILES,
+                 max_bytes=TILE_PREFETCH_MAX_BYTES, max_queue=TILE_PREFETCH_MAX_QUEUE):
+        self.name = 'tile_prefetch'
+        self.fetch = fetch
+        self.min_zoom = min_zoom
+        self.max_zoom = max_zoom
+        self.max_tiles = max_tiles
+        self.max_bytes = max_bytes
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='prefetch')
+        self._jobs = {}
+        self._queued = 0
+        self._lock = threading.Lock()
+        self.counters = {'jobs': 0, 'cancelled': 0, 'tiles': 0, 'bytes': 0, 'dropped': 0, 'errors': 0}
+
+    def schedule(self, group, mapid, bounds):
+        """
+        Queue the tiles covering bounds (west, south, east, north) for mapid
+        """
+        tiles = []
+        for zoom in range(self.min_zoom, self.max_zoom + 1):
+            tiles.extend(tiles_for_bounds(*bounds, zoom))
+        tiles = tiles[:self.max_tiles]
+
+        job = _Job(mapid)
+        with self._lock:
+            previous = self._jobs.get(group)
+            if previous is not None:
+                if previous.mapid == mapid:
+                    return
+                previous.cancelled.set()
+                self.counters['cancelled'] += 1
+            room = max(0, self.max_queue - self._queued)
+            self.counters['dropped'] += max(0, len(tiles) - room)
+            tiles = tiles[:room]
+            if not tiles:
+                self._jobs.pop(group, None)
+                return
+            job.remaining = len(tiles)
+            self._jobs[group] = job
+            self.counters['jobs'] += 1
+            self._queued += len(tiles)
+
+        # Low zoom levels first: they cover the initial view
+        for tile in tiles:
+            self._executor.submit(self._fetch_tile, group, job, tile)
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters, queued=self._queued, active_jobs=len(self._jobs))
+
+    def _fetch_tile(self, group, job, tile):
+        try:
+            if job.cancelled.is_set() or job.bytes >= self.max_bytes:
+                return
+            data, _ = self.fetch(job.mapid, *tile)
+            if data is not None:
+                with self._lock:
+                    job.bytes += len(data)
+                    self.counters['tiles'] += 1
+                    self.counters['bytes'] += len(data)
+        except Exception as e:
+            with self._lock:
+                self.counters['errors'] += 1
+            print(f"Tile prefetch failed for {job.mapid} {tile}: {e}")
+        finally:
+            with self._lock:
+                self._queued -= 1
+                job.remaining -= 1
+                if job.remaining == 0 and self._jobs.get(group) is job:
+                    del self._jobs[group]
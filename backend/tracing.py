@@ -0,0 +1,311 @@
+"""
+Lightweight per-request tracing of outbound calls (Earth Engine, Nominatim,
+tiles). Spans are tied to the request ID, finished traces are kept in a
+SQLite file shared by all workers for /debug/trace/<request_id>, and can be
+exported as OTLP JSON to a file (one trace per line) or an OTLP/HTTP collector.
+
+Only a TRACE_SAMPLE_RATE fraction of requests is traced (plus requests sent
+with an "X-Trace: <TRACE_FORCE_TOKEN>" header when a token is configured);
+for the others every span is a no-op. Trace keys are always generated by
+the server, and /debug/trace is only served with TRACE_DEBUG_ENDPOINT=true.
+"""
+import contextvars
+import hmac
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import requests
+
+from sqlite_store import ThreadLocalConnection, state_path
+
+TRACE_SAMPLE_RATE = float(os.environ.get('TRACE_SAMPLE_RATE', 0.01))
+TRACE_STORE_PATH = os.environ.get('TRACE_STORE_PATH', state_path('traces.sqlite3'))
+TRACE_STORE_MAX_ENTRIES = int(os.environ.get('TRACE_STORE_MAX_ENTRIES', 500))
+# Clients can only force tracing by sending this token in X-Trace; unset disables forcing
+TRACE_FORCE_TOKEN = os.environ.get('TRACE_FORCE_TOKEN')
+# The /debug/trace view exposes request details, so it is off unless enabled
+TRACE_DEBUG_ENDPOINT = os.environ.get('TRACE_DEBUG_ENDPOINT', 'false').lower() in ('1', 'true', 'yes')
+# Optional OTLP JSON exports
+TRACE_EXPORT_FILE = os.environ.get('TRACE_EXPORT_FILE')
+TRACE_EXPORT_URL = os.environ.get('TRACE_EXPORT_URL')
+SERVICE_NAME = os.environ.get('TRACE_SERVICE_NAME', 'satellite-image-analyzer')
+
+TRACE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS traces (
+    request_id TEXT PRIMARY KEY,
+    created REAL NOT NULL,
+    payload TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS traces_created ON traces (created);
+"""
+
+_current_trace = contextvars.ContextVar('trace', default=None)
+_current_span = contextvars.ContextVar('span', default=None)
+
+_db = ThreadLocalConnection(TRACE_STORE_PATH, TRACE_SCHEMA)
+_export_lock = threading.Lock()
+# Collector exports happen off the request path
+_exporter = ThreadPoolExecutor(max_workers=1, thread_name_prefix='trace-export')
+
+
+class Span:
+    def __init__(self, name, span_id, parent_id, attributes):
+        self.name = name
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.attributes = dict(attributes)
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.error = None
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+
+class _NoopSpan:
+    def set_attribute(self, key, value):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Trace:
+    """
+    Spans recorded for one request
+    """
+
+    def __init__(self, request_id):
+        self.request_id = request_id
+        self.trace_id = uuid.uuid4().hex
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+
+def new_request_id():
+    return uuid.uuid4().hex
+
+
+def force_requested(header_value):
+    """
+    Whether an X-Trace header value matches the configured TRACE_FORCE_TOKEN
+    """
+    if not TRACE_FORCE_TOKEN or not header_value:
+        return False
+    return hmac.compare_digest(header_value.encode(), TRACE_FORCE_TOKEN.encode())
+
+
+def start_trace(request_id, force=False):
+    """
+    Start tracing the current request if it is sampled. Returns the Trace or None.
+    """
+    trace = None
+    if force or (TRACE_SAMPLE_RATE > 0 and random.random() < TRACE_SAMPLE_RATE):
+        trace = Trace(request_id)
+    # Set even when not sampled, so a previous request's trace on this thread is not reused
+    _current_trace.set(trace)
+    _current_span.set(None)
+    return trace
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+def start_span(name, **attributes):
+    """
+    Open a span under the current one and make it current. Returns None when
+    the request is not traced. For spans that cannot use the span() block,
+    like the one covering a whole request.
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        return None
+    parent = _current_span.get()
+    current = Span(name, uuid.uuid4().hex[:16], parent.span_id if parent else None, attributes)
+    _current_span.set(current)
+    return current
+
+
+def end_span(current, error=None, trace=None):
+    """
+    Close a span from start_span and add it to trace, by default the current one
+    """
+    trace = trace or _current_trace.get()
+    if current is None or trace is None:
+        return
+    current.end_ns = time.time_ns()
+    current.error = current.error or error
+    trace.add(current)
+
+
+@contextmanager
+def span(name, **attributes):
+    """
+    Record a span around a block, nested under the current span
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        yield _NOOP_SPAN
+        return
+
+    parent = _current_span.get()
+    current = Span(name, uuid.uuid4().hex[:16], parent.span_id if parent else None, attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = f'{type(e).__name__}: {e}'
+        raise
+    finally:
+        current.end_ns = time.time_ns()
+        _current_span.reset(token)
+        trace.add(current)
+
+
+def propagate(func):
+    """
+    Wrap func so it runs with the caller's trace and current span, for work
+    handed to another thread
+    """
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(func, *args, **kwargs)
+
+
+def to_otlp(trace):
+    """
+    OTLP JSON (ExportTraceServiceRequest) for a finished trace
+    """
+    def attribute(key, value):
+        if isinstance(value, bool):
+            typed = {'boolValue': value}
+        elif isinstance(value, int):
+            typed = {'intValue': str(value)}
+        elif isinstance(value, float):
+            typed = {'doubleValue': value}
+        else:
+            typed = {'stringValue': str(value)}
+        return {'key': key, 'value': typed}
+
+    spans = []
+    for item in trace.spans:
+        span_json = {
+            'traceId': trace.trace_id,
+            'spanId': item.span_id,
+            'name': item.name,
+            'kind': 2 if item.parent_id is None else 3,  # SERVER for the request, CLIENT for calls
+            'startTimeUnixNano': str(item.start_ns),
+            'endTimeUnixNano': str(item.end_ns),
+            'attributes': [attribute(key, value) for key, value in item.attributes.items()],
+            'status': {'code': 2, 'message': item.error} if item.error else {'code': 1}
+        }
+        if item.parent_id:
+            span_json['parentSpanId'] = item.parent_id
+        spans.append(span_json)
+
+    return {
+        'resourceSpans': [{
+            'resource': {'attributes': [
+                attribute('service.name', SERVICE_NAME),
+                attribute('request.id', trace.request_id)
+            ]},
+            'scopeSpans': [{'scope': {'name': 'tracing'}, 'spans': spans}]
+        }]
+    }
+
+
+def finish_trace(trace):
+    """
+    Store and export a finished trace
+    """
+    if not trace.spans:
+        return
+    payload = json.dumps(to_otlp(trace))
+    try:
+        conn = _db.get()
+        conn.execute('INSERT OR REPLACE INTO traces (request_id, created, payload) VALUES (?, ?, ?)',
+                     (trace.request_id, time.time(), payload))
+        conn.execute(
+            'DELETE FROM traces WHERE request_id NOT IN '
+            '(SELECT request_id FROM traces ORDER BY created DESC LIMIT ?)',
+            (TRACE_STORE_MAX_ENTRIES,)
+        )
+    except Exception as e:
+        print(f"Failed to store trace {trace.request_id}: {e}")
+
+    if TRACE_EXPORT_FILE:
+        try:
+            with _export_lock, open(TRACE_EXPORT_FILE, 'a') as f:
+                f.write(payload + '\n')
+        except OSError as e:
+            print(f"Failed to export trace {trace.request_id}: {e}")
+    if TRACE_EXPORT_URL:
+        _exporter.submit(_post_trace, trace.request_id, payload)
+
+
+def _post_trace(request_id, payload):
+    try:
+        requests.post(TRACE_EXPORT_URL, data=payload, headers={'Content-Type': 'application/json'}, timeout=5)
+    except requests.exceptions.RequestException as e:
+        print(f"Failed to export trace {request_id}: {e}")
+
+
+def load_trace(request_id):
+    """
+    OTLP JSON of a stored trace, or None
+    """
+    row = _db.get().execute('SELECT payload FROM traces WHERE request_id = ?', (request_id,)).fetchone()
+    return json.loads(row[0]) if row else None
+
+
+def waterfall(otlp):
+    """
+    Spans of a stored trace in start order with their offset, duration and
+    nesting depth, plus a text rendering of the waterfall
+    """
+    spans = otlp['resourceSpans'][0]['scopeSpans'][0]['spans']
+    if not spans:
+        return {'spans': [], 'lines': []}
+    start = min(int(s['startTimeUnixNano']) for s in spans)
+    end = max(int(s['endTimeUnixNano']) for s in spans)
+    total = max(end - start, 1)
+    parents = {s['spanId']: s.get('parentSpanId') for s in spans}
+
+    def depth(span_id):
+        level = 0
+        while parents.get(span_id):
+            span_id = parents[span_id]
+            level += 1
+        return level
+
+    width = 40
+    rows = []
+    lines = []
+    for s in sorted(spans, key=lambda s: int(s['startTimeUnixNano'])):
+        offset = int(s['startTimeUnixNano']) - start
+        duration = int(s['endTimeUnixNano']) - int(s['startTimeUnixNano'])
+        level = depth(s['spanId'])
+        row = {
+            'name': s['name'],
+            'depth': level,
+            'offset_ms': round(offset / 1e6, 2),
+            'duration_ms': round(duration / 1e6, 2),
+            'error': s['status'].get('message'),
+            'attributes': {a['key']: next(iter(a['value'].values())) for a in s['attributes']}
+        }
+        rows.append(row)
+        bar_start = int(offset / total * width)
+        bar = ' ' * bar_start + '█' * max(1, int(duration / total * width))
+        label = '  ' * level + s['name']
+        lines.append(f"{label:<40} |{bar:<{width + 1}}| {row['duration_ms']:>9.2f} ms")
+    return {'total_ms': round(total / 1e6, 2), 'spans': rows, 'lines': lines}